@@ -0,0 +1,390 @@
+"""Index advisor for the queries the dashboard actually runs.
+
+``QueryRecorder`` is attached to the connection pool (``add_observer``) and
+keeps one sample per distinct SELECT. When ``BANKSIGHT_QUERY_LOG`` is set it
+also appends each new query to that JSON-lines file so the advisor can be run
+from the command line against a real workload:
+
+    python banksight_advisor.py --log banksight_queries.jsonl            # report only
+    python banksight_advisor.py --log banksight_queries.jsonl --apply    # create and re-time
+
+For every query the advisor runs EXPLAIN, and for each table MySQL scans
+(``ALL`` / ``index`` access, no usable key, or a temporary table / filesort)
+it proposes one composite index: equality columns first, then GROUP BY /
+ORDER BY columns, then range columns, then the remaining columns the query
+reads from that table when they fit, so the index also covers the query.
+Q8 gets ``transactions (customer_id, amount)`` and Q6 ``(status, txn_type)``
+this way. Predicates wrapped in a function (``YEAR(join_date) = 2023``) cannot
+use an index and are reported as notes instead.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import threading
+import time
+
+from banksight_filters import quote_identifier
+from banksight_insights import INSIGHTS
+from banksight_pool import ConnectionPool
+
+
+QUERY_LOG = os.environ.get("BANKSIGHT_QUERY_LOG")
+MAX_INDEX_COLUMNS = 5
+# Bookkeeping tables of other modules are not part of the dashboard workload.
+IGNORED_TABLES = re.compile(r"information_schema|insight_|ingest_", re.I)
+UNINDEXABLE_TYPES = {"text", "tinytext", "mediumtext", "longtext", "blob", "json"}
+SCAN_ACCESS = {"ALL", "index"}
+
+_SPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)", re.I)
+
+
+def fingerprint(query):
+    """Whitespace- and IN-list-insensitive form of a query."""
+    return _IN_LIST.sub("IN (...)", _SPACE.sub(" ", query).strip().rstrip(";"))
+
+
+# ---------------- RECORDING ----------------
+class QueryRecorder:
+
+    def __init__(self, path=QUERY_LOG, max_queries=1000):
+        self.path = path
+        self.max_queries = max_queries
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def record(self, query, params, seconds, **stats):
+        if not query.lstrip().upper().startswith("SELECT") or IGNORED_TABLES.search(query):
+            return
+        key = fingerprint(query)
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                if len(self._queries) >= self.max_queries:
+                    return
+                entry = self._queries[key] = {
+                    "query": query, "params": list(params or []), "calls": 0, "total_ms": 0.0,
+                }
+                if self.path:
+                    with open(self.path, "a", encoding="utf-8") as handle:
+                        handle.write(json.dumps({"query": query, "params": entry["params"]},
+                                                default=str) + "\n")
+            entry["calls"] += 1
+            entry["total_ms"] += seconds * 1000
+
+    def queries(self):
+        with self._lock:
+            return sorted((dict(e) for e in self._queries.values()),
+                          key=lambda e: e["total_ms"], reverse=True)
+
+
+def read_query_log(path):
+    queries = {}
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                entry = json.loads(line)
+                queries.setdefault(fingerprint(entry["query"]), entry)
+    return list(queries.values())
+
+
+def insight_workload():
+    workload = []
+    for insight in INSIGHTS:
+        sql, params = insight.summary_sql()
+        workload.append({"query": sql, "params": params, "label": insight.name.upper()})
+    return workload
+
+
+# ---------------- QUERY ANALYSIS ----------------
+_CLAUSE = re.compile(r"\b(WHERE|GROUP BY|HAVING|ORDER BY|LIMIT)\b", re.I)
+_TABLE_REF = re.compile(
+    r"\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?`?(?!(?:ON|WHERE|JOIN|LEFT|RIGHT|INNER|CROSS|"
+    r"GROUP|ORDER|LIMIT|HAVING)\b)(\w+)`?)?", re.I)
+_COLUMN_REF = re.compile(r"(?:`?(\w+)`?\.)?`?([A-Za-z_]\w*)`?")
+_PREDICATE = re.compile(
+    r"^\(*\s*(?:(\w+)\s*\(\s*)?((?:`?\w+`?\.)?`?\w+`?)\s*\)?\s*"
+    r"(=|<>|!=|<=|>=|<|>|\bIN\b|\bLIKE\b|\bIS NOT NULL\b|\bIS NULL\b)", re.I)
+_JOIN_ON = re.compile(r"\bON\s+((?:`?\w+`?\.)?`?\w+`?)\s*=\s*((?:`?\w+`?\.)?`?\w+`?)", re.I)
+_BETWEEN = re.compile(r"\bBETWEEN\s+\S+\s+AND\s+\S+", re.I)
+
+
+def _innermost_select(sql):
+    """The SELECT inside ``FROM ( ... )`` derived tables (the live insight form)."""
+    while True:
+        match = re.search(r"\bFROM\s*\(", sql, re.I)
+        if not match:
+            return sql
+        depth, start = 0, match.end() - 1
+        for pos in range(start, len(sql)):
+            depth += {"(": 1, ")": -1}.get(sql[pos], 0)
+            if depth == 0:
+                sql = sql[start + 1:pos]
+                break
+        else:
+            return sql
+
+
+def _clauses(sql):
+    parts, last, name = {}, 0, "SELECT"
+    for match in _CLAUSE.finditer(sql):
+        parts[name] = sql[last:match.start()]
+        name, last = match.group(1).upper(), match.end()
+    parts[name] = sql[last:]
+    return parts
+
+
+class QueryShape:
+    """Per-table column usage of one (non-nested) SELECT."""
+
+    def __init__(self, sql, schema):
+        self.sql = _innermost_select(fingerprint(sql))
+        self.schema = schema
+        self.aliases = {}
+        for table, alias in _TABLE_REF.findall(self.sql):
+            if table.lower() in schema:
+                self.aliases[table.lower()] = table.lower()
+                if alias:
+                    self.aliases[alias.lower()] = table.lower()
+        self.tables = sorted(set(self.aliases.values()))
+        self.usage = {t: {"join": [], "eq": [], "group": [], "range": [], "read": []} for t in self.tables}
+        self.notes = []
+        self._analyse()
+
+    def resolve(self, ref):
+        match = _COLUMN_REF.fullmatch(ref.strip())
+        if not match:
+            return None
+        qualifier, column = match.group(1), match.group(2).lower()
+        if qualifier:
+            table = self.aliases.get(qualifier.lower())
+            return (table, column) if table and column in self.schema[table] else None
+        owners = [t for t in self.tables if column in self.schema[t]]
+        return (owners[0], column) if len(owners) == 1 else None
+
+    def _use(self, kind, ref):
+        resolved = self.resolve(ref)
+        if resolved:
+            columns = self.usage[resolved[0]][kind]
+            if resolved[1] not in columns:
+                columns.append(resolved[1])
+        return resolved
+
+    def _analyse(self):
+        parts = _clauses(self.sql)
+        for left, right in _JOIN_ON.findall(parts["SELECT"]):
+            self._use("join", left)
+            self._use("join", right)
+
+        where = _BETWEEN.sub(">= %s", parts.get("WHERE", ""))
+        for predicate in re.split(r"\bAND\b", where, flags=re.I):
+            match = _PREDICATE.match(predicate.strip())
+            if not match:
+                continue
+            function, ref, op = match.group(1), match.group(2), match.group(3).upper()
+            if function:
+                resolved = self._use("read", ref)
+                if resolved:
+                    self.notes.append(f"{function.upper()}({'.'.join(resolved)}) in WHERE cannot use "
+                                      f"an index; compare the bare column with a range instead")
+                continue
+            if op in ("=", "IN", "IS NULL"):
+                self._use("eq", ref)
+            elif op in ("<>", "!="):
+                self._use("read", ref)
+            else:
+                self._use("range", ref)
+
+        for clause in ("GROUP BY", "ORDER BY"):
+            for ref in parts.get(clause, "").split(","):
+                self._use("group", re.sub(r"\s+(ASC|DESC)\s*$", "", ref.strip(), flags=re.I))
+
+        for token in _COLUMN_REF.finditer(parts["SELECT"] + " " + parts.get("HAVING", "")):
+            self._use("read", token.group(0))
+
+    def index_for(self, table, column_types, lookup=False):
+        """Composite index for ``table``; join columns lead only when it is the looked-up side."""
+        usage = self.usage[table]
+        keyed = []
+        for kind in ("join", "eq", "group", "range") if lookup else ("eq", "group", "range"):
+            keyed += [c for c in usage[kind] if c not in keyed]
+        keyed = [c for c in keyed if column_types.get(c) not in UNINDEXABLE_TYPES]
+        if not keyed:
+            return None
+        covering = [c for c in dict.fromkeys(usage["read"] + usage["join"]) if c not in keyed]
+        if len(keyed) + len(covering) <= MAX_INDEX_COLUMNS and not any(
+                column_types.get(c) in UNINDEXABLE_TYPES for c in covering):
+            keyed += covering
+        return keyed[:MAX_INDEX_COLUMNS]
+
+
+# ---------------- ADVISOR ----------------
+class IndexAdvisor:
+
+    def __init__(self, db, repeat=5):
+        self.db = db
+        self.repeat = repeat
+        self.schema = {}
+        self.column_types = {}
+        for table, column, data_type in db.fetch_all(
+                "SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE()"):
+            self.schema.setdefault(table.lower(), set()).add(column.lower())
+            self.column_types.setdefault(table.lower(), {})[column.lower()] = data_type.lower()
+
+    def existing_indexes(self):
+        indexes = {}
+        for table, name, column in self.db.fetch_all(
+                "SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"):
+            indexes.setdefault(table.lower(), {}).setdefault(name, []).append(column.lower())
+        return indexes
+
+    def explain(self, query, params=None):
+        plan = self.db.read_sql("EXPLAIN " + query, params or None)
+        plan.columns = [c.lower() for c in plan.columns]
+        return plan.to_dict("records")
+
+    def time_query(self, query, params=None):
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            self.db.fetch_all(query, params or None)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    @staticmethod
+    def _needs_index(row):
+        extra = str(row.get("extra") or "")
+        return (row.get("type") in SCAN_ACCESS or row.get("key") is None
+                or "Using temporary" in extra or "Using filesort" in extra)
+
+    def analyse(self, workload):
+        """EXPLAIN every query and collect index proposals (deduplicated, existing ones skipped)."""
+        existing = self.existing_indexes()
+        findings, wanted = [], {}
+        for entry in workload:
+            shape = QueryShape(entry["query"], self.schema)
+            plan = self.explain(entry["query"], entry.get("params"))
+            proposals = []
+            for position, row in enumerate(plan):
+                table = str(row.get("table") or "").lower()
+                table = shape.aliases.get(table, table)
+                if table not in shape.usage or not self._needs_index(row):
+                    continue
+                columns = shape.index_for(table, self.column_types[table], lookup=position > 0)
+                if columns:
+                    proposals.append((table, tuple(columns)))
+                    wanted.setdefault((table, tuple(columns)), []).append(entry.get("label") or entry["query"][:60])
+            findings.append({"entry": entry, "plan": plan, "proposals": proposals, "notes": shape.notes})
+
+        # Keep the widest of proposals that share a prefix, and drop any an
+        # existing index already serves.
+        indexes = []
+        for (table, columns), used_by in wanted.items():
+            if any(other_table == table and len(other) > len(columns) and other[:len(columns)] == columns
+                   for other_table, other in wanted):
+                continue
+            if any(cols[:len(columns)] == list(columns) for cols in existing.get(table, {}).values()):
+                continue
+            indexes.append({"table": table, "columns": list(columns), "used_by": used_by,
+                            "name": self.index_name(table, columns)})
+        return findings, indexes
+
+    @staticmethod
+    def index_name(table, columns):
+        return ("ix_" + table + "_" + "_".join(columns))[:64]
+
+    def create_index(self, index):
+        columns = ", ".join(quote_identifier(c) for c in index["columns"])
+        self.db.execute(
+            f"ALTER TABLE {quote_identifier(index['table'])} "
+            f"ADD INDEX {quote_identifier(index['name'])} ({columns}), ALGORITHM=INPLACE, LOCK=NONE"
+        )
+
+    @staticmethod
+    def _plan_summary(plan):
+        return [{"table": r.get("table"), "type": r.get("type"), "key": r.get("key"),
+                 "rows": r.get("rows"), "extra": r.get("extra")} for r in plan]
+
+    def report(self, workload, apply=False):
+        """Before/after latency report; indexes are created only with ``apply``."""
+        findings, indexes = self.analyse(workload)
+        before = [self.time_query(f["entry"]["query"], f["entry"].get("params")) for f in findings]
+        if apply:
+            for index in indexes:
+                self.create_index(index)
+        queries = []
+        for finding, before_ms in zip(findings, before):
+            entry = finding["entry"]
+            row = {
+                "query": entry.get("label") or fingerprint(entry["query"]),
+                "sql": fingerprint(entry["query"]),
+                "before_ms": round(before_ms, 3),
+                "plan_before": self._plan_summary(finding["plan"]),
+                "proposed": [f"{t} ({', '.join(c)})" for t, c in finding["proposals"]],
+                "notes": finding["notes"],
+            }
+            if apply:
+                after_ms = self.time_query(entry["query"], entry.get("params"))
+                row["after_ms"] = round(after_ms, 3)
+                row["speedup"] = round(before_ms / after_ms, 2) if after_ms else None
+                row["plan_after"] = self._plan_summary(self.explain(entry["query"], entry.get("params")))
+            queries.append(row)
+        return {"applied": apply, "indexes": indexes, "queries": queries}
+
+
+def format_report(report):
+    lines = []
+    verb = "Created" if report["applied"] else "Proposed"
+    lines.append(f"{verb} indexes:")
+    for index in report["indexes"] or [{"name": None}]:
+        if index["name"] is None:
+            lines.append("  (none)")
+            continue
+        lines.append(f"  {index['name']}: {index['table']} ({', '.join(index['columns'])})"
+                     f"  <- {', '.join(index['used_by'])}")
+    lines.append("")
+    header = f"{'query':<40} {'before ms':>10}"
+    if report["applied"]:
+        header += f" {'after ms':>10} {'speedup':>8}"
+    lines.append(header)
+    for row in report["queries"]:
+        line = f"{row['query'][:40]:<40} {row['before_ms']:>10.2f}"
+        if report["applied"]:
+            line += f" {row['after_ms']:>10.2f} {row['speedup'] or 0:>7.1f}x"
+        lines.append(line)
+        for note in row["notes"]:
+            lines.append(f"    note: {note}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propose (and optionally create) indexes for the dashboard queries.")
+    parser.add_argument("--log", default=QUERY_LOG, help="JSON-lines query log written by the dashboard")
+    parser.add_argument("--no-insights", action="store_true", help="leave the Q1-Q15 queries out of the workload")
+    parser.add_argument("--apply", action="store_true", help="create the proposed indexes and re-time")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per query (median is reported)")
+    parser.add_argument("--report", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    workload = [] if args.no_insights else insight_workload()
+    if args.log and os.path.exists(args.log):
+        workload += read_query_log(args.log)
+
+    db = ConnectionPool(size=2)
+    try:
+        report = IndexAdvisor(db, repeat=args.repeat).report(workload, apply=args.apply)
+    finally:
+        db.close()
+    print(format_report(report))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
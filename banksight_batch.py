@@ -0,0 +1,161 @@
+"""Batch posting of transactions.
+
+``BatchPoster.post`` takes any number of transactions (a DataFrame or a list
+of dicts with ``customer_id``, ``txn_type``, ``amount`` and optionally
+``txn_time`` / ``status``) and:
+
+* validates them in bulk - amounts, timestamps, and customer_ids checked
+  against ``customers`` with one ``IN`` lookup per thousand IDs;
+* takes a block of ``txn_id`` values per batch from the shared ID allocator
+  instead of scanning ``transactions`` for the highest ID;
+* writes each batch with multi-row INSERTs in one transaction.
+
+Invalid rows are returned with a reason instead of failing the whole upload.
+The CRUD page's "Bulk upload" uses it, and so does the command line:
+
+    python banksight_batch.py new_transactions.csv --batch-rows 5000
+"""
+
+import argparse
+import datetime
+import logging
+import time
+
+import pandas as pd
+
+from banksight_filters import placeholders
+from banksight_frames import batches, parse_dates, records
+from banksight_ingest import BATCH_ROWS, SUMMARY_ROW_LIMIT, TABLES, insert_rows
+from banksight_insights import INSIGHTS
+from banksight_pool import ConnectionPool
+from banksight_rollups import RollupStore
+from banksight_sequences import IdAllocator, SequenceTable
+from banksight_summaries import SummaryStore
+
+
+log = logging.getLogger("banksight.batch")
+
+POST_ROWS = 5000
+# Same ceiling the loaders apply to transaction amounts.
+MAX_AMOUNT = 1000000
+COLUMNS = TABLES["transactions"]["columns"]
+REQUIRED = ["customer_id", "txn_type", "amount"]
+DEFAULT_STATUS = "success"
+
+
+class BatchPoster:
+
+    def __init__(self, db, ids=None, summaries=None, rollups=None, post_rows=POST_ROWS,
+                 batch_rows=BATCH_ROWS):
+        self.db = db
+        self.ids = ids or IdAllocator(SequenceTable(db))
+        self.summaries = summaries
+        self.rollups = rollups
+        self.post_rows = post_rows
+        self.batch_rows = batch_rows
+
+    # ---------------- VALIDATION ----------------
+    def _known_customers(self, ids):
+        known = set()
+        for batch in batches(sorted(ids), 1000):
+            known.update(self.db.fetch_column(
+                f"SELECT customer_id FROM customers WHERE customer_id IN ({placeholders(batch)})", batch))
+        return known
+
+    def validate(self, rows):
+        """``(valid, rejected)``: rows ready to insert, and the others with a ``reason``."""
+        df = pd.DataFrame(rows).copy() if not isinstance(rows, pd.DataFrame) else rows.copy()
+        df.columns = [str(c).strip() for c in df.columns]
+        missing = [c for c in REQUIRED if c not in df.columns]
+        if missing:
+            raise ValueError(f"missing columns: {', '.join(missing)}")
+        df["row"] = range(1, len(df) + 1)
+        for column in ("txn_time", "status"):
+            if column not in df.columns:
+                df[column] = None
+        for column in ("customer_id", "txn_type", "status"):
+            df[column] = df[column].astype("string").str.strip().replace("", pd.NA)
+
+        df["status"] = df["status"].fillna(DEFAULT_STATUS)
+        amount = pd.to_numeric(df["amount"], errors="coerce")
+        raw_time = df["txn_time"].astype("string").str.strip().replace("", pd.NA)
+        stamps = parse_dates(raw_time)
+
+        known = self._known_customers(set(df["customer_id"].dropna()))
+        reason = pd.Series(pd.NA, index=df.index, dtype="string")
+        checks = [
+            (df["customer_id"].isna(), "customer_id is empty"),
+            (~df["customer_id"].isin(known) & df["customer_id"].notna(), "unknown customer_id"),
+            (df["txn_type"].isna(), "txn_type is empty"),
+            (amount.isna(), "amount is not a number"),
+            (amount <= 0, "amount must be positive"),
+            (amount >= MAX_AMOUNT, f"amount must be below {MAX_AMOUNT:,}"),
+            (raw_time.notna() & stamps.isna(), "txn_time is not a date"),
+        ]
+        # First failing check wins.
+        for failed, message in reversed(checks):
+            reason = reason.mask(failed.fillna(False), message)
+
+        df["amount"] = amount.round(2)
+        # A missing txn_time means "now".
+        now = pd.Timestamp(datetime.datetime.now().replace(microsecond=0))
+        df["txn_time"] = stamps.fillna(now).dt.strftime("%Y-%m-%d %H:%M:%S")
+        bad = reason.notna()
+        rejected = df.loc[bad].assign(reason=reason[bad])
+        return df.loc[~bad], rejected
+
+    # ---------------- POSTING ----------------
+    def post(self, rows):
+        """Validate and insert ``rows``.
+
+        Returns the posted rows (with their ``txn_id``), the rejected rows
+        with a ``reason``, the ID range and the elapsed seconds.
+        """
+        started = time.perf_counter()
+        valid, rejected = self.validate(rows)
+        posted, first_id, last_id = [], None, None
+        for batch in batches(valid, self.post_rows):
+            batch = batch.assign(txn_id=self.ids.take("transactions", len(batch)))
+            with self.db.transaction() as cur:
+                insert_rows(cur, "transactions", batch[COLUMNS], self.batch_rows)
+            posted.append(batch[COLUMNS])
+            first_id = first_id or batch["txn_id"].iloc[0]
+            last_id = batch["txn_id"].iloc[-1]
+            if self.summaries is not None:
+                self.summaries.record_change(
+                    "transactions", records(batch[COLUMNS]) if len(batch) <= SUMMARY_ROW_LIMIT else None)
+            if self.rollups is not None:
+                self.rollups.record(batch["txn_time"])
+            log.info("posted %d transactions (%s .. %s)", len(batch), batch["txn_id"].iloc[0], last_id)
+        return {
+            "posted": pd.concat(posted, ignore_index=True) if posted else valid[COLUMNS].iloc[:0],
+            "rejected": rejected, "first_txn_id": first_id, "last_txn_id": last_id,
+            "seconds": time.perf_counter() - started,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Post a CSV of transactions in batches.")
+    parser.add_argument("path", help="CSV with customer_id, txn_type, amount[, txn_time, status]")
+    parser.add_argument("--post-rows", type=int, default=POST_ROWS, help="rows per transaction")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="rows per multi-row INSERT")
+    parser.add_argument("--rejected", help="write rejected rows with their reason to this CSV")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    db = ConnectionPool()
+    try:
+        poster = BatchPoster(db, summaries=SummaryStore(db, INSIGHTS), rollups=RollupStore(db),
+                             post_rows=args.post_rows, batch_rows=args.batch_rows)
+        result = poster.post(pd.read_csv(args.path, dtype=str))
+    finally:
+        db.close()
+    log.info("%d posted, %d rejected in %.2fs", len(result["posted"]), len(result["rejected"]),
+             result["seconds"])
+    if args.rejected and len(result["rejected"]):
+        result["rejected"].to_csv(args.rejected, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,722 @@
+"""Benchmark the dashboard's data paths on synthetic data at 10x/100x/1000x.
+
+The generator scales the bundled CSVs in ``Banksight/Queries/dataset``: rows
+are bootstrapped from the originals (so categorical mixes, null rates and
+per-row relationships such as ``Date_Opened`` < ``Date_Closed`` carry over),
+dates are shifted and amounts jittered, and every key is renumbered so
+foreign keys point at customers, loans and branches that exist at that scale.
+Files are written in chunks and reused on later runs.
+
+The data is then loaded through ``banksight_ingest`` (MySQL) or into a SQLite
+stand-in, and every page's data path is timed with the dashboard's own query
+builders: View Tables pages, each Filter Data branch, the fifteen Analytical
+Insights queries and the CRUD writes. With ``--duckdb`` the insights also run
+on a DuckDB mirror: each question's DuckDB rows are checked against the live
+ones, and the run reports the speedup of those that match and fails on those
+that do not. Results go to
+a JSON file; pass an earlier file as ``--baseline`` to flag regressions
+between releases.
+
+    python banksight_bench.py --scale 10 100 --engine sqlite --output bench.json
+    python banksight_bench.py --scale 10 --engine mysql --baseline bench.json
+    python banksight_bench.py --scale 100 --engine mysql --pages insights --duckdb
+
+``--engine mysql`` TRUNCATEs and reloads the tables of the configured database,
+so point ``BANKSIGHT_DB_NAME`` at a scratch schema created by the notebook.
+"""
+
+import argparse
+import datetime
+import decimal
+import json
+import logging
+import math
+import os
+import platform
+import re
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from banksight_distinct import DistinctIndex
+from banksight_filters import FilterQuery, quote_identifier
+from banksight_frames import STREAM_ROWS, assemble, parse_dates
+from banksight_ingest import DATA_DIR, FIRST, TABLES, Ingester, clean_chunk, insert_rows
+from banksight_insights import INSIGHTS
+from banksight_paging import KeysetPager
+from banksight_schema import NUMERIC_COLUMNS, PRIMARY_KEYS
+
+
+log = logging.getLogger("banksight.bench")
+
+BENCH_DIR = os.environ.get("BANKSIGHT_BENCH_DIR", "bench_data")
+GENERATE_ROWS = 200000
+DATE_JITTER_DAYS = 30
+PAGE_SIZE = 100
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}:\d{2}(\.\d+)?)?$")
+
+# How each table's keys are renumbered; ``customer`` columns point at a
+# generated customer, ``branch`` / ``loan`` at a generated branch name / loan.
+SYNTHETIC = {
+    "customers": {"id": ("customer_id", "C{:04d}")},
+    # One account per customer, as in the bundled data.
+    "accounts": {"id": ("customer_id", "C{:04d}")},
+    "transactions": {"id": ("txn_id", "T{:05d}"), "customer": ("customer_id", "C{:04d}")},
+    "branches": {"id": ("Branch_ID", "{}")},
+    # loans / credit_cards carry the bare customer number; ingest pads it.
+    "loans": {"id": ("Loan_ID", "{}"), "customer": ("Customer_ID", "{}"), "branch": "Branch"},
+    "credit_cards": {"id": ("Card_ID", "{}"), "customer": ("Customer_ID", "{}"), "branch": "Branch"},
+    "support_tickets": {"id": ("Ticket_ID", "T{:05d}"), "customer": ("Customer_ID", "C{:04d}"),
+                        "branch": "Branch_Name", "loan": "Loan_ID"},
+}
+
+
+# ---------------- SYNTHETIC DATA ----------------
+def _read_base(data_dir):
+    return {table: pd.read_csv(os.path.join(data_dir, f"{table}.csv"), dtype=str)
+            for table in TABLES}
+
+
+def row_counts(base, scale):
+    counts = {table: len(df) * scale for table, df in base.items()}
+    counts["accounts"] = counts["customers"]
+    return counts
+
+
+def _branch_name(base_names, index):
+    # Copy 0 keeps the original names, later copies get a number before " Branch".
+    copy, name = divmod(int(index), len(base_names))
+    name = base_names[name]
+    return name if copy == 0 else name.replace(" Branch", f" {copy} Branch")
+
+
+def _synthesize(table, base, start, size, counts, branch_names, rng):
+    """Rows ``start + 1 .. start + size`` of the scaled ``table``."""
+    spec = SYNTHETIC[table]
+    if table == "branches":
+        # Cycled rather than sampled so row i carries branch name i.
+        picks = np.arange(start, start + size) % len(base)
+    else:
+        picks = rng.integers(0, len(base), size)
+    df = base.iloc[picks].reset_index(drop=True)
+
+    # Same shift for every date of a row keeps their order intact.
+    shift = pd.to_timedelta(rng.integers(-DATE_JITTER_DAYS, DATE_JITTER_DAYS + 1, size), unit="D")
+    for column in TABLES[table]["dates"]:
+        values = df[column]
+        has_time = values.str.len().max() > 10
+        df[column] = (parse_dates(values) + shift).dt.strftime(
+            "%Y-%m-%d %H:%M:%S" if has_time else "%Y-%m-%d")
+
+    for column in NUMERIC_COLUMNS[table]:
+        values = df[column]
+        if values.str.contains(".", regex=False).any():
+            jitter = rng.uniform(0.9, 1.1, size)
+            df[column] = (pd.to_numeric(values, errors="coerce") * jitter).round(2).astype(str)
+
+    if table == "customers":
+        parts = df["name"].str.split(" ", n=1)
+        last = parts.str[-1].iloc[rng.integers(0, size, size)].reset_index(drop=True)
+        df["name"] = parts.str[0] + " " + last
+
+    column, fmt = spec["id"]
+    df[column] = [fmt.format(n) for n in range(start + 1, start + size + 1)]
+    if "customer" in spec:
+        column, fmt = spec["customer"]
+        df[column] = [fmt.format(n) for n in rng.integers(1, counts["customers"] + 1, size)]
+    if "branch" in spec:
+        df[spec["branch"]] = [_branch_name(branch_names, i)
+                              for i in rng.integers(0, counts["branches"], size)]
+    if "loan" in spec:
+        column = spec["loan"]
+        loans = pd.Series(rng.integers(1, counts["loans"] + 1, size).astype(str))
+        df[column] = loans.where(df[column].notna())
+    if table == "branches":
+        df["Branch_Name"] = [_branch_name(branch_names, i) for i in range(start, start + size)]
+    return df[TABLES[table]["columns"]]
+
+
+def generate(scale, out_dir, data_dir=DATA_DIR, seed=7, chunk_rows=GENERATE_ROWS):
+    """Write the scaled CSVs to ``out_dir`` (skipped when they are already there)."""
+    marker = os.path.join(out_dir, "manifest.json")
+    if os.path.exists(marker):
+        with open(marker, encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        if manifest["scale"] == scale and manifest["seed"] == seed:
+            return manifest["rows"]
+    os.makedirs(out_dir, exist_ok=True)
+    base = _read_base(data_dir)
+    counts = row_counts(base, scale)
+    branch_names = base["branches"]["Branch_Name"].tolist()
+    rng = np.random.default_rng(seed)
+    for table in TABLES:
+        path = os.path.join(out_dir, f"{table}.csv")
+        started = time.perf_counter()
+        for start in range(0, counts[table], chunk_rows):
+            size = min(chunk_rows, counts[table] - start)
+            df = _synthesize(table, base[table], start, size, counts, branch_names, rng)
+            df.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+        log.info("generated %-16s %10d rows in %.1fs", table, counts[table], time.perf_counter() - started)
+    with open(marker, "w", encoding="utf-8") as handle:
+        json.dump({"scale": scale, "seed": seed, "rows": counts}, handle, indent=2)
+    return counts
+
+
+# ---------------- SQLITE STAND-IN ----------------
+def _sqlite_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _year(value):
+    return int(str(value)[:4]) if value else None
+
+
+def _datediff(end, start):
+    if end is None or start is None:
+        return None
+    return (datetime.date.fromisoformat(str(end)[:10]) - datetime.date.fromisoformat(str(start)[:10])).days
+
+
+class SQLiteDB:
+    """The ``ConnectionPool`` helper API over a SQLite file.
+
+    MySQL's ``%s`` placeholders, ``YEAR``, ``DATEDIFF`` and ``NOW`` are
+    translated, and text columns use ``NOCASE`` like MySQL's default collation.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.create_function("YEAR", 1, _year, deterministic=True)
+            conn.create_function("DATEDIFF", 2, _datediff, deterministic=True)
+            conn.create_function("NOW", 0, lambda: datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _args(query, params):
+        return query.replace("%s", "?"), [_sqlite_value(v) for v in (params or [])]
+
+    def read_sql(self, query, params=None, dtypes=None, chunk_rows=STREAM_ROWS):
+        query, params = self._args(query, params)
+        return assemble(pd.read_sql(query, self._conn(), params=params, chunksize=chunk_rows), dtypes)
+
+    def fetch_all(self, query, params=None):
+        return self._conn().execute(*self._args(query, params)).fetchall()
+
+    def fetch_one(self, query, params=None):
+        return self._conn().execute(*self._args(query, params)).fetchone()
+
+    def fetch_dict(self, query, params=None):
+        cur = self._conn().execute(*self._args(query, params))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return {d[0]: value for d, value in zip(cur.description, row)}
+
+    def fetch_column(self, query, params=None):
+        return [row[0] for row in self.fetch_all(query, params)]
+
+    def execute(self, query, params=None):
+        return self._conn().execute(*self._args(query, params)).rowcount
+
+    @contextmanager
+    def transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN")
+        cur = _SQLiteCursor(conn.cursor())
+        try:
+            yield cur
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _SQLiteCursor:
+
+    def __init__(self, cur):
+        self.cur = cur
+
+    def execute(self, query, params=None):
+        self.cur.execute(*SQLiteDB._args(query, params))
+
+    def executemany(self, query, rows):
+        self.cur.executemany(query.replace("%s", "?"), [[_sqlite_value(v) for v in row] for row in rows])
+
+
+def load_sqlite(db, data_dir, chunk_size=GENERATE_ROWS):
+    """Create the tables and load ``data_dir`` with the ingest cleaning."""
+    customer_ids = None
+    for table in FIRST + [t for t in TABLES if t not in FIRST]:
+        spec = TABLES[table]
+        columns = ", ".join(
+            f"{quote_identifier(c)} {'NUMERIC' if c in NUMERIC_COLUMNS[table] else 'TEXT COLLATE NOCASE'}"
+            for c in spec["columns"])
+        db.execute(f"DROP TABLE IF EXISTS {quote_identifier(table)}")
+        db.execute(f"CREATE TABLE {quote_identifier(table)} ({columns}, "
+                   f"PRIMARY KEY ({quote_identifier(PRIMARY_KEYS[table])}))")
+        seen = set()
+        for chunk in pd.read_csv(os.path.join(data_dir, f"{table}.csv"), dtype=str, chunksize=chunk_size):
+            df = clean_chunk(table, chunk, seen, customer_ids if spec.get("customer_fk") else None)
+            with db.transaction() as cur:
+                insert_rows(cur, table, df, batch_rows=chunk_size)
+        if table == "customers":
+            customer_ids = set(db.fetch_column("SELECT customer_id FROM customers"))
+    db.execute("ANALYZE")
+
+
+def load_mysql(db, data_dir, workers=4):
+    ingester = Ingester(db, data_dir=data_dir, restart=True)
+    return ingester.run(list(TABLES), workers)
+
+
+# ---------------- TIMING ----------------
+class Bench:
+
+    def __init__(self, repeat=5, warmup=1):
+        self.repeat = repeat
+        self.warmup = warmup
+        self.cases = []
+
+    def add(self, page, case, runs, rows=None):
+        runs = sorted(runs)
+        self.cases.append({
+            "page": page, "case": case, "rows": rows,
+            "median_ms": round(statistics.median(runs), 3),
+            "p95_ms": round(runs[min(len(runs) - 1, int(len(runs) * 0.95))], 3),
+            "min_ms": round(runs[0], 3), "max_ms": round(runs[-1], 3),
+        })
+        log.info("%-10s %-32s %10.2f ms", page, case, statistics.median(runs))
+
+    def time(self, page, case, fn):
+        """Run ``fn`` warmup + repeat times and record its wall-clock times."""
+        try:
+            for _ in range(self.warmup):
+                fn()
+            runs, rows = [], None
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                result = fn()
+                runs.append((time.perf_counter() - started) * 1000)
+                rows = _row_count(result)
+        except Exception as exc:
+            log.warning("%s / %s failed: %s", page, case, exc)
+            self.cases.append({"page": page, "case": case, "error": str(exc)})
+            return
+        self.add(page, case, runs, rows)
+
+
+def _row_count(result):
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, int):
+        return result
+    return None
+
+
+def _pick(db, table, columns):
+    """Widget selections taken from one mid-table row, so the filter matches something."""
+    if not columns:
+        return {}
+    total = db.fetch_one(f"SELECT COUNT(*) FROM {quote_identifier(table)}")[0]
+    row = db.fetch_dict(
+        f"SELECT {', '.join(quote_identifier(c) for c in columns)} FROM {quote_identifier(table)} "
+        f"ORDER BY {quote_identifier(PRIMARY_KEYS[table])} LIMIT 1 OFFSET %s", (total // 2,))
+    return row or {}
+
+
+def _date_range(db, table, column):
+    col = quote_identifier(column)
+    low, high = db.fetch_one(f"SELECT MIN({col}), MAX({col}) FROM {quote_identifier(table)}")
+    if low is None or high is None:
+        return None, None
+    return pd.Timestamp(low).date(), pd.Timestamp(high).date()
+
+
+# Filter Data branches: the option widgets each one fills and the predicates
+# a typical selection adds, mirroring the page.
+FILTER_BRANCHES = {
+    "customers": {
+        "options": ["customer_id", "name", "gender", "city", "account_type"],
+        "pick": ["city", "account_type"], "dates": "join_date", "order_by": "customer_id",
+    },
+    "accounts": {
+        "options": ["customer_id"], "pick": [], "dates": "last_updated", "order_by": "customer_id",
+        "between": ("account_balance", 10000, 500000), "aggregate": "AVG(account_balance)",
+    },
+    "loans": {
+        "options": ["Customer_ID", "Loan_ID", "Account_ID", "Branch", "Interest_Rate", "Loan_Type",
+                    "Loan_Status"],
+        "pick": ["Loan_Type", "Loan_Status"], "dates": "Start_Date", "order_by": "Loan_ID",
+        "not_null": ["Start_Date", "End_Date"],
+    },
+    "transactions": {
+        "options": ["txn_id", "customer_id", "txn_type", "status"],
+        "pick": ["txn_type", "status"], "dates": "txn_time", "order_by": "txn_id",
+        "between": ("amount", 1000, 50000),
+    },
+    "branches": {
+        "options": ["Branch_ID", "Branch_Name", "City", "Manager_Name", "Performance_Rating"],
+        "pick": ["Performance_Rating"], "dates": "Opening_Date", "order_by": "Branch_ID",
+        "between": ("Total_Employees", 20, 120),
+    },
+    "support_tickets": {
+        "options": ["Ticket_ID", "Customer_ID", "Account_ID", "Loan_ID", "Branch_Name", "Issue_Category",
+                    "Priority", "Status", "Channel", "Support_Agent", "Customer_Rating"],
+        "pick": ["Priority", "Status"], "dates": "Date_Opened", "order_by": "Ticket_ID",
+    },
+    "credit_cards": {
+        "options": ["Customer_ID", "Account_ID", "Card_Type", "Card_Network", "Status"],
+        "pick": ["Card_Type", "Card_Network"], "order_by": "Card_ID",
+        "between": ("Credit_Limit", 50000, 500000),
+    },
+}
+
+
+def bench_view(bench, db):
+    for table, key in PRIMARY_KEYS.items():
+        pager = KeysetPager(table, key, db.read_sql, page_size=PAGE_SIZE)
+        total = db.fetch_one(f"SELECT COUNT(*) FROM {quote_identifier(table)}")[0]
+        deep = db.fetch_one(f"SELECT {quote_identifier(key)} FROM {quote_identifier(table)} "
+                            f"ORDER BY {quote_identifier(key)} LIMIT 1 OFFSET %s", (int(total * 0.9),))
+        bench.time("view", f"{table}.first_page", lambda: pager.fetch(prefetch=False))
+        if deep:
+            bench.time("view", f"{table}.deep_page", lambda: pager.fetch(deep[0], prefetch=False))
+        bench.time("view", f"{table}.row_count", lambda: pager.estimate_count()[0])
+
+
+def bench_filters(bench, db):
+    for table, branch in FILTER_BRANCHES.items():
+        bench.time("filter", f"{table}.options", lambda: [
+            DistinctIndex(db.fetch_all).options(table, column) for column in branch["options"]])
+
+        picks = _pick(db, table, branch["pick"])
+
+        def run():
+            fq = FilterQuery(table)
+            fq.not_null(*branch.get("not_null", []))
+            for column, value in picks.items():
+                fq.isin(column, [value])
+            if "between" in branch:
+                fq.between(*branch["between"])
+            if "dates" in branch:
+                fq.date_between(branch["dates"], *_date_range(db, table, branch["dates"]))
+            total = db.fetch_one(*fq.count())[0]
+            db.read_sql(*fq.select(order_by=branch["order_by"], limit=PAGE_SIZE, offset=0))
+            if "aggregate" in branch:
+                db.fetch_one(*fq.aggregate(value=branch["aggregate"]))
+            return total
+
+        bench.time("filter", f"{table}.query", run)
+        last = {}
+
+        def last_page():
+            fq = FilterQuery(table)
+            fq.not_null(*branch.get("not_null", []))
+            total = last.setdefault("total", db.fetch_one(*fq.count())[0])
+            return db.read_sql(*fq.select(order_by=branch["order_by"], limit=PAGE_SIZE,
+                                          offset=max(0, total - PAGE_SIZE)))
+
+        bench.time("filter", f"{table}.last_page", last_page)
+
+
+def _cell(value):
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (decimal.Decimal, np.number, int, float)) and not isinstance(value, bool):
+        return None if math.isnan(value) else float(value)
+    if isinstance(value, (datetime.date, np.datetime64)) or (
+            isinstance(value, str) and ISO_DATE.match(value)):  # SQLite hands dates back as text
+        return pd.Timestamp(value).isoformat()
+    return str(value).lower()
+
+
+def _row_key(row):
+    return [(0, "") if v is None else (1, round(v, 2)) if isinstance(v, float) else (2, v) for v in row]
+
+
+def answer_difference(expected, actual):
+    """Why ``actual`` is not the same answer as ``expected``, or None when it is.
+
+    Rows are compared as sorted sets of values: row order, dtypes (Decimal
+    vs float, date vs Timestamp), text case and float noise below 1e-4 are
+    not differences.
+    """
+    if len(expected.columns) != len(actual.columns):
+        return f"{len(actual.columns)} columns, expected {len(expected.columns)}"
+    if len(expected) != len(actual):
+        return f"{len(actual)} rows, expected {len(expected)}"
+    rows = [sorted(([_cell(v) for v in row] for row in df.itertuples(index=False, name=None)), key=_row_key)
+            for df in (expected, actual)]
+    for number, (want, got) in enumerate(zip(*rows)):
+        for a, b in zip(want, got):
+            same = (math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-4) if isinstance(a, float) and isinstance(b, float)
+                    else a == b)
+            if not same:
+                return f"sorted row {number}: {got}, expected {want}"
+    return None
+
+
+def bench_insights(bench, db, summaries=None, columnar=None):
+    """Time every question; with ``columnar``, also check DuckDB gives the live answer.
+
+    Returns ``{question: reason}`` for the questions whose DuckDB rows differ.
+    """
+    mismatches = {}
+    for insight in INSIGHTS:
+        bench.time("insights", f"{insight.name}.live", lambda: db.read_sql(*insight.live_sql()))
+        if columnar is not None:
+            bench.time("insights", f"{insight.name}.duckdb", lambda: columnar.run_insight(insight))
+            try:
+                reason = answer_difference(db.read_sql(*insight.live_sql()), columnar.run_insight(insight))
+            except Exception as exc:
+                reason = str(exc)
+            if reason is not None:
+                log.warning("%s: DuckDB answer differs from live: %s", insight.name, reason)
+                mismatches[insight.name] = reason
+        if summaries is not None:
+            bench.time("insights", f"{insight.name}.rebuild",
+                       lambda: summaries.refresh(insight.name, full=True)["groups_refreshed"])
+            bench.time("insights", f"{insight.name}.materialized",
+                       lambda: summaries.read(insight.name)[0])
+    return mismatches
+
+
+def bench_crud(bench, db, summaries=None):
+    """The CRUD page's statements on a throwaway customer, cleaned up by its own delete."""
+    index = DistinctIndex(db.fetch_all)
+    counter = iter(range(1, 10 ** 9))
+    state = {}
+
+    def record(table, old=None, new=None):
+        index.apply_write(table, old, new)
+        if summaries is not None:
+            summaries.record_change(table, [old, new])
+
+    def add_customer():
+        cid = state["cid"] = f"B{next(counter):08d}"
+        row = {"customer_id": cid, "name": "Bench Customer", "gender": "F", "age": 30,
+               "city": "Bench City", "account_type": "Savings", "join_date": datetime.date.today()}
+        db.execute("INSERT INTO customers (customer_id, name, gender, age, city, account_type, join_date) "
+                   "VALUES (%s, %s, %s, %s, %s, %s, %s)", list(row.values()))
+        db.execute("INSERT INTO accounts (customer_id, account_balance, last_updated) VALUES (%s, %s, %s)",
+                   (cid, 1000.0, datetime.date.today()))
+        record("customers", new=row)
+
+    def add_transaction():
+        last = db.fetch_one("SELECT txn_id FROM transactions "
+                            "ORDER BY CAST(SUBSTRING(txn_id,2) AS UNSIGNED) DESC LIMIT 1")
+        txn_id = state["txn_id"] = f"T{int(last[0][1:]) + 1:05d}" if last else "T00001"
+        row = {"txn_id": txn_id, "customer_id": state["cid"], "txn_type": "deposit", "amount": 500.0,
+               "txn_time": datetime.datetime.now().replace(microsecond=0), "status": "success"}
+        db.execute("INSERT INTO transactions (txn_id, customer_id, txn_type, amount, txn_time, status) "
+                   "VALUES (%s, %s, %s, %s, %s, %s)", list(row.values()))
+        record("transactions", new=row)
+
+    def update_customer():
+        old = db.fetch_dict("SELECT * FROM customers WHERE customer_id = %s", (state["cid"],))
+        db.execute("UPDATE customers SET name = %s, gender = %s, age = %s, city = %s, account_type = %s, "
+                   "join_date = %s WHERE customer_id = %s",
+                   ("Bench Customer", "M", 31, "Bench City", "Current", datetime.date.today(), state["cid"]))
+        record("customers", old=old, new=dict(old, gender="M", age=31, account_type="Current"))
+
+    def update_balance():
+        db.fetch_one("SELECT account_balance FROM accounts WHERE customer_id=%s", (state["cid"],))
+        db.execute("UPDATE accounts SET account_balance=%s, last_updated=NOW() WHERE customer_id=%s",
+                   (2500.0, state["cid"]))
+        record("accounts", new={"customer_id": state["cid"], "account_balance": 2500.0})
+
+    def update_transaction():
+        db.fetch_one("SELECT txn_type, amount, txn_time, status FROM transactions WHERE txn_id=%s",
+                     (state["txn_id"],))
+        db.execute("UPDATE transactions SET txn_type=%s, amount=%s, txn_time=%s, status=%s WHERE txn_id=%s",
+                   ("withdrawal", 250.0, datetime.date.today(), "success", state["txn_id"]))
+        record("transactions")
+
+    def delete_customer():
+        cid = state["cid"]
+        db.execute("DELETE FROM transactions WHERE customer_id=%s", (cid,))
+        db.execute("DELETE FROM accounts WHERE customer_id=%s", (cid,))
+        db.execute("DELETE FROM loans WHERE customer_id=%s", (cid,))
+        db.execute("DELETE FROM support_tickets WHERE Customer_ID=%s", (cid,))
+        db.execute("DELETE FROM customers WHERE customer_id=%s", (cid,))
+        index.invalidate("transactions", "accounts", "loans", "support_tickets", "customers")
+
+    steps = [("add_customer", add_customer), ("add_transaction", add_transaction),
+             ("update_customer", update_customer), ("update_balance", update_balance),
+             ("update_transaction", update_transaction), ("delete_customer", delete_customer)]
+    timings = {name: [] for name, _ in steps}
+    for _ in range(bench.warmup + bench.repeat):
+        for name, step in steps:
+            started = time.perf_counter()
+            step()
+            timings[name].append((time.perf_counter() - started) * 1000)
+    for name, runs in timings.items():
+        bench.add("crud", name, runs[bench.warmup:], rows=1)
+
+
+# ---------------- RUNS ----------------
+def run_scale(scale, engine, args):
+    data_dir = os.path.join(args.bench_dir, f"x{scale}")
+    started = time.perf_counter()
+    rows = generate(scale, data_dir, args.data_dir, seed=args.seed)
+    generate_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    summaries = None
+    if engine == "sqlite":
+        db = SQLiteDB(os.path.join(args.bench_dir, f"x{scale}.sqlite"))
+        load_sqlite(db, data_dir)
+    else:
+        from banksight_pool import ConnectionPool
+        from banksight_summaries import SummaryStore
+
+        db = ConnectionPool(size=args.workers + 1, init_command="SET FOREIGN_KEY_CHECKS = 0")
+        load_mysql(db, data_dir, args.workers)
+        summaries = SummaryStore(db, INSIGHTS)
+    load_seconds = time.perf_counter() - started
+
+    columnar, sync_seconds = None, None
+    if args.duckdb and "insights" in args.pages:
+        from banksight_columnar import ColumnarEngine
+
+        started = time.perf_counter()
+        columnar = ColumnarEngine(":memory:")
+        columnar.sync(db)
+        sync_seconds = time.perf_counter() - started
+
+    bench = Bench(repeat=args.repeat, warmup=args.warmup)
+    mismatches = {}
+    try:
+        loaded = {t: db.fetch_one(f"SELECT COUNT(*) FROM {quote_identifier(t)}")[0] for t in TABLES}
+        if "view" in args.pages:
+            bench_view(bench, db)
+        if "filter" in args.pages:
+            bench_filters(bench, db)
+        if "insights" in args.pages:
+            mismatches = bench_insights(bench, db, summaries, columnar)
+        if "crud" in args.pages:
+            bench_crud(bench, db, summaries)
+    finally:
+        db.close()
+    return {
+        "engine": engine, "scale": scale, "seed": args.seed,
+        "rows_generated": rows, "rows_loaded": loaded,
+        "generate_seconds": round(generate_seconds, 2), "load_seconds": round(load_seconds, 2),
+        "repeat": args.repeat, "cases": bench.cases,
+        "duckdb_sync_seconds": round(sync_seconds, 2) if sync_seconds is not None else None,
+        "duckdb_speedup": duckdb_speedups(bench.cases, mismatches) if columnar is not None else None,
+        "duckdb_mismatches": mismatches if columnar is not None else None,
+    }
+
+
+def duckdb_speedups(cases, mismatches=()):
+    """Live median over DuckDB median for each question timed both ways.
+
+    Questions in ``mismatches`` get no speedup: a fast wrong answer is not one.
+    """
+    medians = {c["case"]: c["median_ms"] for c in cases if c["page"] == "insights" and "median_ms" in c}
+    return {case[:-len(".live")]: round(live / max(medians[case[:-len(".live")] + ".duckdb"], 1e-3), 2)
+            for case, live in medians.items()
+            if case.endswith(".live") and case[:-len(".live")] + ".duckdb" in medians
+            and case[:-len(".live")] not in mismatches}
+
+
+def compare(results, baseline, tolerance):
+    """Cases whose median got more than ``tolerance`` slower than in ``baseline``."""
+    before = {(r["engine"], r["scale"], c["page"], c["case"]): c
+              for r in baseline["runs"] for c in r["cases"] if "median_ms" in c}
+    regressions = []
+    for run in results["runs"]:
+        for case in run["cases"]:
+            old = before.get((run["engine"], run["scale"], case["page"], case["case"]))
+            if old is None or "median_ms" not in case:
+                continue
+            ratio = case["median_ms"] / max(old["median_ms"], 1e-3)
+            case["baseline_median_ms"] = old["median_ms"]
+            case["ratio"] = round(ratio, 3)
+            # Sub-millisecond cases are all noise.
+            if ratio > 1 + tolerance and case["median_ms"] - old["median_ms"] > 1:
+                regressions.append(f"{run['engine']} x{run['scale']} {case['page']}/{case['case']}: "
+                                   f"{old['median_ms']:.2f} -> {case['median_ms']:.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the BankSight page data paths.")
+    parser.add_argument("--scale", type=int, nargs="+", default=[10], help="multiples of the bundled data")
+    parser.add_argument("--engine", choices=["sqlite", "mysql"], nargs="+", default=["sqlite"])
+    parser.add_argument("--pages", nargs="+", choices=["view", "filter", "insights", "crud"],
+                        default=["view", "filter", "insights", "crud"])
+    parser.add_argument("--data-dir", default=DATA_DIR, help="bundled CSVs the generator scales")
+    parser.add_argument("--bench-dir", default=BENCH_DIR, help="where generated data is kept")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--duckdb", action="store_true",
+                        help="also run the insights on the DuckDB mirror, check the answers and report the speedup")
+    parser.add_argument("--workers", type=int, default=4, help="mysql: tables loaded in parallel")
+    parser.add_argument("--generate-only", action="store_true")
+    parser.add_argument("--output", default="banksight_bench.json")
+    parser.add_argument("--baseline", help="earlier --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown ratio over the baseline reported as a regression")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.generate_only:
+        for scale in args.scale:
+            generate(scale, os.path.join(args.bench_dir, f"x{scale}"), args.data_dir, seed=args.seed)
+        return 0
+
+    results = {
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(), "pandas": pd.__version__, "platform": platform.platform(),
+        "runs": [run_scale(scale, engine, args) for engine in args.engine for scale in args.scale],
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        results["regressions"] = regressions
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, default=str)
+    log.info("results written to %s", args.output)
+    for line in regressions:
+        log.warning("regression: %s", line)
+    mismatches = [f"{run['engine']} x{run['scale']} {name}: {reason}" for run in results["runs"]
+                  for name, reason in (run["duckdb_mismatches"] or {}).items()]
+    for line in mismatches:
+        log.error("DuckDB answer differs: %s", line)
+    return 1 if regressions or mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Process-wide DataFrame cache for table loads.
+
+Entries are keyed by the tables a query reads plus the query text and its
+parameters. They expire after a TTL and the least recently used entries are
+evicted once the cache grows past its memory cap. Writers call
+``invalidate`` with the tables they touched so the next read goes back to
+the database. Each invalidation also bumps a per-table counter; a load that
+was already running when its tables were invalidated is returned to its
+caller but not stored, since it may have read the rows before the write.
+
+Cached frames are shared between sessions, not copied: callers must treat
+them as read-only and copy before changing one.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+CACHE_TTL = float(os.environ.get("BANKSIGHT_CACHE_TTL", 300))
+CACHE_MAX_BYTES = int(os.environ.get("BANKSIGHT_CACHE_MAX_MB", 256)) * 1024 * 1024
+
+
+def frame_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class TableCache:
+
+    def __init__(self, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._invalidations = {}
+        self._clears = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(tables, query, params=None):
+        if isinstance(tables, str):
+            tables = (tables,)
+        if isinstance(params, dict):
+            params = tuple(sorted(params.items()))
+        elif params is not None:
+            params = tuple(params)
+        return (tuple(sorted(tables)), " ".join(query.split()), params)
+
+    def _generation(self, tables):
+        return self._clears, tuple(self._invalidations.get(t, 0) for t in tables)
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            df, stored_at, _ = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return df
+
+    def put(self, key, df, generation=None):
+        """Store ``df``; with ``generation``, only if its tables were not invalidated since."""
+        size = frame_size(df)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation(key[0]):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (df, time.monotonic(), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def get_or_load(self, tables, query, loader, params=None):
+        """Return the cached frame (shared; do not modify), calling ``loader()`` on a miss."""
+        key = self.make_key(tables, query, params)
+        df = self.get(key)
+        if df is None:
+            with self._lock:
+                generation = self._generation(key[0])
+            df = loader()
+            self.put(key, df, generation)
+        return df
+
+    def invalidate(self, *tables):
+        tables = set(tables)
+        with self._lock:
+            for table in tables:
+                self._invalidations[table] = self._invalidations.get(table, 0) + 1
+            for key in [k for k in self._entries if tables.intersection(k[0])]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._clears += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
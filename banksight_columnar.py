@@ -0,0 +1,302 @@
+"""In-process columnar engine (DuckDB) for the Analytical Insights questions.
+
+Q1-Q15 are aggregates over whole tables. MySQL's row store works through
+them one row at a time; DuckDB scans the same data column by column, in
+vectorized batches across all cores. ``ColumnarEngine`` keeps a copy of the
+tables and runs each insight's unchanged live SQL on it. Two dialect gaps are
+bridged when the connection opens: MySQL's two-argument ``DATEDIFF`` gets a
+macro, and string comparisons default to the ``nocase`` collation because
+MySQL's default collation ignores case (``status = 'Failed'`` has to match the
+stored ``failed``, as it does live).
+
+The copy can come from three places:
+
+* ``sync(db)`` mirrors the live tables in keyset-ordered chunks. Each table
+  is built under a staging name and swapped in, so queries never see a half
+  loaded table. ``start_sync`` repeats this every ``BANKSIGHT_DUCKDB_SYNC``
+  seconds in a background thread. Tables marked stale by ``mark_stale``
+  (the dashboard calls it after every write) are re-synced within
+  ``BANKSIGHT_DUCKDB_STALE_DELAY`` seconds.
+* ``load_csv(data_dir)`` reads the source CSVs with the ingest cleaning.
+* ``attach_snapshot(snapshot)`` creates views over a Parquet snapshot, with
+  nothing copied.
+
+The Insights page lets each question pick MySQL or DuckDB. The questions in
+``BANKSIGHT_DUCKDB_QUERIES`` default to DuckDB, and ``BANKSIGHT_DUCKDB=0``
+turns the engine off. ``banksight_bench.py --duckdb`` times both paths side
+by side.
+
+    python banksight_columnar.py --csv Banksight/Queries/dataset
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import duckdb
+except ImportError:  # the engine is optional; MySQL answers every question without it
+    duckdb = None
+
+from banksight_frames import parse_dates
+from banksight_ingest import DATA_DIR, FIRST, TABLES, clean_chunk
+from banksight_insights import INSIGHTS
+from banksight_schema import NUMERIC_COLUMNS, PRIMARY_KEYS
+from banksight_snapshot import EXPORT_ROWS, PARTITION_COLUMN, read_chunks, settle
+
+
+log = logging.getLogger("banksight.columnar")
+
+ENABLED = os.environ.get("BANKSIGHT_DUCKDB", "1") != "0"
+DUCKDB_PATH = os.environ.get("BANKSIGHT_DUCKDB_PATH", ":memory:")
+SYNC_INTERVAL = float(os.environ.get("BANKSIGHT_DUCKDB_SYNC", 300))
+STALE_DELAY = float(os.environ.get("BANKSIGHT_DUCKDB_STALE_DELAY", 5))
+DEFAULT_QUERIES = set(filter(None, os.environ.get(
+    "BANKSIGHT_DUCKDB_QUERIES", "q4,q5,q6,q7,q8,q14").split(",")))
+
+# Run on every new connection so the live SQL answers as it does on MySQL:
+# case-insensitive string comparison and grouping (MySQL's default collation),
+# and MySQL's two-argument DATEDIFF (days from b to a), used by Q14.
+SETUP = [
+    "SET default_collation = 'nocase'",
+    "CREATE OR REPLACE MACRO DATEDIFF(a, b) AS date_diff('day', CAST(b AS DATE), CAST(a AS DATE))",
+]
+
+
+def available():
+    return ENABLED and duckdb is not None
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class ColumnarEngine:
+
+    def __init__(self, path=DUCKDB_PATH):
+        if duckdb is None:
+            raise RuntimeError("the columnar engine needs the duckdb package (pip install duckdb)")
+        self.path = path
+        self._con = duckdb.connect(path)
+        for statement in SETUP:
+            self._con.execute(statement)
+        self._lock = threading.Lock()
+        # table -> {"source", "rows", "seconds", "loaded_at"}
+        self.loaded = {}
+        self._kinds = {}
+        self._stale = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._sync_thread = None
+
+    def cursor(self):
+        # DuckDB connections are not thread-safe; every caller gets its own cursor.
+        with self._lock:
+            return self._con.cursor()
+
+    # ---------------- LOADING ----------------
+    def _swap(self, cur, table, build_sql, kind):
+        """Create ``table`` from ``build_sql`` and replace the old one in one transaction."""
+        cur.execute("BEGIN")
+        try:
+            old = self._kinds.get(table)
+            if old:
+                cur.execute(f"DROP {old} IF EXISTS {_quote(table)}")
+            cur.execute(build_sql)
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        self._kinds[table] = kind
+
+    def load_frames(self, table, frames, source):
+        """Replace ``table`` with the concatenation of the DataFrames in ``frames``."""
+        started = time.perf_counter()
+        staging = _quote(f"{table}__load")
+        cur = self.cursor()
+        try:
+            cur.execute(f"DROP TABLE IF EXISTS {staging}")
+            schema, rows = None, 0
+            for df in frames:
+                if schema is None:
+                    schema = settle(pa.Schema.from_pandas(df, preserve_index=False))
+                    cur.register("chunk", pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+                    cur.execute(f"CREATE TABLE {staging} AS SELECT * FROM chunk")
+                else:
+                    cur.register("chunk", pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+                    cur.execute(f"INSERT INTO {staging} SELECT * FROM chunk")
+                cur.unregister("chunk")
+                rows += len(df)
+            if schema is None:
+                log.warning("%s: no rows, keeping the previous copy", table)
+                return None
+            self._swap(cur, table, f"ALTER TABLE {staging} RENAME TO {_quote(table)}", "TABLE")
+        finally:
+            cur.close()
+        info = {"source": source, "rows": rows, "seconds": round(time.perf_counter() - started, 3),
+                "loaded_at": datetime.datetime.now()}
+        self.loaded[table] = info
+        return info
+
+    def sync(self, db, tables=None, chunk_rows=EXPORT_ROWS):
+        """Mirror ``tables`` (default: all) from the live database."""
+        report = {}
+        for table in tables or PRIMARY_KEYS:
+            with self._lock:
+                self._stale.discard(table)
+            report[table] = self.load_frames(table, read_chunks(db, table, chunk_rows), "mysql")
+            log.info("synced %s: %s", table, report[table])
+        return report
+
+    def load_csv(self, data_dir=DATA_DIR, chunk_rows=EXPORT_ROWS):
+        """Load the source CSVs with the same cleaning the MySQL loader applies."""
+        report, customer_ids = {}, None
+        for table in FIRST + [t for t in TABLES if t not in FIRST]:
+            spec = TABLES[table]
+
+            def frames(table=table, spec=spec):
+                seen = set()
+                for chunk in pd.read_csv(os.path.join(data_dir, f"{table}.csv"), dtype=str,
+                                         chunksize=chunk_rows):
+                    df = clean_chunk(table, chunk, seen, customer_ids if spec.get("customer_fk") else None)
+                    for column in spec["dates"]:
+                        df[column] = parse_dates(df[column])
+                    for column in NUMERIC_COLUMNS[table]:
+                        df[column] = pd.to_numeric(df[column], errors="coerce")
+                    yield df
+
+            report[table] = self.load_frames(table, frames(), f"csv:{data_dir}")
+            if table == "customers":
+                customer_ids = set(self.query("SELECT customer_id FROM customers")["customer_id"])
+        return report
+
+    def attach_snapshot(self, snapshot):
+        """Point every table at ``snapshot``'s Parquet files (no copy)."""
+        cur = self.cursor()
+        try:
+            for table in snapshot.tables():
+                files = os.path.join(snapshot.path, table, "**", "*.parquet").replace("'", "''")
+                if snapshot.manifest["tables"][table]["partitioned_by"]:
+                    source = (f"SELECT * EXCLUDE ({PARTITION_COLUMN}) "
+                              f"FROM read_parquet('{files}', hive_partitioning = true)")
+                else:
+                    source = f"SELECT * FROM read_parquet('{files}')"
+                self._swap(cur, table, f"CREATE VIEW {_quote(table)} AS {source}", "VIEW")
+                self.loaded[table] = {"source": f"snapshot:{snapshot.name}",
+                                      "rows": snapshot.manifest["tables"][table]["rows"],
+                                      "seconds": 0.0, "loaded_at": snapshot.created_at}
+        finally:
+            cur.close()
+        return self
+
+    # ---------------- QUERIES ----------------
+    def query(self, sql, params=None):
+        cur = self.cursor()
+        try:
+            return cur.execute(sql.replace("%s", "?"), params or []).df()
+        finally:
+            cur.close()
+
+    def ready(self, tables):
+        return all(t in self.loaded for t in tables)
+
+    def run_insight(self, insight, binding=None):
+        missing = [t for t in insight.tables if t not in self.loaded]
+        if missing:
+            raise RuntimeError(f"columnar engine has not loaded: {', '.join(missing)}")
+        return self.query(*insight.live_sql(binding))
+
+    def freshness(self, tables):
+        """Oldest load time among ``tables``, and whether any has pending writes."""
+        times = [self.loaded[t]["loaded_at"] for t in tables if t in self.loaded]
+        with self._lock:
+            stale = bool(self._stale.intersection(tables))
+        return (min(times) if times else None), stale
+
+    # ---------------- BACKGROUND SYNC ----------------
+    def mark_stale(self, *tables):
+        """Note that ``tables`` changed in MySQL; the sync thread picks them up shortly."""
+        with self._lock:
+            self._stale.update(t for t in tables if t in PRIMARY_KEYS)
+        self._wake.set()
+
+    def start_sync(self, db, interval=SYNC_INTERVAL, stale_delay=STALE_DELAY):
+        """Mirror everything, then keep the mirror current, in a daemon thread."""
+        if self._sync_thread is not None:
+            return self
+        self._sync_thread = threading.Thread(
+            target=self._sync_loop, args=(db, interval, stale_delay),
+            name="banksight-columnar-sync", daemon=True)
+        self._sync_thread.start()
+        return self
+
+    def stop_sync(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _sync_loop(self, db, interval, stale_delay):
+        last_full = -interval
+        self._wake.set()
+        while not self._stop.is_set():
+            woken = self._wake.wait(timeout=max(0.0, interval - (time.monotonic() - last_full)))
+            if self._stop.is_set():
+                return
+            if woken and last_full >= 0:
+                # Let a burst of writes settle into one re-sync.
+                self._stop.wait(stale_delay)
+            self._wake.clear()
+            full = time.monotonic() - last_full >= interval
+            with self._lock:
+                tables = None if full else sorted(self._stale)
+            if tables == []:
+                continue
+            try:
+                self.sync(db, tables)
+                if full:
+                    last_full = time.monotonic()
+            except Exception:
+                log.exception("columnar sync failed; retrying in %.0fs", stale_delay)
+                if tables:
+                    self.mark_stale(*tables)
+                self._stop.wait(stale_delay)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time Q1-Q15 on the columnar engine.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--csv", metavar="DIR", help="load the CSVs in DIR instead of syncing MySQL")
+    source.add_argument("--snapshot", help="attach this Parquet snapshot instead of syncing MySQL")
+    parser.add_argument("--path", default=DUCKDB_PATH, help="DuckDB database file (default: in memory)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    engine = ColumnarEngine(args.path)
+    if args.csv:
+        engine.load_csv(args.csv)
+    elif args.snapshot:
+        from banksight_snapshot import open_snapshot
+
+        engine.attach_snapshot(open_snapshot(args.snapshot))
+    else:
+        from banksight_pool import ConnectionPool
+
+        db = ConnectionPool()
+        try:
+            engine.sync(db)
+        finally:
+            db.close()
+    for insight in INSIGHTS:
+        started = time.perf_counter()
+        df = engine.run_insight(insight)
+        print(f"{insight.name:>4}  {len(df):6d} rows  {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
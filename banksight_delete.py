@@ -0,0 +1,195 @@
+"""Cascading deletion of customers and everything that hangs off them.
+
+``CustomerDeleter.delete(customer_ids)`` removes one customer or thousands
+in a single transaction: the customer rows are locked first, then the
+dependent tables are emptied child-first (card ledger entries, transactions,
+credit cards, support tickets, loans, accounts) and the customers go last.
+Either all of it commits or none of it does, so a failure halfway no longer
+leaves orphaned rows behind.
+
+Each dependent table is deleted with ``DELETE ... LIMIT`` in chunks of
+``BANKSIGHT_DELETE_CHUNK`` rows, so no single statement has to build an
+unbounded undo set or hold the server busy on one huge scan. With
+``atomic=False`` every chunk commits on its own instead: row locks are then
+held only for one chunk, which suits purges too large for one transaction.
+Children still go before customers, so an interrupted run leaves customers
+that can simply be deleted again.
+
+The result reports, per table, the rows deleted, the number of chunks and
+the seconds spent. With ``capture`` it also returns the deleted rows
+themselves (up to that many per table), so the dashboard can update its
+summaries and rollups for just the groups they touched. ``preview`` gives
+the counts without deleting:
+
+    python banksight_delete.py C0001 C0002 --dry-run
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from banksight_filters import placeholders
+from banksight_frames import batches
+from banksight_ledger import LEDGER_DDL
+from banksight_pool import ConnectionPool
+
+
+log = logging.getLogger("banksight.delete")
+
+CHUNK_ROWS = int(os.environ.get("BANKSIGHT_DELETE_CHUNK", 5000))
+# Customer IDs per IN list.
+ID_BATCH = 1000
+
+# Child-first order; ``{ids}`` is the customer IN list.
+DEPENDENTS = [
+    ("card_ledger", "Card_ID IN (SELECT Card_ID FROM credit_cards WHERE Customer_ID IN ({ids}))"),
+    ("transactions", "customer_id IN ({ids})"),
+    ("credit_cards", "Customer_ID IN ({ids})"),
+    ("support_tickets", "Customer_ID IN ({ids})"),
+    ("loans", "Customer_ID IN ({ids})"),
+    ("accounts", "customer_id IN ({ids})"),
+]
+PARENT = ("customers", "customer_id IN ({ids})")
+TABLES = [table for table, _ in DEPENDENTS] + [PARENT[0]]
+
+
+class CustomerDeleter:
+
+    def __init__(self, db, chunk_rows=CHUNK_ROWS, dependents=DEPENDENTS):
+        self.db = db
+        self.chunk_rows = chunk_rows
+        self.dependents = dependents
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _ensure_table(self):
+        # The ledger is created lazily by the Credit / Debit page; make sure
+        # it exists so the cascade does not trip over it on a fresh database.
+        if self._ready:
+            return
+        with self._ready_lock:
+            if not self._ready:
+                self.db.execute(LEDGER_DDL)
+                self._ready = True
+
+    def preview(self, customer_ids):
+        """Rows each table would lose, without deleting anything."""
+        ids = sorted(set(customer_ids))
+        self._ensure_table()
+        counts = {}
+        for table, where in self.dependents + [PARENT]:
+            counts[table] = 0
+            for batch in batches(ids, ID_BATCH):
+                row = self.db.fetch_one(
+                    f"SELECT COUNT(*) FROM {table} WHERE {where.format(ids=placeholders(batch))}", batch)
+                counts[table] += int(row[0])
+        return counts
+
+    def delete(self, customer_ids, atomic=True, capture=0):
+        """Delete the customers and their dependent rows.
+
+        Returns ``{"customers": [...], "missing": [...], "tables": {table:
+        {"rows", "chunks", "seconds"}}, "seconds": ...}``; ``missing`` are
+        requested IDs with no customer row (their orphaned children are
+        still deleted). With ``capture`` > 0 it also has ``"rows": {table:
+        [row dicts]}``, the rows deleted, or None for a table that lost more
+        than ``capture`` of them.
+        """
+        ids = sorted(set(customer_ids))
+        self._ensure_table()
+        started = time.perf_counter()
+        report = {"customers": [], "missing": [], "tables": {}, "atomic": atomic}
+        if capture:
+            report["rows"] = {}
+        if atomic:
+            with self.db.transaction() as cur:
+                self._run(ids, report, _reuse(cur), capture)
+        else:
+            self._run(ids, report, self.db.transaction, capture)
+        report["seconds"] = round(time.perf_counter() - started, 4)
+        log.info("deleted %d customers in %.2fs: %s", len(report["customers"]), report["seconds"],
+                 {t: s["rows"] for t, s in report["tables"].items()})
+        return report
+
+    def _run(self, ids, report, transaction, capture=0):
+        # Lock the customers first so no other writer deletes or re-keys them
+        # while their children are being removed.
+        found = set()
+        for batch in batches(ids, ID_BATCH):
+            with transaction() as cur:
+                cur.execute(f"SELECT customer_id FROM customers WHERE customer_id IN ({placeholders(batch)}) "
+                            "FOR UPDATE", batch)
+                found.update(row[0] for row in cur.fetchall())
+        report["customers"] = [c for c in ids if c in found]
+        report["missing"] = [c for c in ids if c not in found]
+        # Children of a missing customer are orphans; they go as well.
+        for table, where in self.dependents + [PARENT]:
+            if capture:
+                report["rows"][table] = self._capture(table, where, ids, transaction, capture)
+            report["tables"][table] = self._delete_table(table, where, ids, transaction)
+
+    def _capture(self, table, where, ids, transaction, limit):
+        """The rows about to be deleted from ``table`` (locked), or None if there are more than ``limit``."""
+        rows = []
+        for batch in batches(ids, ID_BATCH):
+            with transaction() as cur:
+                cur.execute(f"SELECT * FROM {table} WHERE {where.format(ids=placeholders(batch))} "
+                            f"LIMIT %s FOR UPDATE", list(batch) + [limit - len(rows) + 1])
+                columns = [d[0] for d in cur.description]
+                rows.extend(dict(zip(columns, row)) for row in cur.fetchall())
+            if len(rows) > limit:
+                return None
+        return rows
+
+    def _delete_table(self, table, where, ids, transaction):
+        started = time.perf_counter()
+        rows = chunks = 0
+        for batch in batches(ids, ID_BATCH):
+            query = f"DELETE FROM {table} WHERE {where.format(ids=placeholders(batch))} LIMIT %s"
+            while True:
+                with transaction() as cur:
+                    cur.execute(query, list(batch) + [self.chunk_rows])
+                    deleted = cur.rowcount
+                rows += deleted
+                chunks += 1
+                if deleted < self.chunk_rows:
+                    break
+        return {"rows": rows, "chunks": chunks, "seconds": round(time.perf_counter() - started, 4)}
+
+
+def _reuse(cur):
+    """A ``transaction``-shaped factory that keeps handing out ``cur``."""
+    @contextmanager
+    def transaction():
+        yield cur
+    return transaction
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delete customers and all their dependent rows.")
+    parser.add_argument("customer_ids", nargs="+")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per DELETE statement")
+    parser.add_argument("--no-atomic", action="store_true", help="commit after every chunk")
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows that would go")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    db = ConnectionPool()
+    try:
+        deleter = CustomerDeleter(db, chunk_rows=args.chunk_rows)
+        if args.dry_run:
+            report = deleter.preview(args.customer_ids)
+        else:
+            report = deleter.delete(args.customer_ids, atomic=not args.no_atomic)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
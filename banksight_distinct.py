@@ -0,0 +1,140 @@
+"""Distinct-value index that feeds filter and form widget options.
+
+For every (table, column) a widget asks about, the index keeps the distinct
+values with their row counts. It is built once with a GROUP BY and then kept
+current from the rows the dashboard writes (``apply_write``), so reruns never
+scan the table for options again. Columns with more than ``max_options``
+distinct values (txn_id, customer_id on a large transactions table, ...)
+are flagged as high-cardinality. For those the index keeps no values;
+widgets use ``search`` for a capped prefix lookup instead.
+"""
+
+import decimal
+import os
+import threading
+import time
+
+from banksight_filters import quote_identifier
+
+
+MAX_OPTIONS = int(os.environ.get("BANKSIGHT_MAX_OPTIONS", 2000))
+SEARCH_LIMIT = int(os.environ.get("BANKSIGHT_SEARCH_LIMIT", 50))
+
+
+def plain_value(value):
+    """A widget option as a plain Python value (float for DECIMAL, no numpy scalars)."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def option_sort_key(value):
+    """Sort key for a mixed list of options: non-text values first."""
+    return (isinstance(value, str), value)
+
+
+class _Entry:
+
+    def __init__(self, counts):
+        self.counts = counts
+        self.high_cardinality = counts is None
+        self.built_at = time.time()
+
+
+class DistinctIndex:
+
+    def __init__(self, fetch_all, max_options=MAX_OPTIONS, search_limit=SEARCH_LIMIT):
+        """``fetch_all(sql, params)`` returns row tuples (normally ``ConnectionPool.fetch_all``)."""
+        self.fetch_all = fetch_all
+        self.max_options = max_options
+        self.search_limit = search_limit
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(table, column):
+        # MySQL column names are case-insensitive; the app spells some both ways.
+        return table.lower(), column.lower()
+
+    def _build(self, table, column):
+        col = quote_identifier(column)
+        rows = self.fetch_all(
+            f"SELECT {col}, COUNT(*) FROM {quote_identifier(table)} "
+            f"WHERE {col} IS NOT NULL GROUP BY {col} LIMIT %s",
+            [self.max_options + 1],
+        )
+        if len(rows) > self.max_options:
+            return _Entry(None)
+        return _Entry({plain_value(value): int(count) for value, count in rows})
+
+    def _entry(self, table, column):
+        key = self._key(table, column)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._build(table, column)
+            with self._lock:
+                entry = self._entries.setdefault(key, entry)
+        return entry
+
+    # ---------------- LOOKUPS ----------------
+    def is_high_cardinality(self, table, column):
+        return self._entry(table, column).high_cardinality
+
+    def options(self, table, column):
+        """Sorted distinct values, or None for a high-cardinality column."""
+        entry = self._entry(table, column)
+        if entry.high_cardinality:
+            return None
+        with self._lock:
+            return sorted(entry.counts, key=option_sort_key)
+
+    def counts(self, table, column):
+        entry = self._entry(table, column)
+        with self._lock:
+            return dict(entry.counts or {})
+
+    def search(self, table, column, prefix="", limit=None):
+        """Up to ``limit`` distinct values starting with ``prefix``.
+
+        ``LIKE 'prefix%'`` can range-scan an index on a text column; numeric
+        columns are compared as text, so those are a full scan.
+        """
+        col = quote_identifier(column)
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        rows = self.fetch_all(
+            f"SELECT DISTINCT {col} FROM {quote_identifier(table)} "
+            f"WHERE {col} LIKE %s ORDER BY {col} LIMIT %s",
+            [escaped + "%", int(limit or self.search_limit)],
+        )
+        return [plain_value(row[0]) for row in rows]
+
+    # ---------------- MAINTENANCE ----------------
+    def apply_write(self, table, old=None, new=None):
+        """Fold one written row into the index: ``old`` values out, ``new`` values in."""
+        old = {k.lower(): plain_value(v) for k, v in (old or {}).items()}
+        new = {k.lower(): plain_value(v) for k, v in (new or {}).items()}
+        with self._lock:
+            for (t, column), entry in self._entries.items():
+                if t != table.lower() or entry.high_cardinality:
+                    continue
+                counts = entry.counts
+                if old.get(column) is not None:
+                    remaining = counts.get(old[column], 0) - 1
+                    if remaining > 0:
+                        counts[old[column]] = remaining
+                    else:
+                        counts.pop(old[column], None)
+                if new.get(column) is not None:
+                    counts[new[column]] = counts.get(new[column], 0) + 1
+                    if len(counts) > self.max_options:
+                        entry.counts = None
+                        entry.high_cardinality = True
+
+    def invalidate(self, *tables):
+        tables = {t.lower() for t in tables}
+        with self._lock:
+            for key in [k for k in self._entries if k[0] in tables]:
+                del self._entries[key]
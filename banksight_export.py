@@ -0,0 +1,149 @@
+"""Streaming exports of filtered results as CSV, gzipped CSV or Parquet.
+
+The Filter Data downloads used to run the whole query into a DataFrame and
+render it to one CSV string before handing it over. An export now consumes
+an iterator of DataFrame chunks (``ConnectionPool.stream`` reads them off an
+unbuffered server-side cursor, ``Snapshot.batches`` off the Parquet files)
+and writes each chunk straight to a temporary file:
+
+* CSV: the header goes with the first chunk only.
+* CSV (gzip): the same bytes through ``gzip.GzipFile``.
+* Parquet: one row group per chunk, with the schema fixed by the first chunk.
+
+So the process holds one chunk plus the writer's buffers however many rows
+match. ``lazy_download`` wraps it for ``st.download_button``, which only
+runs the export when the button is clicked.
+
+    python banksight_export.py transactions transactions.parquet
+"""
+
+import argparse
+import gzip
+import io
+import logging
+import os
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from banksight_frames import arrow_frame
+from banksight_ingest import TABLES
+from banksight_snapshot import settle
+
+
+log = logging.getLogger("banksight.export")
+
+EXPORT_ROWS = int(os.environ.get("BANKSIGHT_EXPORT_CHUNK", 20000))
+EXPORT_DIR = os.environ.get("BANKSIGHT_EXPORT_DIR") or None
+
+# label -> (file extension, MIME type)
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def format_for(path):
+    """The FORMATS label whose extension ``path`` ends with."""
+    for label, (ext, _) in sorted(FORMATS.items(), key=lambda item: -len(item[1][0])):
+        if path.endswith("." + ext):
+            return label
+    raise ValueError(f"unknown export format for {path!r}; use one of "
+                     + ", ".join("." + ext for ext, _ in FORMATS.values()))
+
+
+def _write_csv(chunks, out):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    rows, header = 0, True
+    try:
+        for df in chunks:
+            df.to_csv(text, index=False, header=header)
+            header = False
+            rows += len(df)
+        text.flush()
+    finally:
+        text.detach()
+    return rows
+
+
+def _write_parquet(chunks, out, table):
+    writer, rows = None, 0
+    try:
+        for df in chunks:
+            df = arrow_frame(df, TABLES.get(table, {}).get("dates", ()))
+            if writer is None:
+                schema = settle(pa.Schema.from_pandas(df, preserve_index=False))
+                writer = pq.ParquetWriter(out, schema)
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write(chunks, fmt, out, table=None):
+    """Write the DataFrames in ``chunks`` to the binary file ``out``; returns the row count."""
+    if fmt == "CSV":
+        return _write_csv(chunks, out)
+    if fmt == "CSV (gzip)":
+        with gzip.GzipFile(fileobj=out, mode="wb") as packed:
+            return _write_csv(chunks, packed)
+    if fmt == "Parquet":
+        return _write_parquet(chunks, out, table)
+    raise ValueError(f"unknown export format: {fmt}")
+
+
+def export_file(chunks, fmt, table=None):
+    """Write ``chunks`` to a temporary file and return it opened for reading.
+
+    The file is unlinked straight away and disappears when the handle is
+    closed.
+    """
+    started = time.perf_counter()
+    fd, path = tempfile.mkstemp(prefix="banksight-export-", dir=EXPORT_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            rows = write(chunks, fmt, out, table)
+        handle = open(path, "rb")
+    finally:
+        os.unlink(path)
+    log.info("exported %d rows of %s as %s (%d bytes) in %.2fs", rows, table, fmt,
+             os.fstat(handle.fileno()).st_size, time.perf_counter() - started)
+    return handle
+
+
+def lazy_download(make_chunks, fmt, table=None):
+    """A callable for ``st.download_button``; ``make_chunks()`` runs on click."""
+    return lambda: export_file(make_chunks(), fmt, table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a table to CSV, CSV.gz or Parquet.")
+    parser.add_argument("table")
+    parser.add_argument("output", help="file to write; the extension picks the format")
+    parser.add_argument("--order-by", help="column to sort on")
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_ROWS, help="rows per fetch")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    from banksight_filters import FilterQuery
+    from banksight_pool import ConnectionPool
+
+    fmt = format_for(args.output)
+    db = ConnectionPool()
+    try:
+        chunks = db.stream(*FilterQuery(args.table).select(order_by=args.order_by), chunk_rows=args.chunk_rows)
+        with open(args.output, "wb") as out:
+            rows = write(chunks, fmt, out, args.table)
+    finally:
+        db.close()
+    print(f"{rows} rows -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
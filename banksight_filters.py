@@ -0,0 +1,128 @@
+"""Turn Filter Data widget selections into parameterized SQL.
+
+Each call adds one predicate; empty selections are ignored so widgets can be
+wired up unconditionally. ``select`` / ``count`` / ``aggregate`` return a
+``(sql, params)`` pair for ``ConnectionPool.read_sql`` and friends, so only
+matching rows ever leave the database.
+"""
+
+import datetime
+import re
+
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def quote_identifier(name):
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"invalid column or table name: {name!r}")
+    return f"`{name}`"
+
+
+def placeholders(values):
+    """``%s, %s, ...``, one per value, for an ``IN (...)`` or ``VALUES (...)`` list."""
+    return ", ".join(["%s"] * len(values))
+
+
+def _next_day(value):
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return value + datetime.timedelta(days=1)
+
+
+class FilterQuery:
+
+    def __init__(self, table, columns=None):
+        self.table = table
+        self.columns = columns
+        # (op, column, args) tuples; kept engine neutral so the same filter
+        # can later be compiled to something other than SQL.
+        self.predicates = []
+
+    # ---------------- PREDICATES ----------------
+    def isin(self, column, values):
+        values = [v for v in (values or []) if v is not None]
+        if values:
+            self.predicates.append(("in", column, tuple(values)))
+        return self
+
+    def eq(self, column, value):
+        if value is not None:
+            self.predicates.append(("eq", column, (value,)))
+        return self
+
+    def between(self, column, low=None, high=None):
+        if low is not None:
+            self.predicates.append(("ge", column, (low,)))
+        if high is not None:
+            self.predicates.append(("le", column, (high,)))
+        return self
+
+    def after(self, column, value):
+        """Rows whose ``column`` is strictly greater than ``value`` (keyset paging)."""
+        if value is not None:
+            self.predicates.append(("gt", column, (value,)))
+        return self
+
+    def date_between(self, column, start=None, end=None):
+        """Inclusive calendar-day window on a DATE or DATETIME column."""
+        if start is not None:
+            self.predicates.append(("ge", column, (start,)))
+        if end is not None:
+            self.predicates.append(("lt", column, (_next_day(end),)))
+        return self
+
+    def not_null(self, *columns):
+        for column in columns:
+            self.predicates.append(("not_null", column, ()))
+        return self
+
+    # ---------------- SQL ----------------
+    def where(self):
+        clauses, params = [], []
+        for op, column, args in self.predicates:
+            col = quote_identifier(column)
+            if op == "in":
+                clauses.append(f"{col} IN ({', '.join(['%s'] * len(args))})")
+            elif op == "eq":
+                clauses.append(f"{col} = %s")
+            elif op == "gt":
+                clauses.append(f"{col} > %s")
+            elif op == "ge":
+                clauses.append(f"{col} >= %s")
+            elif op == "le":
+                clauses.append(f"{col} <= %s")
+            elif op == "lt":
+                clauses.append(f"{col} < %s")
+            elif op == "not_null":
+                clauses.append(f"{col} IS NOT NULL")
+            params.extend(args)
+        if not clauses:
+            return "", []
+        return " WHERE " + " AND ".join(clauses), params
+
+    def _select_list(self):
+        if not self.columns:
+            return "*"
+        return ", ".join(quote_identifier(c) for c in self.columns)
+
+    def select(self, order_by=None, limit=None, offset=0):
+        where, params = self.where()
+        sql = f"SELECT {self._select_list()} FROM {quote_identifier(self.table)}{where}"
+        if order_by:
+            sql += f" ORDER BY {quote_identifier(order_by)}"
+        if limit is not None:
+            sql += " LIMIT %s OFFSET %s"
+            params = params + [int(limit), int(offset)]
+        return sql, params
+
+    def count(self):
+        where, params = self.where()
+        return f"SELECT COUNT(*) AS total FROM {quote_identifier(self.table)}{where}", params
+
+    def aggregate(self, **exprs):
+        """``aggregate(avg_balance="AVG(account_balance)")`` -> one-row query."""
+        where, params = self.where()
+        select_list = ", ".join(f"{expr} AS {quote_identifier(alias)}"
+                                for alias, expr in exprs.items())
+        return f"SELECT {select_list} FROM {quote_identifier(self.table)}{where}", params
@@ -0,0 +1,103 @@
+"""Chunked DataFrame assembly with dtype hints.
+
+Shared by ``ConnectionPool.read_sql`` and the benchmark's SQLite stand-in:
+each chunk is compacted as it arrives (categoricals and datetime64 per
+``COLUMN_DTYPES`` in ``banksight_schema.py``), so only one raw chunk is ever
+held next to the compact result.
+
+Also the small frame helpers the loaders, exports and batch jobs share:
+slicing into batches, rows as tuples or dicts for the driver, date parsing
+and preparing a frame for Arrow.
+"""
+
+import decimal
+import functools
+import os
+
+import pandas as pd
+
+
+# Rows fetched per chunk.
+STREAM_ROWS = int(os.environ.get("BANKSIGHT_STREAM_ROWS", 20000))
+
+
+def compact(df, dtypes=None):
+    """Apply ``{column: dtype}`` hints to the columns of ``df`` that have one.
+
+    ``"datetime64"`` converts DATE / DATETIME values (already parsed by the
+    server) without string parsing; anything else goes to ``astype``.
+    """
+    for column, dtype in (dtypes or {}).items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        if dtype == "datetime64":
+            if not pd.api.types.is_datetime64_any_dtype(df[column]):
+                df[column] = pd.to_datetime(df[column], errors="coerce")
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def assemble(frames, dtypes=None):
+    """Compact each DataFrame in ``frames`` as it arrives and concatenate them.
+
+    Categorical columns are given the union of the chunks' categories first,
+    so they stay categorical instead of falling back to object.
+    """
+    frames = [compact(df, dtypes) for df in frames]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            categories = functools.reduce(
+                lambda a, b: a.union(b), (df[column].cat.categories for df in frames))
+            for df in frames:
+                df[column] = df[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def batches(items, size):
+    """Consecutive slices of at most ``size`` items (list or DataFrame rows)."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def row_tuples(df):
+    """The rows of ``df`` as tuples, NaN / NaT as None, ready for executemany."""
+    return [tuple(None if pd.isna(v) else v for v in row)
+            for row in df.itertuples(index=False, name=None)]
+
+
+def records(df):
+    return [dict(zip(df.columns, row)) for row in row_tuples(df)]
+
+
+def parse_dates(values):
+    # ISO first (the common case, and fast); the odd 1/29/2023-style value is
+    # parsed on its own rather than nulled by a format guessed from the chunk.
+    parsed = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return parsed
+
+
+def arrow_frame(df, dates=()):
+    """Make ``df``'s object columns Arrow-friendly, in place.
+
+    DECIMAL values become floats, as the dashboard treats them, and the text
+    columns named in ``dates`` are parsed so Parquet can prune on them.
+    """
+    for column in df.columns:
+        if not (pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column])):
+            continue
+        sample = df[column].dropna()
+        if not len(sample):
+            continue
+        if isinstance(sample.iloc[0], decimal.Decimal):
+            df[column] = df[column].astype(float)
+        elif column in dates and isinstance(sample.iloc[0], str):
+            df[column] = parse_dates(df[column])
+    return df
@@ -0,0 +1,532 @@
+"""Chunked, parallel CSV ingestion for the BankSight tables.
+
+Replaces the load cells of ``banksight_db.ipynb`` for feeds too large to read
+whole. Every file is streamed in ``--chunk-size`` rows; each chunk gets the
+notebook's cleaning (dedupe, null normalization, date coercion, Customer_ID
+formatting, FK filtering against customers, outlier removal) and is committed
+together with its checkpoint row, so an interrupted run picks up after the
+last committed chunk. ``customers`` (and ``branches``) load first; the tables
+that depend on customers then load in parallel.
+
+The default ``upsert`` mode never empties a table: each chunk is diffed by
+primary key against the row hashes of the previous load and only new or
+changed rows are written (``INSERT ... ON DUPLICATE KEY UPDATE``) in
+transactions of at most ``--txn-rows`` rows. ``--watermark`` also skips rows
+older than the table's newest ``txn_time`` / ``last_updated``, and
+``--delete-missing`` removes rows an earlier load wrote that the feed no longer
+has. ``replace`` mode is the notebook's TRUNCATE-and-reload.
+
+    python banksight_ingest.py --workers 4
+    python banksight_ingest.py --mode replace --method load-data
+    python banksight_ingest.py --tables transactions --watermark
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from banksight_filters import placeholders, quote_identifier
+from banksight_frames import batches, parse_dates, records, row_tuples
+from banksight_insights import INSIGHTS
+from banksight_pool import ConnectionPool
+from banksight_rollups import RollupStore
+from banksight_schema import PRIMARY_KEYS
+from banksight_sequences import SequenceTable
+from banksight_summaries import SummaryStore
+
+
+log = logging.getLogger("banksight.ingest")
+
+DATA_DIR = os.path.join("Banksight", "Queries", "dataset")
+CHUNK_SIZE = 50000
+BATCH_ROWS = 1000
+TXN_ROWS = 5000
+# Past this many changed rows a table's insight summaries are rebuilt rather
+# than refreshed from the individual rows.
+SUMMARY_ROW_LIMIT = 2000
+NULL_TOKENS = ["", " ", "NA", "null"]
+
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Column order matches the notebook's INSERT statements.
+TABLES = {
+    "customers": {
+        "columns": ["customer_id", "name", "gender", "age", "city", "account_type", "join_date"],
+        "dates": {"join_date": DATE_FORMAT},
+    },
+    "accounts": {
+        "columns": ["customer_id", "account_balance", "last_updated"],
+        "dates": {"last_updated": DATETIME_FORMAT},
+        "customer_fk": "customer_id",
+    },
+    "transactions": {
+        "columns": ["txn_id", "customer_id", "txn_type", "amount", "txn_time", "status"],
+        "dates": {"txn_time": DATETIME_FORMAT},
+        "customer_fk": "customer_id",
+    },
+    "branches": {
+        "columns": ["Branch_ID", "Branch_Name", "City", "Manager_Name", "Total_Employees",
+                    "Branch_Revenue", "Opening_Date", "Performance_Rating"],
+        "dates": {"Opening_Date": DATE_FORMAT},
+    },
+    "loans": {
+        "columns": ["Loan_ID", "Customer_ID", "Account_ID", "Branch", "Loan_Type", "Loan_Amount",
+                    "Interest_Rate", "Loan_Term_Months", "Start_Date", "End_Date", "Loan_Status"],
+        "dates": {"Start_Date": DATE_FORMAT, "End_Date": DATE_FORMAT},
+        "pad_customer_id": "Customer_ID",
+    },
+    "credit_cards": {
+        "columns": ["Card_ID", "Customer_ID", "Account_ID", "Branch", "Card_Number", "Card_Type",
+                    "Card_Network", "Credit_Limit", "Current_Balance", "Issued_Date",
+                    "Expiry_Date", "Status"],
+        "dates": {"Issued_Date": DATE_FORMAT, "Expiry_Date": DATE_FORMAT},
+        "pad_customer_id": "Customer_ID",
+    },
+    "support_tickets": {
+        "columns": ["Ticket_ID", "Customer_ID", "Account_ID", "Loan_ID", "Branch_Name",
+                    "Issue_Category", "Description", "Date_Opened", "Date_Closed", "Priority",
+                    "Status", "Resolution_Remarks", "Support_Agent", "Channel", "Customer_Rating"],
+        "dates": {"Date_Opened": DATETIME_FORMAT, "Date_Closed": DATETIME_FORMAT},
+        "customer_fk": "Customer_ID",
+    },
+}
+
+# Loaded first: the other tables are filtered against the customers that made it in.
+FIRST = ["customers", "branches"]
+
+# High-water mark columns for --watermark.
+WATERMARKS = {"transactions": "txn_time", "accounts": "last_updated"}
+
+CHECKPOINT_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    table_name VARCHAR(64) PRIMARY KEY,
+    source_file VARCHAR(255) NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL,
+    chunks_done INT NOT NULL,
+    rows_read BIGINT NOT NULL,
+    rows_loaded BIGINT NOT NULL,
+    finished TINYINT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL
+)
+"""
+
+ROW_HASHES_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_row_hashes (
+    table_name VARCHAR(64) NOT NULL,
+    row_key VARCHAR(64) NOT NULL,
+    row_hash BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (table_name, row_key)
+)
+"""
+
+
+# ---------------- CLEANING ----------------
+def clean_chunk(table, chunk, seen, customer_ids=None):
+    """Apply the notebook's cleaning to one raw chunk (all columns read as str)."""
+    spec = TABLES[table]
+
+    # Remove duplicates, across chunks as well as within this one.
+    hashes = pd.util.hash_pandas_object(chunk, index=False)
+    fresh = ~hashes.duplicated() & ~hashes.isin(seen)
+    seen.update(hashes[fresh].tolist())
+    df = chunk[fresh.values]
+
+    # Handle nulls
+    df = df.replace(NULL_TOKENS, pd.NA)
+
+    # Dates to MySQL format; unparseable values become NULL
+    for column, fmt in spec["dates"].items():
+        df[column] = parse_dates(df[column]).dt.strftime(fmt)
+
+    # Fix Customer_ID format
+    padded = spec.get("pad_customer_id")
+    if padded:
+        df[padded] = "C" + df[padded].str.zfill(4)
+
+    # Remove invalid foreign keys
+    fk = spec.get("customer_fk")
+    if fk and customer_ids is not None:
+        df = df[df[fk].isin(customer_ids)]
+
+    # Fix outliers
+    if table == "customers":
+        age = pd.to_numeric(df["age"], errors="coerce")
+        df = df[(age >= 18) & (age <= 100)]
+    elif table == "transactions":
+        df = df[~(pd.to_numeric(df["amount"], errors="coerce") >= 1000000)]
+
+    return df[spec["columns"]]
+
+
+# ---------------- LOADING ----------------
+def insert_rows(cur, table, df, batch_rows=BATCH_ROWS):
+    columns = TABLES[table]["columns"]
+    sql = (f"INSERT INTO {quote_identifier(table)} "
+           f"({', '.join(quote_identifier(c) for c in columns)}) "
+           f"VALUES ({', '.join(['%s'] * len(columns))})")
+    # pymysql folds executemany on INSERT ... VALUES into multi-row statements.
+    for batch in batches(row_tuples(df), batch_rows):
+        cur.executemany(sql, batch)
+
+
+def upsert_rows(cur, table, df, batch_rows=BATCH_ROWS):
+    columns = TABLES[table]["columns"]
+    key = PRIMARY_KEYS[table]
+    updates = ", ".join(f"{quote_identifier(c)} = VALUES({quote_identifier(c)})"
+                        for c in columns if c != key)
+    sql = (f"INSERT INTO {quote_identifier(table)} "
+           f"({', '.join(quote_identifier(c) for c in columns)}) "
+           f"VALUES ({placeholders(columns)}) ON DUPLICATE KEY UPDATE {updates}")
+    for batch in batches(row_tuples(df), batch_rows):
+        cur.executemany(sql, batch)
+
+
+def load_data_rows(cur, table, df):
+    columns = TABLES[table]["columns"]
+    out = df.copy()
+    for column in out.columns:
+        if out[column].dtype == object:
+            out[column] = out[column].str.replace("\\", "\\\\", regex=False)
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8",
+                                     newline="") as handle:
+        out.to_csv(handle, index=False, header=False, na_rep="\\N", lineterminator="\n")
+        path = handle.name
+    try:
+        cur.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {quote_identifier(table)} "
+            f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+            f"LINES TERMINATED BY '\\n' ({', '.join(quote_identifier(c) for c in columns)})",
+            (path,),
+        )
+    finally:
+        os.remove(path)
+
+
+class Ingester:
+
+    """TRUNCATE-and-reload of each table (``--mode replace``)."""
+
+    truncate = True
+
+    def __init__(self, db, data_dir=DATA_DIR, chunk_size=CHUNK_SIZE, batch_rows=BATCH_ROWS,
+                 method="insert", append=False, restart=False, summaries=None, rollups=None):
+        self.db = db
+        self.data_dir = data_dir
+        self.chunk_size = chunk_size
+        self.batch_rows = batch_rows
+        self.method = method
+        self.append = append
+        self.restart = restart
+        self.summaries = summaries
+        self.rollups = rollups
+        self.db.execute(CHECKPOINT_DDL)
+
+    def _checkpoint(self, table):
+        return self.db.fetch_dict("SELECT * FROM ingest_checkpoints WHERE table_name = %s", (table,))
+
+    def _save_checkpoint(self, cur, table, path, fingerprint, chunks, rows_read, rows_loaded, finished=0):
+        cur.execute("""
+            INSERT INTO ingest_checkpoints
+                (table_name, source_file, fingerprint, chunks_done, rows_read, rows_loaded, finished, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                source_file = VALUES(source_file), fingerprint = VALUES(fingerprint),
+                chunks_done = VALUES(chunks_done), rows_read = VALUES(rows_read),
+                rows_loaded = VALUES(rows_loaded), finished = VALUES(finished), updated_at = NOW()
+        """, (table, path, fingerprint, chunks, rows_read, rows_loaded, finished))
+
+    def _customer_ids(self):
+        return set(self.db.fetch_column("SELECT customer_id FROM customers"))
+
+    def _record_times(self, table, times):
+        """Tell the transaction rollups which ``txn_time`` values a write touched."""
+        if self.rollups is not None and table == "transactions":
+            self.rollups.record(times)
+
+    # ---------------- PER-TABLE HOOKS ----------------
+    def start_table(self, table):
+        pass
+
+    def skip_chunk(self, table, df):
+        pass
+
+    def write_chunk(self, table, df, save_checkpoint):
+        with self.db.transaction() as cur:
+            if self.method == "load-data":
+                load_data_rows(cur, table, df)
+            else:
+                insert_rows(cur, table, df, self.batch_rows)
+            save_checkpoint(cur, len(df))
+        if self.append and table == "transactions":
+            self._record_times(table, df["txn_time"])
+        return len(df)
+
+    def finish_table(self, table):
+        if self.summaries is not None:
+            self.summaries.record_change(table)
+        if not self.append:
+            # Truncated and reloaded: rebuild rather than log every hour.
+            self._record_times(table, None)
+
+    def load_table(self, table):
+        path = os.path.join(self.data_dir, f"{table}.csv")
+        stat = os.stat(path)
+        fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+
+        state = self._checkpoint(table)
+        resume = (not self.restart and state is not None and state["fingerprint"] == fingerprint)
+        if resume and state["finished"]:
+            log.info("%-16s already loaded from this file (%s rows), skipping", table, state["rows_loaded"])
+            return {"table": table, "rows_read": 0, "rows_loaded": 0, "seconds": 0.0, "skipped": True}
+        skip = state["chunks_done"] if resume else 0
+        rows_read = state["rows_read"] if resume else 0
+        rows_loaded = state["rows_loaded"] if resume else 0
+        self.start_table(table)
+        if not resume:
+            if self.truncate and not self.append:
+                self.db.execute(f"TRUNCATE TABLE {quote_identifier(table)}")
+            with self.db.transaction() as cur:
+                self._save_checkpoint(cur, table, path, fingerprint, 0, 0, 0)
+        elif skip:
+            log.info("%-16s resuming after chunk %d (%s rows already loaded)", table, skip, rows_loaded)
+
+        customer_ids = self._customer_ids() if TABLES[table].get("customer_fk") else None
+        seen = set()
+        started = time.perf_counter()
+        new_read = new_loaded = 0
+        chunks_done = skip
+        reader = pd.read_csv(path, dtype=str, chunksize=self.chunk_size)
+        for number, chunk in enumerate(reader, start=1):
+            chunk_started = time.perf_counter()
+            df = clean_chunk(table, chunk, seen, customer_ids)
+            if number <= skip:
+                # Already committed; cleaning it again re-seeds the duplicate filter.
+                self.skip_chunk(table, df)
+                continue
+            loaded = self.write_chunk(table, df, lambda cur, written: self._save_checkpoint(
+                cur, table, path, fingerprint, number, rows_read + len(chunk), rows_loaded + written))
+            rows_read += len(chunk)
+            rows_loaded += loaded
+            chunks_done = number
+            new_read += len(chunk)
+            new_loaded += loaded
+            elapsed = time.perf_counter() - started
+            log.info("%-16s chunk %d: %d read, %d written, %.0f rows/s (avg %.0f rows/s)",
+                     table, number, len(chunk), loaded,
+                     len(chunk) / max(time.perf_counter() - chunk_started, 1e-9),
+                     new_read / max(elapsed, 1e-9))
+
+        self.finish_table(table)
+        with self.db.transaction() as cur:
+            self._save_checkpoint(cur, table, path, fingerprint, chunks_done,
+                                  rows_read, rows_loaded, finished=1)
+        seconds = time.perf_counter() - started
+        log.info("%-16s done: %d read, %d written in %.1fs (%.0f rows/s)",
+                 table, new_read, new_loaded, seconds, new_read / max(seconds, 1e-9))
+        return {"table": table, "rows_read": new_read, "rows_loaded": new_loaded,
+                "seconds": seconds, "skipped": False}
+
+    def run(self, tables, workers=4):
+        first = [t for t in FIRST if t in tables]
+        rest = [t for t in tables if t not in FIRST]
+        results = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results.extend(pool.map(self.load_table, first))
+            results.extend(pool.map(self.load_table, rest))
+        return results
+
+
+class UpsertIngester(Ingester):
+    """Apply only the inserts, updates and deletes a feed implies (``--mode upsert``).
+
+    ``ingest_row_hashes`` remembers the hash of every row as last loaded from
+    the feed; a row is written only when its hash differs. Rows edited in the
+    dashboard since are therefore left alone until the feed itself changes
+    them, and ``delete_missing`` only removes rows that came from the feed.
+    """
+
+    truncate = False
+
+    def __init__(self, db, *args, txn_rows=TXN_ROWS, watermark=False, delete_missing=False, **kwargs):
+        super().__init__(db, *args, **kwargs)
+        self.txn_rows = txn_rows
+        self.watermark = watermark
+        self.delete_missing = delete_missing
+        self._keys = {}
+        self._changes = {}
+        self._high_water = {}
+        self.db.execute(ROW_HASHES_DDL)
+
+    def start_table(self, table):
+        self._keys[table] = set()
+        self._changes[table] = []
+        self._high_water[table] = None
+        column = WATERMARKS.get(table)
+        if self.watermark and column:
+            latest = self.db.fetch_one(
+                f"SELECT MAX({quote_identifier(column)}) FROM {quote_identifier(table)}")[0]
+            if latest is not None:
+                self._high_water[table] = pd.Timestamp(latest).strftime(TABLES[table]["dates"][column])
+
+    def skip_chunk(self, table, df):
+        self._keys[table].update(df[PRIMARY_KEYS[table]].astype(str))
+
+    def _stored_hashes(self, table, keys):
+        stored = {}
+        for batch in batches(keys, self.txn_rows):
+            stored.update(self.db.fetch_all(
+                f"SELECT row_key, row_hash FROM ingest_row_hashes "
+                f"WHERE table_name = %s AND row_key IN ({placeholders(batch)})",
+                [table, *batch],
+            ))
+        return stored
+
+    def _stored_times(self, table, keys):
+        """``txn_time`` of the stored rows ``keys`` are about to overwrite or delete."""
+        if self.rollups is None or table != "transactions" or not keys:
+            return []
+        return self.db.fetch_column(
+            f"SELECT txn_time FROM transactions WHERE txn_id IN ({placeholders(keys)})", keys)
+
+    def _track(self, table, keys, new_rows=()):
+        """Keep the old/new rows of a batch for the insight summaries."""
+        changes = self._changes[table]
+        if self.summaries is None or table not in self.summaries.tables or changes is None:
+            return
+        if len(changes) + 2 * len(keys) > SUMMARY_ROW_LIMIT:
+            self._changes[table] = None
+            return
+        key = quote_identifier(PRIMARY_KEYS[table])
+        old = self.db.read_sql(
+            f"SELECT * FROM {quote_identifier(table)} WHERE {key} IN ({placeholders(keys)})", keys)
+        changes.extend(records(old))
+        changes.extend(new_rows)
+
+    def write_chunk(self, table, df, save_checkpoint):
+        key = PRIMARY_KEYS[table]
+        keys = df[key].astype(str)
+        self._keys[table].update(keys)
+
+        high_water = self._high_water[table]
+        if high_water is not None:
+            marks = df[WATERMARKS[table]]
+            recent = (marks.isna() | (marks.fillna("") >= high_water)).values
+            df, keys = df[recent], keys[recent]
+
+        hashes = pd.util.hash_pandas_object(df, index=False).tolist()
+        stored = self._stored_hashes(table, keys.tolist())
+        changed = [stored.get(k) != h for k, h in zip(keys, hashes)]
+        df = df[changed]
+        changed_hashes = [(table, k, h) for k, h, c in zip(keys, hashes, changed) if c]
+
+        parts = list(zip(batches(df, self.txn_rows), batches(changed_hashes, self.txn_rows))) or [(df, [])]
+        for number, (part, part_hashes) in enumerate(parts, start=1):
+            old_times = []
+            if part_hashes:
+                part_keys = [k for _, k, _ in part_hashes]
+                self._track(table, part_keys, records(part))
+                old_times = self._stored_times(table, part_keys)
+            with self.db.transaction() as cur:
+                if part_hashes:
+                    upsert_rows(cur, table, part, self.batch_rows)
+                    cur.executemany(
+                        "INSERT INTO ingest_row_hashes (table_name, row_key, row_hash) VALUES (%s, %s, %s) "
+                        "ON DUPLICATE KEY UPDATE row_hash = VALUES(row_hash)",
+                        part_hashes,
+                    )
+                if number == len(parts):
+                    save_checkpoint(cur, len(df))
+            if part_hashes and table == "transactions":
+                self._record_times(table, [*old_times, *part["txn_time"]])
+        return len(df)
+
+    def finish_table(self, table):
+        if self.delete_missing and self._high_water[table] is None:
+            self._delete_missing(table)
+        changes = self._changes.pop(table)
+        if self.summaries is not None and changes != []:
+            self.summaries.record_change(table, changes)
+
+    def _delete_missing(self, table):
+        seen = self._keys[table]
+        loaded = self.db.fetch_column(
+            "SELECT row_key FROM ingest_row_hashes WHERE table_name = %s", (table,))
+        missing = [k for k in loaded if k not in seen]
+        key = quote_identifier(PRIMARY_KEYS[table])
+        for batch in batches(missing, self.txn_rows):
+            self._track(table, batch)
+            old_times = self._stored_times(table, batch)
+            with self.db.transaction() as cur:
+                cur.execute(f"DELETE FROM {quote_identifier(table)} WHERE {key} IN ({placeholders(batch)})",
+                            batch)
+                cur.execute(f"DELETE FROM ingest_row_hashes WHERE table_name = %s "
+                            f"AND row_key IN ({placeholders(batch)})", [table, *batch])
+            self._record_times(table, old_times)
+        if missing:
+            log.info("%-16s deleted %d rows no longer in the feed", table, len(missing))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the BankSight CSV feeds into MySQL.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), default=list(TABLES))
+    parser.add_argument("--mode", choices=["upsert", "replace"], default="upsert",
+                        help="apply only changed rows, or TRUNCATE and reload like the notebook")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS,
+                        help="rows per multi-row INSERT")
+    parser.add_argument("--txn-rows", type=int, default=TXN_ROWS,
+                        help="most changed rows per transaction (upsert mode)")
+    parser.add_argument("--workers", type=int, default=4, help="tables loaded in parallel")
+    parser.add_argument("--method", choices=["insert", "load-data"], default="insert",
+                        help="replace mode: multi-row INSERTs or LOAD DATA LOCAL INFILE "
+                             "(needs local_infile on the server)")
+    parser.add_argument("--watermark", action="store_true",
+                        help="upsert mode: skip rows older than the table's newest "
+                             + " / ".join(sorted(WATERMARKS.values())))
+    parser.add_argument("--delete-missing", action="store_true",
+                        help="upsert mode: the feed is a full snapshot; delete loaded rows it no longer has")
+    parser.add_argument("--append", action="store_true", help="replace mode: do not TRUNCATE first")
+    parser.add_argument("--restart", action="store_true", help="ignore existing checkpoints")
+    args = parser.parse_args(argv)
+    if args.mode == "upsert" and args.method == "load-data":
+        parser.error("--method load-data only applies to --mode replace")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    # Private pool: FK checks are off for the bulk load (the notebook cleaning
+    # decides which rows are kept) and LOAD DATA needs local_infile.
+    db = ConnectionPool(size=args.workers + 1, local_infile=args.method == "load-data",
+                        init_command="SET FOREIGN_KEY_CHECKS = 0")
+    try:
+        summaries = SummaryStore(db, INSIGHTS)
+        rollups = RollupStore(db)
+        common = (db, args.data_dir, args.chunk_size, args.batch_rows, args.method,
+                  args.append, args.restart)
+        if args.mode == "upsert":
+            ingester = UpsertIngester(*common, summaries=summaries, rollups=rollups, txn_rows=args.txn_rows,
+                                      watermark=args.watermark, delete_missing=args.delete_missing)
+        else:
+            ingester = Ingester(*common, summaries=summaries, rollups=rollups)
+        started = time.perf_counter()
+        results = ingester.run(args.tables, args.workers)
+        seconds = time.perf_counter() - started
+        # Loaded rows bring their own IDs; later adds must allocate past them.
+        SequenceTable(db).resync(*args.tables)
+
+        total_read = sum(r["rows_read"] for r in results)
+        total_loaded = sum(r["rows_loaded"] for r in results)
+        log.info("all tables: %d read, %d written in %.1fs (%.0f rows/s)",
+                 total_read, total_loaded, seconds, total_read / max(seconds, 1e-9))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""The fifteen Analytical Insights questions.
+
+Every insight is written as an aggregate over its source tables (its
+*summary*: ``SELECT columns FROM source WHERE where GROUP BY group_by``)
+plus a ``result`` query over that summary for ordering, HAVING-style filters
+and limits. The live query simply runs ``result`` over the summary as a
+derived table; ``banksight_summaries`` stores the summary in a table instead
+and keeps it current group by group.
+
+``refresh_column`` is the summary column a partial refresh recomputes by and
+``refresh_expr`` the source expression it comes from. ``links`` say how a
+changed row maps onto it: ``{table: (row_column, source_expr)}``. When
+``source_expr`` is ``refresh_expr`` the row value *is* the group; otherwise the
+affected groups are looked up through the source join.
+
+Thresholds, time windows and top-N limits are ``Param``\ s rather than
+literals: templates refer to them as ``{name}`` and ``bind`` validates a set
+of values against their types and ranges. Values are sent as query
+parameters, except ``Bands``, whose validated integers are written into a
+``CASE``. ``filters`` are optional conditions, applied only when every
+parameter they mention is set. The stored summary is built with the default
+values, so it can answer any binding that only changes ``result`` parameters
+(``materializable``); other bindings run live. Templates are parsed once and
+the parsed form is reused for every binding.
+"""
+
+import datetime
+import functools
+import math
+import string
+
+
+_FORMATTER = string.Formatter()
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(template):
+    """``template`` as ``(literal, field)`` pairs; ``field`` is None after the last literal."""
+    return tuple((literal, field) for literal, field, _, _ in _FORMATTER.parse(template))
+
+
+def fields(template):
+    return {field for _, field in _compile(template) if field}
+
+
+def in_clause(expr, values):
+    """``expr IN (...)`` for ``values``, with NULL handled by ``IS NULL``."""
+    values = set(values)
+    present = [v for v in values if v is not None]
+    parts = []
+    if present:
+        parts.append(f"{expr} IN ({', '.join(['%s'] * len(present))})")
+    if None in values:
+        parts.append(f"{expr} IS NULL")
+    if not parts:
+        return "1 = 0", []
+    return "(" + " OR ".join(parts) + ")", present
+
+
+def band_case(column, lows):
+    """``CASE`` labelling ``column`` with the band starting at each of ``lows``."""
+    whens = [f"WHEN {column} BETWEEN {low} AND {high - 1} THEN '{low}–{high - 1}'"
+             for low, high in zip(lows, lows[1:])]
+    whens.append(f"WHEN {column} >= {lows[-1]} THEN '{lows[-1]}+'")
+    return "CASE\n            " + "\n            ".join(whens) + "\n            ELSE 'Unknown'\n        END"
+
+
+class Param:
+    """A typed value a template refers to as ``{name}``; None as default makes it optional."""
+
+    KINDS = ("int", "amount", "date")
+
+    def __init__(self, name, label, kind, default=None, minimum=None, maximum=None, help=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"unknown parameter kind {kind!r}")
+        self.name = name
+        self.label = label
+        self.kind = kind
+        self.minimum = minimum
+        self.maximum = maximum
+        self.help = help
+        self.default = None
+        if default is not None:
+            self.default = self.coerce(default)
+
+    @property
+    def optional(self):
+        return self.default is None
+
+    def _check_range(self, value):
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"{self.label} must be at least {self.minimum}")
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f"{self.label} must be at most {self.maximum}")
+
+    def coerce(self, value):
+        """``value`` as this parameter's type; ValueError if it is not a valid one."""
+        if value is None or value == "":
+            if self.optional:
+                return None
+            raise ValueError(f"{self.label} is required")
+        if self.kind == "date":
+            if isinstance(value, datetime.datetime):
+                value = value.date()
+            elif isinstance(value, str):
+                try:
+                    value = datetime.date.fromisoformat(value.strip())
+                except ValueError:
+                    raise ValueError(f"{self.label} must be a date (YYYY-MM-DD), not {value!r}") from None
+            elif not isinstance(value, datetime.date):
+                raise ValueError(f"{self.label} must be a date, not {value!r}")
+        else:
+            if isinstance(value, bool):
+                raise ValueError(f"{self.label} must be a number, not {value!r}")
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{self.label} must be a number, not {value!r}") from None
+            if not math.isfinite(number):
+                raise ValueError(f"{self.label} must be a finite number")
+            if self.kind == "int":
+                if not number.is_integer():
+                    raise ValueError(f"{self.label} must be a whole number, not {value!r}")
+                value = int(number)
+            else:
+                value = number
+        self._check_range(value)
+        return value
+
+    def render(self, value):
+        """SQL text for ``value`` and the query parameters it needs."""
+        return "%s", [value]
+
+    def format(self, value):
+        return "any" if value is None else str(value)
+
+
+class Bands(Param):
+    """Lower bounds of consecutive bands over ``column``, e.g. age groups."""
+
+    KINDS = ("bands",)
+
+    def __init__(self, name, label, column, default, minimum=0, maximum=150, help=None):
+        self.column = column
+        super().__init__(name, label, "bands", default, minimum, maximum, help)
+
+    def coerce(self, value):
+        if isinstance(value, str):
+            value = [part for part in value.replace(";", ",").split(",") if part.strip()]
+        try:
+            lows = tuple(int(str(low).strip()) for low in value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{self.label} must be whole numbers separated by commas") from None
+        if not lows:
+            raise ValueError(f"{self.label} needs at least one bound")
+        if any(b <= a for a, b in zip(lows, lows[1:])):
+            raise ValueError(f"{self.label} must be increasing")
+        for low in lows:
+            self._check_range(low)
+        return lows
+
+    def render(self, value):
+        # Validated integers only, so inlining them is safe.
+        return band_case(self.column, value), []
+
+    def format(self, value):
+        return ", ".join(map(str, value))
+
+
+class Insight:
+
+    def __init__(self, name, question, columns, source, tables, refresh_column,
+                 refresh_expr=None, where=None, group_by=None,
+                 result="SELECT * FROM {table}", links=None, params=(), filters=()):
+        self.name = name
+        self.question = question
+        self.columns = columns
+        self.source = source
+        self.tables = tables
+        self.refresh_column = refresh_column
+        self.refresh_expr = refresh_expr or refresh_column
+        self.where = where
+        self.group_by = group_by
+        self.result = result
+        self.links = links or {}
+        self.params = list(params)
+        self.filters = filters
+        self._params = {param.name: param for param in self.params}
+        # Parameters the stored summary is built with; any other value must run live.
+        self.summary_params = set().union(*(fields(t) for t in (columns, where or "", *filters)))
+        missing = (self.summary_params | fields(result)) - set(self._params) - {"table"}
+        if missing:
+            raise ValueError(f"{name} refers to undeclared parameters: {', '.join(sorted(missing))}")
+
+    # ---------------- PARAMETERS ----------------
+    def bind(self, values=None):
+        """Validated ``{name: value}`` for every parameter, defaults filling the gaps."""
+        values = dict(values or {})
+        unknown = set(values) - set(self._params)
+        if unknown:
+            raise ValueError(f"{self.name} has no parameter {', '.join(sorted(unknown))}")
+        return {p.name: p.coerce(values[p.name]) if p.name in values else p.default
+                for p in self.params}
+
+    def key(self, binding=None):
+        """Hashable form of a binding, for job and cache keys."""
+        return tuple(self.bind(binding).items())
+
+    def materializable(self, binding=None):
+        """Whether the stored summary (built with the defaults) can answer ``binding``."""
+        binding = self.bind(binding)
+        return all(binding[name] == self._params[name].default for name in self.summary_params)
+
+    def describe(self, binding=None):
+        """The parameters that differ from their defaults, as ``label: value``."""
+        binding = self.bind(binding)
+        return ", ".join(f"{p.label}: {p.format(binding[p.name])}" for p in self.params
+                         if binding[p.name] != p.default)
+
+    def _fill(self, template, binding, table=None):
+        sql, params = [], []
+        for literal, field in _compile(template):
+            sql.append(literal)
+            if field == "table":
+                sql.append(table[0])
+                params += table[1]
+            elif field:
+                text, values = self._params[field].render(binding[field])
+                sql.append(text)
+                params += values
+        return "".join(sql), params
+
+    # ---------------- SQL ----------------
+    def summary_sql(self, keys=None, binding=None):
+        """The summary query, restricted to the ``keys`` groups when given."""
+        binding = self.bind(binding)
+        columns, params = self._fill(self.columns, binding)
+        conditions = []
+        for template in ([self.where] if self.where else []) + [
+                f for f in self.filters if all(binding[name] is not None for name in fields(f))]:
+            clause, values = self._fill(template, binding)
+            conditions.append(clause)
+            params += values
+        if keys is not None:
+            clause, values = in_clause(self.refresh_expr, keys)
+            conditions.append(clause)
+            params += values
+        sql = f"SELECT {columns} FROM {self.source}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if self.group_by:
+            sql += f" GROUP BY {self.group_by}"
+        return sql, params
+
+    def result_sql(self, table, binding=None, table_params=()):
+        """``result`` over ``table`` (a name or derived table) and its parameters."""
+        return self._fill(self.result, self.bind(binding), (table, list(table_params)))
+
+    def live_sql(self, binding=None):
+        sql, params = self.summary_sql(binding=binding)
+        return self.result_sql(f"({sql}) AS s", binding, params)
+
+    def key_lookup_sql(self, expr, values):
+        """Groups touched by source rows whose ``expr`` is in ``values``."""
+        clause, params = in_clause(expr, values)
+        return f"SELECT DISTINCT {self.refresh_expr} FROM {self.source} WHERE {clause}", params
+
+
+AGE_BANDS = (18, 26, 36, 46, 56)
+AGE_GROUP = band_case("age", AGE_BANDS)
+
+# Optional transaction time window shared by the transaction questions.
+TXN_WINDOW = ("txn_time >= {since}", "txn_time < {before}")
+TXN_WINDOW_PARAMS = [
+    Param("since", "Transactions from", "date", help="Leave empty for no lower bound."),
+    Param("before", "Transactions before", "date", help="Exclusive; leave empty for no upper bound."),
+]
+
+
+def top(default, label, maximum=1000):
+    return Param("top", label, "int", default, minimum=1, maximum=maximum)
+
+
+INSIGHTS = [
+    Insight(
+        "q1", "Q1:How many customers exist per city, and what is their average account balance?",
+        columns="""c.city,
+            COUNT(DISTINCT c.customer_id) AS total_customers,
+            AVG(a.account_balance) AS average_balance""",
+        source="customers c LEFT JOIN accounts a ON c.customer_id = a.customer_id",
+        tables=("customers", "accounts"),
+        group_by="c.city",
+        refresh_column="city", refresh_expr="c.city",
+        links={"customers": ("city", "c.city"), "accounts": ("customer_id", "c.customer_id")},
+    ),
+    Insight(
+        "q2", "Q2:Which account type (Savings, Current, Loan, etc.) holds the highest total balance?",
+        columns="c.account_type, SUM(a.account_balance) AS total_balance",
+        source="customers c JOIN accounts a ON c.customer_id = a.customer_id",
+        tables=("customers", "accounts"),
+        group_by="c.account_type",
+        result="SELECT * FROM {table} ORDER BY total_balance DESC LIMIT {top}",
+        params=[top(5, "Top N account types")],
+        refresh_column="account_type", refresh_expr="c.account_type",
+        links={"customers": ("account_type", "c.account_type"),
+               "accounts": ("customer_id", "c.customer_id")},
+    ),
+    Insight(
+        "q3", "Q3:Who are the top 10 customers by total account balance across all account types?",
+        columns="c.customer_id, c.name, SUM(a.account_balance) AS total_balance",
+        source="customers c JOIN accounts a ON c.customer_id = a.customer_id",
+        tables=("customers", "accounts"),
+        group_by="c.customer_id, c.name",
+        result="SELECT * FROM {table} ORDER BY total_balance DESC LIMIT {top}",
+        params=[top(10, "Top N customers")],
+        refresh_column="customer_id", refresh_expr="c.customer_id",
+        links={"customers": ("customer_id", "c.customer_id"),
+               "accounts": ("customer_id", "c.customer_id")},
+    ),
+    Insight(
+        "q4", "Q4:Which customers opened accounts in 2023 with a balance above ₹1,00,000?",
+        columns="c.customer_id, c.name, c.join_date, a.account_balance",
+        source="accounts a JOIN customers c ON a.customer_id = c.customer_id",
+        tables=("customers", "accounts"),
+        where="c.join_date >= {joined_from} AND c.join_date < {joined_before} "
+              "AND a.account_balance > {min_balance}",
+        params=[
+            Param("joined_from", "Joined from", "date", datetime.date(2023, 1, 1)),
+            Param("joined_before", "Joined before", "date", datetime.date(2024, 1, 1),
+                  help="Exclusive."),
+            Param("min_balance", "Balance above (₹)", "amount", 100000, minimum=0),
+        ],
+        refresh_column="customer_id", refresh_expr="c.customer_id",
+        links={"customers": ("customer_id", "c.customer_id"),
+               "accounts": ("customer_id", "c.customer_id")},
+    ),
+    Insight(
+        "q5", "Q5:What is the total transaction volume (sum of amounts) by transaction type?",
+        columns="txn_type, SUM(amount) AS total_volume",
+        source="transactions",
+        tables=("transactions",),
+        filters=TXN_WINDOW,
+        params=TXN_WINDOW_PARAMS,
+        group_by="txn_type",
+        refresh_column="txn_type",
+        links={"transactions": ("txn_type", "txn_type")},
+    ),
+    Insight(
+        "q6", "Q6:How many failed transactions occurred for each transaction type?",
+        columns="txn_type, COUNT(*) AS failed_count",
+        source="transactions",
+        tables=("transactions",),
+        where="status = 'Failed'",
+        filters=TXN_WINDOW,
+        params=TXN_WINDOW_PARAMS,
+        group_by="txn_type",
+        refresh_column="txn_type",
+        links={"transactions": ("txn_type", "txn_type")},
+    ),
+    Insight(
+        "q7", "Q7:What is the total number of transactions per transaction type?",
+        columns="txn_type, COUNT(*) AS total_transactions",
+        source="transactions",
+        tables=("transactions",),
+        filters=TXN_WINDOW,
+        params=TXN_WINDOW_PARAMS,
+        group_by="txn_type",
+        refresh_column="txn_type",
+        links={"transactions": ("txn_type", "txn_type")},
+    ),
+    Insight(
+        "q8", "Q8:Which accounts have 5 or more high-value transactions above ₹20,000?",
+        columns="customer_id, COUNT(*) AS high_value_txn",
+        source="transactions",
+        tables=("transactions",),
+        where="amount > {min_amount}",
+        filters=TXN_WINDOW,
+        group_by="customer_id",
+        result="SELECT * FROM {table} WHERE high_value_txn >= {min_count}",
+        params=[
+            Param("min_amount", "High value above (₹)", "amount", 20000, minimum=0),
+            Param("min_count", "At least N such transactions", "int", 5, minimum=1),
+            *TXN_WINDOW_PARAMS,
+        ],
+        refresh_column="customer_id",
+        links={"transactions": ("customer_id", "customer_id")},
+    ),
+    Insight(
+        "q9", "Q9:What is the average loan amount and interest rate by loan type (Personal, Auto, Home, etc.)?",
+        columns="""Loan_Type,
+            AVG(Loan_Amount) AS avg_Loan_Amount,
+            AVG(Interest_Rate) AS avg_Interest_Rate""",
+        source="loans",
+        tables=("loans",),
+        group_by="Loan_Type",
+        refresh_column="Loan_Type",
+        links={"loans": ("Loan_Type", "Loan_Type")},
+    ),
+    Insight(
+        "q10", "Q10:Which customers currently hold more than one active or approved loan?",
+        columns="Customer_ID, COUNT(*) AS total_loans",
+        source="loans",
+        tables=("loans",),
+        where="Loan_Status IN ('Active', 'Approved')",
+        group_by="Customer_ID",
+        result="SELECT * FROM {table} WHERE total_loans >= {min_loans}",
+        params=[Param("min_loans", "At least N loans", "int", 2, minimum=1)],
+        refresh_column="Customer_ID",
+        links={"loans": ("Customer_ID", "Customer_ID")},
+    ),
+    Insight(
+        "q11", "Q11:Who are the top 5 customers with the highest outstanding (non-closed) loan amounts?",
+        columns="l.Customer_ID AS customer_id, c.name, SUM(l.Loan_Amount) AS total_outstanding_loan",
+        source="loans l JOIN customers c ON c.customer_id = l.Customer_ID",
+        tables=("loans", "customers"),
+        where="l.Loan_Status <> 'Closed'",
+        group_by="l.Customer_ID, c.name",
+        result="SELECT * FROM {table} ORDER BY total_outstanding_loan DESC LIMIT {top}",
+        params=[top(5, "Top N customers")],
+        refresh_column="customer_id", refresh_expr="l.Customer_ID",
+        links={"loans": ("Customer_ID", "l.Customer_ID"),
+               "customers": ("customer_id", "l.Customer_ID")},
+    ),
+    Insight(
+        "q12", "Q12:What is the average loan amount per branch?",
+        columns="branch, AVG(loan_amount) AS avg_loan_amount",
+        source="loans",
+        tables=("loans",),
+        group_by="branch",
+        result="SELECT * FROM {table} ORDER BY avg_loan_amount DESC",
+        refresh_column="branch",
+        links={"loans": ("Branch", "branch")},
+    ),
+    # Age bands cannot be derived from a changed row, so any customers
+    # change rebuilds this (small) summary.
+    Insight(
+        "q13", "Q13:How many customers exist in each age group (e.g., 18–25, 26–35, etc.)?",
+        columns="{age_bands} AS age_group, COUNT(*) AS total_customers",
+        params=[Bands("age_bands", "Age group lower bounds", "age", AGE_BANDS,
+                      help="Comma-separated; each group runs up to the next bound.")],
+        source="customers",
+        tables=("customers",),
+        group_by="age_group",
+        result="SELECT * FROM {table} ORDER BY age_group",
+        refresh_column="age_group", refresh_expr=AGE_GROUP,
+    ),
+    Insight(
+        "q14", "Q14:Which issue categories have the longest average resolution time?",
+        columns="issue_category, AVG(DATEDIFF(date_closed, date_opened)) AS avg_resolution_days",
+        source="support_tickets",
+        tables=("support_tickets",),
+        where="date_closed IS NOT NULL AND date_opened IS NOT NULL",
+        group_by="issue_category",
+        result="SELECT * FROM {table} ORDER BY avg_resolution_days DESC",
+        refresh_column="issue_category",
+        links={"support_tickets": ("Issue_Category", "issue_category")},
+    ),
+    Insight(
+        "q15", "Q15:Which support agents have resolved the most critical tickets with high customer ratings (≥4)?",
+        columns="support_agent, COUNT(*) AS resolved_critical_tickets",
+        source="support_tickets",
+        tables=("support_tickets",),
+        where="priority = 'Critical' AND customer_rating >= {min_rating} "
+              "AND status IN ('Resolved', 'Closed')",
+        params=[Param("min_rating", "Customer rating at least", "int", 4, minimum=1, maximum=5)],
+        group_by="support_agent",
+        result="SELECT * FROM {table} ORDER BY resolved_critical_tickets DESC",
+        refresh_column="support_agent",
+        links={"support_tickets": ("Support_Agent", "support_agent")},
+    ),
+]
+
+INSIGHTS_BY_QUESTION = {insight.question: insight for insight in INSIGHTS}
@@ -0,0 +1,199 @@
+"""Background execution of long Analytical Insights queries.
+
+``▶ Run`` used to call the query on the Streamlit script thread: the page
+blocked until MySQL answered, and a second click started a second query
+while the first kept the server busy. ``JobExecutor`` runs each request on
+a small thread pool instead and hands back a ``Job`` the page polls:
+
+* identical requests that are already queued or running, from any session,
+  share one job (``submit`` with the same key);
+* each job has a deadline (``BANKSIGHT_JOB_TIMEOUT`` seconds). A watchdog
+  thread stops jobs that run past theirs;
+* a job that reads MySQL through ``ConnectionPool.stream`` reports its
+  connection id (``job.attach``), so cancelling or timing it out sends
+  ``KILL QUERY`` and the server stops working on it. Other work, such as
+  DuckDB or a snapshot, cannot be interrupted; its result is discarded
+  instead.
+
+A shared job is only cancelled when the last session watching it lets go.
+Finished jobs are kept for ``BANKSIGHT_JOB_RETENTION`` seconds so pages can
+fetch the result by id.
+"""
+
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+import uuid
+
+
+log = logging.getLogger("banksight.jobs")
+
+WORKERS = int(os.environ.get("BANKSIGHT_JOB_WORKERS", 4))
+TIMEOUT = float(os.environ.get("BANKSIGHT_JOB_TIMEOUT", 120))
+RETENTION = float(os.environ.get("BANKSIGHT_JOB_RETENTION", 600))
+WATCHDOG_INTERVAL = 0.5
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, TIMED_OUT = (
+    "queued", "running", "done", "failed", "cancelled", "timed out")
+FINISHED = {DONE, FAILED, CANCELLED, TIMED_OUT}
+
+
+class Job:
+
+    def __init__(self, key, label, timeout):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.label = label
+        self.timeout = timeout
+        self.status = QUEUED
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.watchers = 1
+        self.thread_id = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._callbacks = []
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def attach(self, thread_id):
+        """``on_start`` callback for ``ConnectionPool.stream``: the connection to KILL."""
+        with self._lock:
+            self.thread_id = thread_id
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, callback):
+        """Call ``callback(job)`` once the job finishes (straight away if it has)."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _notify(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                log.exception("done callback for %s failed", self.label)
+
+
+class JobExecutor:
+
+    def __init__(self, db, workers=WORKERS, timeout=TIMEOUT, retention=RETENTION):
+        self.db = db
+        self.workers = workers
+        self.timeout = timeout
+        self.retention = retention
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                           thread_name_prefix="banksight-job")
+        self._jobs = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._watchdog = threading.Thread(target=self._watch, name="banksight-job-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def submit(self, key, fn, label=None, timeout=None):
+        """Run ``fn(job)`` in the background, or join the identical job already in flight."""
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None and not job.done:
+                job.watchers += 1
+                return job
+            job = Job(key, label or str(key), timeout or self.timeout)
+            self._inflight[key] = job
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job):
+        """Stop watching ``job``; the last watcher to leave cancels it. True if it was stopped."""
+        with self._lock:
+            if job.done:
+                return False
+            job.watchers -= 1
+            if job.watchers > 0:
+                return False
+        return self._stop(job, CANCELLED)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def _finish(self, job, status, result=None, error=None):
+        with self._lock:
+            if job.done:
+                return False
+            job.status, job.result, job.error = status, result, error
+            job.finished_at = time.monotonic()
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+        job._notify()
+        return True
+
+    def _stop(self, job, status):
+        if not self._finish(job, status):
+            return False
+        # Holding the job lock keeps the connection from going back to the
+        # pool (``attach(None)``) while the KILL is on its way.
+        with job._lock:
+            if job.thread_id is not None:
+                try:
+                    self.db.kill_query(job.thread_id)
+                except Exception:
+                    log.exception("KILL QUERY %s failed", job.thread_id)
+        log.info("%s %s after %.1fs", status, job.label, job.elapsed)
+        return True
+
+    def _run(self, job, fn):
+        with self._lock:
+            if job.done:
+                return
+            job.status = RUNNING
+            job.started_at = time.monotonic()
+        try:
+            result = fn(job)
+        except Exception as e:
+            if self._finish(job, FAILED, error=e):
+                log.warning("%s failed: %s", job.label, e)
+        else:
+            self._finish(job, DONE, result=result)
+
+    def _watch(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            now = time.monotonic()
+            with self._lock:
+                running = [j for j in self._jobs.values() if j.status == RUNNING]
+                for job_id, job in list(self._jobs.items()):
+                    if job.done and now - job.finished_at > self.retention:
+                        del self._jobs[job_id]
+            for job in running:
+                if job.elapsed > job.timeout:
+                    self._stop(job, TIMED_OUT)
@@ -0,0 +1,281 @@
+"""Atomic deposits and withdrawals on a credit card, with an append-only ledger.
+
+Every posting runs in one transaction: the card row is locked with
+``SELECT ... FOR UPDATE``, the new balance is computed from the locked value,
+and the ``credit_cards`` update and its ``card_ledger`` entry commit together.
+Concurrent postings to the same card therefore queue on the row lock instead
+of overwriting each other, and postings to other cards do not wait at all.
+
+Each posting carries an idempotency key (unique in the ledger). Posting the
+same key again - a double click, a rerun, a client retry after a timeout -
+returns the entry already recorded instead of moving money twice. Rejected
+withdrawals are recorded too, so a retried key gets the same answer.
+
+``python banksight_ledger.py loadtest --card 1 2 3 --ops 5000 --threads 32``
+fires concurrent deposits and withdrawals (with duplicate retries) at the
+cards and checks that each final balance equals the opening balance plus
+every posted entry and that the ledger's balance chain has no gaps.
+"""
+
+import argparse
+import decimal
+import json
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql
+
+from banksight_pool import ConnectionPool
+
+
+log = logging.getLogger("banksight.ledger")
+
+LEDGER_DDL = """
+CREATE TABLE IF NOT EXISTS card_ledger (
+    entry_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    idempotency_key VARCHAR(64) NOT NULL,
+    Card_ID INT NOT NULL,
+    action VARCHAR(16) NOT NULL,
+    amount DECIMAL(15,2) NOT NULL,
+    balance_before DECIMAL(15,2) NOT NULL,
+    balance_after DECIMAL(15,2) NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    UNIQUE KEY uq_card_ledger_key (idempotency_key),
+    KEY ix_card_ledger_card (Card_ID, entry_id)
+)
+"""
+
+ACTIONS = ("Deposit", "Withdraw")
+CENT = decimal.Decimal("0.01")
+DEADLOCK_RETRIES = 3
+ER_LOCK_DEADLOCK = 1213
+
+
+class UnknownCard(Exception):
+    """Raised when a posting names a card that does not exist."""
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def _money(value):
+    return decimal.Decimal(str(value)).quantize(CENT, rounding=decimal.ROUND_HALF_UP)
+
+
+class CardLedger:
+
+    def __init__(self, db):
+        self.db = db
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _ensure_table(self):
+        if self._ready:
+            return
+        with self._ready_lock:
+            if not self._ready:
+                self.db.execute(LEDGER_DDL)
+                self._ready = True
+
+    # ---------------- READS ----------------
+    def cards(self, customer_id):
+        """The customer's cards, for the card picker."""
+        return self.db.read_sql(
+            "SELECT Card_ID, Card_Type, Card_Network, Card_Number, Current_Balance, Status "
+            "FROM credit_cards WHERE Customer_ID = %s ORDER BY Card_ID",
+            (customer_id,),
+        )
+
+    def balance(self, card_id):
+        row = self.db.fetch_one("SELECT Current_Balance FROM credit_cards WHERE Card_ID = %s", (card_id,))
+        if row is None:
+            raise UnknownCard(card_id)
+        return row[0]
+
+    def entry(self, idempotency_key):
+        self._ensure_table()
+        return self.db.fetch_dict("SELECT * FROM card_ledger WHERE idempotency_key = %s", (idempotency_key,))
+
+    def history(self, card_id, limit=20):
+        self._ensure_table()
+        return self.db.read_sql(
+            "SELECT entry_id, created_at, action, amount, balance_before, balance_after, status "
+            "FROM card_ledger WHERE Card_ID = %s ORDER BY entry_id DESC LIMIT %s",
+            (card_id, int(limit)),
+        )
+
+    # ---------------- POSTING ----------------
+    def post(self, card_id, action, amount, idempotency_key=None):
+        """Apply a deposit or withdrawal and return its ledger entry.
+
+        The entry is a dict with ``status`` ``"posted"`` or ``"rejected"``
+        (insufficient balance) and ``replayed`` True when ``idempotency_key``
+        had already been posted.
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"unknown action: {action!r}")
+        amount = _money(amount)
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        key = idempotency_key or new_key()
+        self._ensure_table()
+        for attempt in range(DEADLOCK_RETRIES + 1):
+            try:
+                entry = self._post(card_id, action, amount, key)
+                break
+            except pymysql.err.IntegrityError:
+                # A concurrent request with the same key committed first.
+                entry = None
+                break
+            except pymysql.err.OperationalError as exc:
+                if exc.args[0] != ER_LOCK_DEADLOCK or attempt == DEADLOCK_RETRIES:
+                    raise
+        if entry is None:
+            entry = dict(self.entry(key), replayed=True)
+        return entry
+
+    def _post(self, card_id, action, amount, key):
+        with self.db.transaction() as cur:
+            # Lock the card first. InnoDB takes the read snapshot at the first
+            # plain SELECT, so the key check below sees any entry committed by
+            # a request that held the lock before us (and takes no gap locks).
+            cur.execute("SELECT Current_Balance FROM credit_cards WHERE Card_ID = %s FOR UPDATE", (card_id,))
+            row = cur.fetchone()
+            if row is None:
+                raise UnknownCard(card_id)
+            cur.execute("SELECT entry_id FROM card_ledger WHERE idempotency_key = %s", (key,))
+            if cur.fetchone() is not None:
+                return None
+
+            before = _money(row[0] or 0)
+            if action == "Deposit":
+                after, status = before + amount, "posted"
+            elif amount > before:
+                after, status = before, "rejected"
+            else:
+                after, status = before - amount, "posted"
+
+            if status == "posted":
+                cur.execute("UPDATE credit_cards SET Current_Balance = %s WHERE Card_ID = %s", (after, card_id))
+            cur.execute(
+                "INSERT INTO card_ledger (idempotency_key, Card_ID, action, amount, balance_before, "
+                "balance_after, status) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                (key, card_id, action, amount, before, after, status),
+            )
+            entry_id = cur.lastrowid
+        return {"entry_id": entry_id, "idempotency_key": key, "Card_ID": card_id, "action": action,
+                "amount": amount, "balance_before": before, "balance_after": after, "status": status,
+                "replayed": False}
+
+
+# ---------------- LOAD TEST ----------------
+def _verify(ledger, card_id, run, start_balance):
+    entries = [
+        (action, _money(amount), _money(before), _money(after), status)
+        for action, amount, before, after, status in ledger.db.fetch_all(
+            "SELECT action, amount, balance_before, balance_after, status FROM card_ledger "
+            "WHERE Card_ID = %s AND idempotency_key LIKE %s ORDER BY entry_id",
+            (card_id, f"load-{run}-%"),
+        )
+    ]
+    net = sum((e[1] if e[0] == "Deposit" else -e[1]) for e in entries if e[4] == "posted")
+    # Each entry must start from the balance the previous one left.
+    breaks = sum(1 for prev, cur in zip(entries, entries[1:]) if cur[2] != prev[3])
+    if entries and entries[0][2] != start_balance:
+        breaks += 1
+    final = _money(ledger.balance(card_id))
+    return {
+        "entries": len(entries), "posted": sum(1 for e in entries if e[4] == "posted"),
+        "rejected": sum(1 for e in entries if e[4] == "rejected"),
+        "start_balance": str(start_balance), "final_balance": str(final),
+        "expected_balance": str(start_balance + net), "chain_breaks": breaks,
+        "ok": final == start_balance + net and breaks == 0,
+    }
+
+
+def load_test(ledger, card_ids, ops=5000, threads=32, max_amount=500, retry_share=0.05, seed=None):
+    """Fire concurrent postings at ``card_ids`` and verify nothing was lost."""
+    rng = random.Random(seed)
+    run = new_key()[:12]
+    start_balances = {card: _money(ledger.balance(card)) for card in card_ids}
+    # Some requests are sent twice to exercise the idempotency path.
+    plan = []
+    for number in range(ops):
+        request = (rng.choice(card_ids), rng.choice(ACTIONS), _money(rng.uniform(1, max_amount)),
+                   f"load-{run}-{number}")
+        plan.append(request)
+        if rng.random() < retry_share:
+            plan.append(request)
+    rng.shuffle(plan)
+
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def fire(request):
+        card_id, action, amount, key = request
+        started = time.perf_counter()
+        try:
+            entry = ledger.post(card_id, action, amount, key)
+        except Exception as exc:
+            with lock:
+                failures.append(f"{key}: {exc}")
+            return None
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+        return entry
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = [r for r in pool.map(fire, plan) if r is not None]
+    seconds = time.perf_counter() - started
+
+    cards = {card: _verify(ledger, card, run, balance) for card, balance in start_balances.items()}
+    unique_keys = len({request[3] for request in plan})
+    latencies.sort()
+    for failure in failures[:10]:
+        log.warning("failed: %s", failure)
+    return {
+        "requests": len(plan), "unique_keys": unique_keys, "threads": threads,
+        "ledger_entries": sum(c["entries"] for c in cards.values()),
+        "replayed": sum(1 for r in results if r["replayed"]), "failures": len(failures),
+        "seconds": round(seconds, 3), "ops_per_second": round(len(plan) / max(seconds, 1e-9), 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 2) if latencies else None,
+        "cards": cards,
+        "ok": (all(c["ok"] for c in cards.values()) and not failures
+               and sum(c["entries"] for c in cards.values()) == unique_keys),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Card ledger tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("loadtest", help="concurrent postings against one card")
+    load.add_argument("--card", type=int, nargs="+", required=True, help="Card_IDs to post against")
+    load.add_argument("--ops", type=int, default=5000)
+    load.add_argument("--threads", type=int, default=32)
+    load.add_argument("--max-amount", type=float, default=500)
+    load.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    db = ConnectionPool(size=args.threads)
+    try:
+        report = load_test(CardLedger(db), args.card, args.ops, args.threads, args.max_amount, seed=args.seed)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
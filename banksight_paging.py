@@ -0,0 +1,60 @@
+"""Keyset pagination for the View Tables page.
+
+A page is ``WHERE <pk> > last_key ORDER BY <pk> LIMIT n`` so fetching page
+10,000 costs the same as fetching page 1, unlike LIMIT/OFFSET. Once a page
+has been read the next one is loaded in the background so "Next" is served
+from the result cache.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from banksight_filters import quote_identifier
+
+
+_prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="banksight-prefetch")
+
+
+class KeysetPager:
+
+    def __init__(self, table, key, reader, page_size=100):
+        """``reader(sql, params)`` returns a DataFrame (normally ``cached_read``)."""
+        self.table = table
+        self.key = key
+        self.reader = reader
+        self.page_size = page_size
+
+    def page_query(self, after=None):
+        sql = f"SELECT * FROM {quote_identifier(self.table)}"
+        params = []
+        if after is not None:
+            sql += f" WHERE {quote_identifier(self.key)} > %s"
+            params.append(after)
+        sql += f" ORDER BY {quote_identifier(self.key)} LIMIT %s"
+        params.append(int(self.page_size))
+        return sql, params
+
+    def fetch(self, after=None, prefetch=True):
+        df = self.reader(*self.page_query(after))
+        if prefetch and len(df) == self.page_size:
+            _prefetcher.submit(self.fetch, self.last_key(df), False)
+        return df
+
+    def last_key(self, df):
+        value = df[self.key].iloc[-1]
+        # numpy scalars are not understood by the DB driver
+        return value.item() if hasattr(value, "item") else value
+
+    def estimate_count(self):
+        """Approximate row count from table statistics, exact COUNT(*) as a fallback."""
+        try:
+            df = self.reader(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [self.table],
+            )
+            if not df.empty and df.iloc[0, 0] is not None:
+                return int(df.iloc[0, 0]), True
+        except Exception:
+            pass
+        df = self.reader(f"SELECT COUNT(*) FROM {quote_identifier(self.table)}", [])
+        return int(df.iloc[0, 0]), False
@@ -0,0 +1,286 @@
+"""Connection pool for the BankSight dashboard.
+
+Streamlit re-runs the whole script on every widget interaction, so the app
+must not open a connection (or share a cursor) at import time. The pool is
+created once per process (see ``get_pool`` in ``banksight_streamlit.py``)
+and every query checks a connection out, uses its own cursor and hands the
+connection back.
+
+Reads go through an unbuffered ``SSCursor`` (``stream``): rows come off the
+socket one chunk at a time instead of the whole result being buffered as
+tuples and then copied into a DataFrame. ``read_sql`` compacts each chunk
+with ``dtypes`` hints (see ``COLUMN_DTYPES`` in ``banksight_schema.py``)
+before stitching the chunks together, so peak memory is the compact result
+plus one raw chunk.
+"""
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import pymysql
+
+from banksight_frames import STREAM_ROWS, assemble
+
+
+DB_CONFIG = {
+    "host": os.environ.get("BANKSIGHT_DB_HOST", "localhost"),
+    "user": os.environ.get("BANKSIGHT_DB_USER", "root"),
+    "password": os.environ.get("BANKSIGHT_DB_PASSWORD", "root"),
+    "database": os.environ.get("BANKSIGHT_DB_NAME", "banksight"),
+    "port": int(os.environ.get("BANKSIGHT_DB_PORT", 3306)),
+    "autocommit": True,
+}
+
+POOL_SIZE = int(os.environ.get("BANKSIGHT_POOL_SIZE", 8))
+CHECKOUT_TIMEOUT = float(os.environ.get("BANKSIGHT_POOL_TIMEOUT", 10))
+# Connections idle for longer than this are pinged before being handed out.
+HEALTH_CHECK_INTERVAL = float(os.environ.get("BANKSIGHT_POOL_HEALTH_CHECK", 30))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout."""
+
+
+class ConnectionPool:
+
+    def __init__(self, size=POOL_SIZE, timeout=CHECKOUT_TIMEOUT,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, **connect_kwargs):
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = dict(DB_CONFIG, **connect_kwargs)
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._open = 0
+        self._closed = False
+        self._observers = []
+
+    # ---------------- CONNECTION LIFECYCLE ----------------
+    def _connect(self):
+        conn = pymysql.connect(**self.connect_kwargs)
+        with self._lock:
+            self._open += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._open -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since):
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f"no database connection available after {self.timeout:.1f}s "
+                f"(pool size {self.size})"
+            )
+        try:
+            while True:
+                try:
+                    conn, idle_since = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._is_healthy(conn, idle_since):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        try:
+            if broken or self._closed or not conn.open:
+                self._discard(conn)
+            else:
+                if not conn.get_autocommit():
+                    conn.rollback()
+                    conn.autocommit(True)
+                self._idle.put((conn, time.monotonic()))
+        except Exception:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "open": self._open,
+            "idle": self._idle.qsize(),
+        }
+
+    # ---------------- QUERY OBSERVERS ----------------
+    def add_observer(self, callback):
+        """Call ``callback(query, params, seconds, **stats)`` after every query run through the helpers.
+
+        ``stats`` may carry ``rows``, ``bytes`` (of the DataFrame built),
+        ``db_seconds`` and ``build_seconds``, depending on the helper.
+        """
+        self._observers.append(callback)
+
+    @contextmanager
+    def _observed(self, query, params):
+        # The helper fills ``stats``; a "seconds" entry replaces the wall
+        # time (``stream`` leaves out the time its consumer spends).
+        stats = {}
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = stats.pop("seconds", time.perf_counter() - started)
+            for callback in self._observers:
+                try:
+                    callback(query, params, elapsed, **stats)
+                except Exception:
+                    pass
+
+    # ---------------- REQUEST HELPERS ----------------
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        with self.connection() as conn:
+            cur = conn.cursor(cursor_class) if cursor_class else conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    def read_sql(self, query, params=None, dtypes=None, chunk_rows=STREAM_ROWS, on_start=None):
+        """The whole result as one DataFrame, read in chunks; see ``assemble``."""
+        return assemble(self.stream(query, params, chunk_rows, on_start), dtypes)
+
+    def fetch_all(self, query, params=None):
+        with self.cursor() as cur, self._observed(query, params) as stats:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            stats["rows"] = len(rows)
+            return rows
+
+    def fetch_one(self, query, params=None):
+        with self.cursor() as cur, self._observed(query, params) as stats:
+            cur.execute(query, params)
+            row = cur.fetchone()
+            stats["rows"] = int(row is not None)
+            return row
+
+    def fetch_dict(self, query, params=None):
+        """First row as a ``{column: value}`` dict, or None."""
+        with self.cursor() as cur, self._observed(query, params) as stats:
+            cur.execute(query, params)
+            row = cur.fetchone()
+            stats["rows"] = int(row is not None)
+            if row is None:
+                return None
+            return {d[0]: value for d, value in zip(cur.description, row)}
+
+    def fetch_column(self, query, params=None):
+        return [row[0] for row in self.fetch_all(query, params)]
+
+    def stream(self, query, params=None, chunk_rows=STREAM_ROWS, on_start=None):
+        """Yield the result as DataFrames of up to ``chunk_rows`` rows.
+
+        Uses an unbuffered ``SSCursor``: rows are read off the socket as the
+        caller consumes them, so memory holds one chunk whatever the result
+        size. The connection stays checked out until the generator finishes
+        or is closed. A result with no rows yields one empty DataFrame so
+        callers still see the columns. DECIMAL values become floats, as with
+        ``pd.read_sql``.
+
+        ``on_start(thread_id)`` is called with the server connection id before
+        the query runs and ``on_start(None)`` before the connection goes back
+        to the pool, so a caller can ``kill_query`` it in between and never
+        hit someone else's query.
+        """
+        with self.cursor(pymysql.cursors.SSCursor) as cur, self._observed(query, params) as stats:
+            db_seconds = build_seconds = 0.0
+            total_rows = total_bytes = 0
+            try:
+                if on_start is not None:
+                    on_start(cur.connection.thread_id())
+                started = time.perf_counter()
+                cur.execute(query, params)
+                columns = [d[0] for d in cur.description]
+                while True:
+                    rows = cur.fetchmany(chunk_rows)
+                    fetched = time.perf_counter()
+                    db_seconds += fetched - started
+                    if not rows and total_rows:
+                        break
+                    df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                    total_rows += len(df)
+                    total_bytes += int(df.memory_usage(index=False, deep=True).sum())
+                    build_seconds += time.perf_counter() - fetched
+                    yield df
+                    if not rows:
+                        break
+                    started = time.perf_counter()
+            finally:
+                if on_start is not None:
+                    on_start(None)
+                stats.update(rows=total_rows, bytes=total_bytes, db_seconds=db_seconds,
+                             build_seconds=build_seconds, seconds=db_seconds + build_seconds)
+
+    def execute(self, query, params=None):
+        with self.connection() as conn:
+            with conn.cursor() as cur, self._observed(query, params) as stats:
+                cur.execute(query, params)
+                rowcount = stats["rows"] = cur.rowcount
+            conn.commit()
+            return rowcount
+
+    def kill_query(self, thread_id):
+        """Abort the statement running on server connection ``thread_id`` (the connection survives)."""
+        self.execute("KILL QUERY %s", (int(thread_id),))
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor inside an explicit transaction (commit or rollback)."""
+        with self.connection() as conn:
+            conn.begin()
+            cur = conn.cursor()
+            try:
+                yield cur
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
@@ -0,0 +1,234 @@
+"""Latency profiling for the dashboard: what is slow, on which page.
+
+``Profiler`` keeps the last ``BANKSIGHT_PROFILE_EVENTS`` timings in a ring
+buffer. Three kinds of event go in:
+
+* ``query``: every database call made through the connection pool (it is a
+  pool observer). Each records the query fingerprint, rows returned, bytes
+  of the DataFrame built from them, time spent in the database / on the
+  wire and time spent building the DataFrame.
+* ``pandas``: blocks of in-process filtering, wrapped in ``block(name)``.
+* ``render``: one Streamlit script run of a menu page, from ``begin_page``
+  to ``end_page``.
+
+Events are tagged with the menu page the calling thread is rendering, so
+the Performance page can show p50 / p95 / p99 per page and per query plus
+the slowest calls. ``json_report`` and ``prometheus`` export the same
+numbers; with ``BANKSIGHT_METRICS_PORT`` set they are also served over HTTP
+at ``/metrics`` (Prometheus text format) and ``/metrics.json``. Percentiles
+cover the events still in the buffer, not the process lifetime.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from banksight_advisor import fingerprint
+
+
+log = logging.getLogger("banksight.profiler")
+
+CAPACITY = int(os.environ.get("BANKSIGHT_PROFILE_EVENTS", 5000))
+METRICS_PORT = int(os.environ.get("BANKSIGHT_METRICS_PORT", 0))
+QUANTILES = (0.5, 0.95, 0.99)
+# Events raised outside a page run (background refreshes and syncs).
+BACKGROUND = "background"
+
+
+def query_id(text):
+    """Short stable label for a query fingerprint (Prometheus labels stay small)."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+class Profiler:
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self._events = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._server = None
+
+    # ---------------- RECORDING ----------------
+    def current_page(self):
+        return getattr(self._local, "page", None) or BACKGROUND
+
+    def _add(self, kind, name, total_seconds, **fields):
+        event = {"at": time.time(), "page": self.current_page(), "kind": kind, "name": name,
+                 "total_ms": round(total_seconds * 1000, 3), "rows": None, "bytes": None,
+                 "db_ms": None, "build_ms": None}
+        for key, value in fields.items():
+            event[key] = round(value * 1000, 3) if key.endswith("_ms") and value is not None else value
+        with self._lock:
+            self._events.append(event)
+
+    def observe(self, query, params, seconds, rows=None, bytes=None, db_seconds=None,
+                build_seconds=None):
+        """Pool observer: one ``query`` event per database call."""
+        text = fingerprint(query)
+        self._add("query", query_id(text), seconds, query=text, rows=rows, bytes=bytes,
+                  db_ms=seconds if db_seconds is None else db_seconds, build_ms=build_seconds)
+
+    @contextmanager
+    def block(self, name):
+        """Time a block of pandas / in-memory filtering."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add("pandas", name, time.perf_counter() - started)
+
+    @contextmanager
+    def on_page(self, page):
+        """Attribute events from this thread (e.g. a background job) to ``page``."""
+        previous = getattr(self._local, "page", None)
+        self._local.page = page
+        try:
+            yield
+        finally:
+            self._local.page = previous
+
+    def begin_page(self, page):
+        self._local.page = page
+        self._local.started = time.perf_counter()
+
+    def end_page(self):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            self._add("render", self.current_page(), time.perf_counter() - started)
+        self._local.page = self._local.started = None
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    # ---------------- REPORTS ----------------
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def frame(self, kind=None):
+        df = pd.DataFrame(self.events(), columns=["at", "page", "kind", "name", "query", "total_ms",
+                                                  "rows", "bytes", "db_ms", "build_ms"])
+        if kind is not None:
+            df = df[df["kind"] == kind]
+        return df
+
+    def latency(self, kind, by):
+        """Per ``by`` group: calls, p50 / p95 / p99 / max of ``total_ms`` and row and byte totals."""
+        df = self.frame(kind)
+        if df.empty:
+            return pd.DataFrame(columns=[*by, "calls", "p50_ms", "p95_ms", "p99_ms", "max_ms",
+                                         "rows", "bytes"])
+        grouped = df.groupby(list(by), dropna=False)
+        report = grouped["total_ms"].agg(calls="count", max_ms="max")
+        for q in QUANTILES:
+            report[f"p{int(q * 100)}_ms"] = grouped["total_ms"].quantile(q)
+        report["rows"] = grouped["rows"].sum(min_count=1)
+        report["bytes"] = grouped["bytes"].sum(min_count=1)
+        report = report[["calls", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rows", "bytes"]]
+        return report.sort_values("p95_ms", ascending=False).reset_index()
+
+    def slowest(self, limit=20, kind="query"):
+        return self.frame(kind).nlargest(limit, "total_ms").reset_index(drop=True)
+
+    def json_report(self):
+        def records(df):
+            return json.loads(df.to_json(orient="records"))
+
+        return {
+            "capacity": self.capacity,
+            "events": len(self._events),
+            "pages": records(self.latency("render", ["page"])),
+            "queries": records(self.latency("query", ["name", "query"])),
+            "queries_by_page": records(self.latency("query", ["page"])),
+            "pandas": records(self.latency("pandas", ["page", "name"])),
+            "slowest": records(self.slowest()),
+        }
+
+    def prometheus(self):
+        """Prometheus text exposition: one summary per event kind."""
+        lines = []
+        metrics = [
+            ("banksight_page_render_seconds", "Streamlit script run time per menu page.",
+             "render", ["page"]),
+            ("banksight_query_seconds", "Database call time per page and query.",
+             "query", ["page", "name"]),
+            ("banksight_pandas_seconds", "In-memory filtering time per page and block.",
+             "pandas", ["page", "name"]),
+        ]
+        df = self.frame()
+        for metric, help_text, kind, labels in metrics:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+            events = df[df["kind"] == kind]
+            if events.empty:
+                continue
+            for key, group in events.groupby(labels):
+                names = ["query" if label == "name" and kind == "query" else label for label in labels]
+                base = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, key))
+                seconds = group["total_ms"] / 1000
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{{base},quantile="{q}"}} {seconds.quantile(q):.6f}')
+                lines.append(f"{metric}_sum{{{base}}} {seconds.sum():.6f}")
+                lines.append(f"{metric}_count{{{base}}} {len(seconds)}")
+        queries = df[df["kind"] == "query"]
+        for metric, column, help_text in [
+            ("banksight_query_rows", "rows", "Rows returned per page and query."),
+            ("banksight_query_bytes", "bytes", "Bytes of DataFrames built per page and query."),
+        ]:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            if queries.empty:
+                continue
+            for (page, name), total in queries.groupby(["page", "name"])[column].sum(min_count=1).items():
+                if not pd.isna(total):
+                    lines.append(f'{metric}{{page="{_escape(page)}",query="{name}"}} {int(total)}')
+        return "\n".join(lines) + "\n"
+
+    # ---------------- HTTP ----------------
+    def serve(self, port=METRICS_PORT):
+        """Serve ``/metrics`` and ``/metrics.json`` from a daemon thread."""
+        if self._server is not None or not port:
+            return self
+        profiler = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, kind = profiler.prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, kind = json.dumps(profiler.json_report(), default=str), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                log.debug(format, *args)
+
+        try:
+            self._server = ThreadingHTTPServer(("", port), Handler)
+        except OSError:
+            # Another Streamlit process on this host already serves the port.
+            log.warning("metrics port %d is in use; not serving metrics from this process", port)
+            return self
+        threading.Thread(target=self._server.serve_forever, name="banksight-metrics",
+                         daemon=True).start()
+        log.info("serving metrics on :%d/metrics", port)
+        return self
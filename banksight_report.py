@@ -0,0 +1,145 @@
+"""One-click report: every Analytical Insights question, run concurrently.
+
+``InsightReport`` submits one job per question to the ``JobExecutor``,
+keeping at most ``parallelism`` of them queued or running; each finished
+job starts the next. The questions share the executor's deduplication with
+single-question runs, so a question another session is already running is
+joined rather than run twice. Wall-clock time is roughly the slowest
+question rather than the sum of all of them, and ``serial_seconds``
+reports that sum for comparison.
+
+The finished report exports as one file:
+
+* Excel: one sheet per question plus an index sheet. This needs openpyxl
+  or xlsxwriter and is offered only when one is installed.
+* Parquet bundle: a zip with one Parquet file per question and a
+  ``manifest.json`` of the questions, statuses and timings.
+"""
+
+import importlib.util
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from banksight_jobs import DONE
+from banksight_frames import arrow_frame
+from banksight_snapshot import settle
+
+
+PARALLELISM = int(os.environ.get("BANKSIGHT_REPORT_PARALLELISM", 4))
+EXCEL_ENGINE = next((engine for engine in ("xlsxwriter", "openpyxl")
+                     if importlib.util.find_spec(engine) is not None), None)
+
+
+class InsightReport:
+
+    def __init__(self, executor, tasks, parallelism=PARALLELISM):
+        """``tasks``: ``(insight, key, fn, label, binding)`` per question, in report order."""
+        self.executor = executor
+        self.parallelism = max(1, parallelism)
+        self.tasks = list(tasks)
+        self.jobs = {}
+        self.started_at = None
+        self.finished_at = None
+        self._pending = list(self.tasks)
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        for _ in range(self.parallelism):
+            self._submit_next()
+        return self
+
+    def _submit_next(self, finished=None):
+        with self._lock:
+            if self._cancelled or not self._pending:
+                if finished is not None and self.done and self.finished_at is None:
+                    self.finished_at = time.monotonic()
+                return
+            insight, key, fn, label, _ = self._pending.pop(0)
+        job = self.executor.submit(key, fn, label=label)
+        with self._lock:
+            self.jobs[insight.name] = job
+        job.add_done_callback(self._submit_next)
+
+    @property
+    def done(self):
+        return not self._pending and all(job.done for job in self.jobs.values())
+
+    @property
+    def finished(self):
+        return sum(1 for job in self.jobs.values() if job.done)
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def serial_seconds(self):
+        """What running the finished questions one after another would have taken."""
+        return sum(job.elapsed for job in self.jobs.values() if job.done)
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            self._pending = []
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            self.executor.cancel(job)
+        if self.finished_at is None:
+            self.finished_at = time.monotonic()
+
+    def results(self):
+        """``[(insight, job)]`` in report order, for the questions submitted so far."""
+        return [(insight, self.jobs[insight.name]) for insight, *_ in self.tasks
+                if insight.name in self.jobs]
+
+    def frames(self):
+        return {insight.name.upper(): job.result[0] for insight, job in self.results()
+                if job.status == DONE}
+
+    def manifest(self):
+        bindings = {task[0].name: task[4] for task in self.tasks}
+        return [{"question": insight.name.upper(), "title": insight.question,
+                 "parameters": insight.describe(bindings[insight.name]) or "defaults",
+                 "status": job.status,
+                 "seconds": round(job.elapsed, 3),
+                 "rows": len(job.result[0]) if job.status == DONE else None,
+                 "note": job.result[1] if job.status == DONE else str(job.error or "")}
+                for insight, job in self.results()]
+
+    # ---------------- EXPORT ----------------
+    def to_excel(self):
+        if EXCEL_ENGINE is None:
+            raise RuntimeError("Excel export needs openpyxl or xlsxwriter (pip install openpyxl)")
+        out = io.BytesIO()
+        with pd.ExcelWriter(out, engine=EXCEL_ENGINE) as writer:
+            pd.DataFrame(self.manifest()).to_excel(writer, sheet_name="Index", index=False)
+            for name, df in self.frames().items():
+                df.to_excel(writer, sheet_name=name, index=False)
+        return out.getvalue()
+
+    def to_parquet_bundle(self):
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as bundle:
+            for name, df in self.frames().items():
+                df = arrow_frame(df.copy())
+                table = pa.Table.from_pandas(df, schema=settle(pa.Schema.from_pandas(df, preserve_index=False)),
+                                             preserve_index=False)
+                buffer = io.BytesIO()
+                pq.write_table(table, buffer)
+                bundle.writestr(f"{name}.parquet", buffer.getvalue())
+            bundle.writestr("manifest.json", json.dumps(
+                {"elapsed_seconds": round(self.elapsed, 3), "serial_seconds": round(self.serial_seconds, 3),
+                 "parallelism": self.parallelism, "questions": self.manifest()}, indent=2, default=str))
+        return out.getvalue()
@@ -0,0 +1,303 @@
+"""Hourly, daily and monthly rollups of ``transactions`` for the trend charts.
+
+``txn_rollup_hour``, ``txn_rollup_day`` and ``txn_rollup_month`` hold, per
+bucket and (customer_id, txn_type, status), the number of transactions and
+their total amount. A trend over any time range reads the coarsest rollup
+that still shows its shape instead of scanning ``transactions``.
+
+Writers call ``record`` with the ``txn_time`` values they touched (old and
+new ones, for updates and deletes), or with None when they cannot tell, as
+after a TRUNCATE-and-reload. Only the distinct hours are logged, in the
+``insight_changes`` log the insight summaries use, so even a large bulk load
+logs a few hundred hours. A refresh reads the hours logged past its
+high-water mark and recomputes them from ``transactions``. It then recomputes
+the days holding them from the hour rollup and the months from the day
+rollup, all in one database transaction. Like a summary group, a bucket can
+be recomputed any number of times. An unknown change, or more than
+``BANKSIGHT_ROLLUP_MAX_HOURS`` hours, rebuilds all three tables into side
+tables that are then swapped in. The refresh state is kept in
+``insight_refresh`` as ``txn_rollups``, so the change log is not pruned past
+what the rollups have read (except past ``BANKSIGHT_CHANGE_RETENTION``,
+after which the next refresh rebuilds).
+
+Transactions without a ``txn_time`` are left out. Recomputing an hour reads
+``transactions`` by ``txn_time`` range, so keep an index on it (``--index``
+adds one).
+
+    python banksight_rollups.py --rebuild --index
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from banksight_filters import quote_identifier
+from banksight_insights import in_clause
+from banksight_schema import COLUMN_DTYPES
+from banksight_summaries import SummaryStore
+
+
+log = logging.getLogger("banksight.rollups")
+
+# Above this many changed hours a full rebuild is cheaper than a partial one.
+MAX_HOURS = int(os.environ.get("BANKSIGHT_ROLLUP_MAX_HOURS", 2000))
+GRAINS = ("hour", "day", "month")
+DIMENSIONS = ("customer_id", "txn_type", "status")
+COLUMNS = "bucket_start, customer_id, txn_type, status, txn_count, total_amount"
+STATE_NAME = "txn_rollups"
+CHANGE_TABLE = "txn_rollup"
+# The longest range ``grain_for`` still draws at the finer grains.
+AUTO_SPAN = {"hour": datetime.timedelta(days=3), "day": datetime.timedelta(days=180)}
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket_start DATETIME NOT NULL,
+    customer_id VARCHAR(10),
+    txn_type VARCHAR(50),
+    status VARCHAR(20),
+    txn_count INT NOT NULL,
+    total_amount DECIMAL(18,2),
+    KEY (bucket_start),
+    KEY (customer_id, bucket_start)
+)
+"""
+
+
+def table_name(grain):
+    return f"txn_rollup_{grain}"
+
+
+def floor_sql(grain, column):
+    """SQL for the start of the ``grain`` bucket holding ``column``."""
+    if grain == "hour":
+        return f"DATE_ADD(DATE({column}), INTERVAL HOUR({column}) HOUR)"
+    if grain == "day":
+        return f"DATE({column})"
+    return f"DATE_SUB(DATE({column}), INTERVAL DAYOFMONTH({column}) - 1 DAY)"
+
+
+def floor(grain, stamp):
+    stamp = pd.Timestamp(stamp)
+    if grain == "hour":
+        return stamp.floor("h")
+    if grain == "day":
+        return stamp.normalize()
+    return stamp.normalize().replace(day=1)
+
+
+def next_bucket(grain, start):
+    if grain == "hour":
+        return start + pd.Timedelta(hours=1)
+    if grain == "day":
+        return start + pd.Timedelta(days=1)
+    return start + pd.offsets.MonthBegin(1)
+
+
+def grain_for(start, end):
+    """The finest grain that keeps a ``start``-``end`` chart to a few hundred points."""
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for grain in ("hour", "day"):
+        if span <= AUTO_SPAN[grain]:
+            return grain
+    return "month"
+
+
+def hours_of(times):
+    """The distinct hours ``times`` fall in, as Timestamps (unparseable / NULL times skipped)."""
+    values = pd.Series([None if t is None else str(t) for t in times], dtype="string")
+    parsed = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return sorted(parsed.dropna().dt.floor("h").unique())
+
+
+def _runs(grain, buckets):
+    """Contiguous ``[start, end)`` ranges covering ``buckets``."""
+    runs = []
+    for start in sorted(buckets):
+        end = next_bucket(grain, start)
+        if runs and runs[-1][1] == start:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+    return runs
+
+
+def _range_clause(column, runs):
+    clause = " OR ".join(f"({column} >= %s AND {column} < %s)" for _ in runs)
+    return f"({clause})", [bound.to_pydatetime() for run in runs for bound in run]
+
+
+class RollupStore:
+
+    def __init__(self, db, max_hours=MAX_HOURS):
+        self.db = db
+        self.max_hours = max_hours
+        # The change log and refresh state shared with the insight summaries.
+        self.changes = SummaryStore(db, ())
+        self._lock = threading.Lock()
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _ensure_tables(self):
+        if self._ready:
+            return
+        with self._ready_lock:
+            if not self._ready:
+                self.changes._ensure_tables()
+                for grain in GRAINS:
+                    self.db.execute(ROLLUP_DDL.format(table=quote_identifier(table_name(grain))))
+                self._ready = True
+
+    # ---------------- CHANGE LOG ----------------
+    def record(self, times=None):
+        """Log a write by the ``txn_time`` values it touched; None if they are unknown."""
+        self._ensure_tables()
+        payload = None
+        if times is not None:
+            hours = hours_of(times)
+            if not hours:
+                return
+            payload = json.dumps([f"{hour:%Y-%m-%d %H:%M:%S}" for hour in hours])
+        self.changes.log_change(CHANGE_TABLE, payload)
+
+    # ---------------- REFRESH ----------------
+    @staticmethod
+    def _select(grain, source, where=None):
+        """Rows of the ``grain`` rollup, aggregated from ``source`` (the next finer level)."""
+        column, count, amount = "bucket_start", "SUM(txn_count)", "SUM(total_amount)"
+        if grain == "hour":
+            column, count, amount = "txn_time", "COUNT(*)", "SUM(amount)"
+        dimensions = ", ".join(DIMENSIONS)
+        sql = (f"SELECT {floor_sql(grain, column)} AS bucket, {dimensions}, {count}, {amount} "
+               f"FROM {source} WHERE {where or column + ' IS NOT NULL'}")
+        return sql + f" GROUP BY bucket, {dimensions}"
+
+    def _rebuild(self):
+        source, renames, rows = "transactions", [], 0
+        for grain in GRAINS:
+            live, fresh, stale = (quote_identifier(table_name(grain) + suffix) for suffix in ("", "__new", "__old"))
+            self.db.execute(f"DROP TABLE IF EXISTS {fresh}")
+            self.db.execute(ROLLUP_DDL.format(table=fresh))
+            count = self.db.execute(f"INSERT INTO {fresh} ({COLUMNS}) {self._select(grain, source)}")
+            if grain == "hour":
+                rows = count
+            renames += [f"{live} TO {stale}", f"{fresh} TO {live}"]
+            source = fresh
+        self.db.execute("RENAME TABLE " + ", ".join(renames))
+        for grain in GRAINS:
+            self.db.execute(f"DROP TABLE {quote_identifier(table_name(grain) + '__old')}")
+        return rows
+
+    def _apply(self, hours):
+        buckets = {"hour": set(hours)}
+        buckets["day"] = {floor("day", hour) for hour in hours}
+        buckets["month"] = {floor("month", day) for day in buckets["day"]}
+        source = "transactions"
+        with self.db.transaction() as cur:
+            for grain in GRAINS:
+                table = quote_identifier(table_name(grain))
+                runs = _runs(grain, buckets[grain])
+                clause, params = _range_clause("bucket_start", runs)
+                cur.execute(f"DELETE FROM {table} WHERE {clause}", params)
+                clause, params = _range_clause("txn_time" if grain == "hour" else "bucket_start", runs)
+                cur.execute(f"INSERT INTO {table} ({COLUMNS}) {self._select(grain, source, clause)}", params)
+                source = table
+
+    def refresh(self, full=False):
+        """Apply the logged writes (or rebuild) and return the refresh state."""
+        self._ensure_tables()
+        with self._lock:
+            state, latest, changes = self.changes.pending(STATE_NAME, (CHANGE_TABLE,))
+            started = time.perf_counter()
+            hours = None
+            if state is not None and not full:
+                payloads = [payload for _, payload in changes]
+                if not payloads:
+                    self.changes._save_state(STATE_NAME, latest)
+                    return self.changes.state(STATE_NAME)
+                if None not in payloads:
+                    hours = {pd.Timestamp(hour) for payload in payloads for hour in json.loads(payload)}
+            if hours is not None and len(hours) <= self.max_hours:
+                self._apply(hours)
+                mode, count = "incremental", len(hours)
+            else:
+                mode, count = "full", self._rebuild()
+            self.changes._save_state(STATE_NAME, latest, mode, count, int((time.perf_counter() - started) * 1000))
+            self.changes._prune()
+            log.info("%s rollup refresh: %s hours / rows in %.2fs", mode, count, time.perf_counter() - started)
+            return self.changes.state(STATE_NAME)
+
+    # ---------------- READS ----------------
+    def bounds(self):
+        """First and last day with transactions, or ``(None, None)`` when there are none."""
+        self.refresh()
+        first, last = self.db.fetch_one(
+            f"SELECT MIN(bucket_start), MAX(bucket_start) FROM {quote_identifier(table_name('day'))}")
+        if first is None:
+            return None, None
+        return pd.Timestamp(first).date(), pd.Timestamp(last).date()
+
+    def trend(self, start, end, grain=None, by="txn_type", customer_id=None, statuses=None, txn_types=None):
+        """``(df, grain, state)``: transactions and amount per bucket (and ``by``) from ``start`` to ``end``.
+
+        ``end`` is exclusive; every bucket starting in the range is included
+        whole, so a month chart starts at the month ``start`` falls in.
+        """
+        if by is not None and by not in DIMENSIONS:
+            raise ValueError(f"cannot break a trend down by {by!r}")
+        grain = grain or grain_for(start, end)
+        state = self.refresh()
+        conditions = ["bucket_start >= %s", "bucket_start < %s"]
+        params = [floor(grain, start).to_pydatetime(), pd.Timestamp(end).to_pydatetime()]
+        if customer_id:
+            conditions.append("customer_id = %s")
+            params.append(customer_id)
+        for column, values in (("status", statuses), ("txn_type", txn_types)):
+            if values:
+                clause, values = in_clause(column, values)
+                conditions.append(clause)
+                params += values
+        group = "bucket_start" + (f", {by}" if by else "")
+        sql = (f"SELECT {group}, SUM(txn_count) AS txn_count, SUM(total_amount) AS total_amount "
+               f"FROM {quote_identifier(table_name(grain))} WHERE {' AND '.join(conditions)} "
+               f"GROUP BY {group} ORDER BY bucket_start")
+        return self.db.read_sql(sql, params, dtypes=COLUMN_DTYPES), grain, state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the transaction rollups.")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild from transactions instead of the change log")
+    parser.add_argument("--index", action="store_true",
+                        help="add an index on transactions (txn_time) if there is none")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    from banksight_pool import ConnectionPool
+
+    db = ConnectionPool()
+    try:
+        if args.index and not db.fetch_one(
+                "SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                "AND table_name = 'transactions' AND column_name = 'txn_time' AND seq_in_index = 1")[0]:
+            db.execute("ALTER TABLE transactions ADD INDEX ix_transactions_txn_time (txn_time), "
+                       "ALGORITHM=INPLACE, LOCK=NONE")
+        state = RollupStore(db).refresh(full=args.rebuild)
+        print(f"{state['refresh_mode']} refresh: {state['groups_refreshed']} in {state['duration_ms']} ms")
+        for grain in GRAINS:
+            count = db.fetch_one(f"SELECT COUNT(*) FROM {quote_identifier(table_name(grain))}")[0]
+            print(f"{table_name(grain):>18}  {count:10d} rows")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Table metadata shared by the dashboard and its helper modules."""
+
+
+# Display label -> table name, in the order the dashboard lists them.
+TABLE_LABELS = {
+    "Customers": "customers",
+    "Accounts": "accounts",
+    "Loans": "loans",
+    "Transactions": "transactions",
+    "Branches": "branches",
+    "Support Tickets": "support_tickets",
+    "Credit Cards": "credit_cards",
+}
+
+PRIMARY_KEYS = {
+    "customers": "customer_id",
+    "accounts": "customer_id",
+    "loans": "Loan_ID",
+    "transactions": "txn_id",
+    "branches": "Branch_ID",
+    "support_tickets": "Ticket_ID",
+    "credit_cards": "Card_ID",
+}
+
+# Numeric columns of the notebook schema; the rest are strings or dates.
+NUMERIC_COLUMNS = {
+    "customers": {"age"},
+    "accounts": {"account_balance"},
+    "transactions": {"amount"},
+    "branches": {"Total_Employees", "Branch_Revenue", "Performance_Rating"},
+    "loans": {"Loan_ID", "Loan_Amount", "Interest_Rate", "Loan_Term_Months"},
+    "credit_cards": {"Card_ID", "Credit_Limit", "Current_Balance"},
+    "support_tickets": {"Customer_Rating"},
+}
+
+# Key and reference columns; the typed table layer stores the text ones as
+# integer codes (see ``banksight_tables.py``).
+ID_COLUMNS = ["customer_id", "Customer_ID", "txn_id", "Account_ID", "Loan_ID", "Card_ID",
+              "Branch_ID", "Ticket_ID"]
+
+# dtype hints for ``ConnectionPool.read_sql``, by column name (the same name
+# means the same kind of value in every table). Low-cardinality labels
+# become categoricals, DATE / DATETIME columns datetime64. DECIMAL columns
+# stay float64: filter values (widget options, ``DistinctIndex``) are float64
+# too, and a narrower copy would no longer compare equal to them.
+COLUMN_DTYPES = {
+    "gender": "category",
+    "city": "category",
+    "City": "category",
+    "account_type": "category",
+    "txn_type": "category",
+    "status": "category",
+    "Status": "category",
+    "Branch": "category",
+    "Loan_Type": "category",
+    "Loan_Status": "category",
+    "Card_Type": "category",
+    "Card_Network": "category",
+    "Issue_Category": "category",
+    "Priority": "category",
+    "Channel": "category",
+    "join_date": "datetime64",
+    "last_updated": "datetime64",
+    "txn_time": "datetime64",
+    "bucket_start": "datetime64",
+    "Opening_Date": "datetime64",
+    "Start_Date": "datetime64",
+    "End_Date": "datetime64",
+    "Issued_Date": "datetime64",
+    "Expiry_Date": "datetime64",
+    "Date_Opened": "datetime64",
+    "Date_Closed": "datetime64",
+}
@@ -0,0 +1,133 @@
+"""ID allocation for every table the dashboard inserts into.
+
+``id_sequences`` holds the next free number of each table's sequence.
+``SequenceTable.reserve(name, count)`` locks that one row, moves it forward by
+``count`` and commits, so concurrent writers get disjoint blocks without
+scanning the target table and hold the lock only for the reservation itself.
+A sequence is seeded once, the first time it is used, from the highest number
+already in its table; bulk loads call ``resync`` afterwards so rows loaded
+from outside never collide with later allocations.
+
+``IdAllocator`` sits on top: each process reserves ``BANKSIGHT_ID_BLOCK``
+numbers at a time and hands them out from memory, formatted the way the
+table's keys look (``C0001``, ``T00001``, plain integers). An add therefore
+costs a dictionary lookup and, once per block, one short transaction.
+Numbers a process reserved but never used are skipped, not reused.
+"""
+
+import os
+import threading
+
+import pymysql
+
+
+SEQUENCES_DDL = """
+CREATE TABLE IF NOT EXISTS id_sequences (
+    name VARCHAR(64) PRIMARY KEY,
+    next_value BIGINT NOT NULL
+)
+"""
+
+BLOCK_SIZE = int(os.environ.get("BANKSIGHT_ID_BLOCK", 20))
+
+# First-use seed for each sequence: the highest number already taken.
+SEEDS = {
+    "customers": "SELECT MAX(CAST(SUBSTRING(customer_id, 2) AS UNSIGNED)) FROM customers",
+    "transactions": "SELECT MAX(CAST(SUBSTRING(txn_id, 2) AS UNSIGNED)) FROM transactions",
+    "branches": "SELECT MAX(CAST(Branch_ID AS UNSIGNED)) FROM branches",
+    "loans": "SELECT MAX(Loan_ID) FROM loans",
+    "support_tickets": "SELECT MAX(CAST(SUBSTRING(Ticket_ID, 2) AS UNSIGNED)) FROM support_tickets",
+    "credit_cards": "SELECT MAX(Card_ID) FROM credit_cards",
+}
+
+# How a number is written as the table's key; None keeps the integer.
+ID_FORMATS = {
+    "customers": "C{:04d}",
+    "transactions": "T{:05d}",
+    "branches": "{}",
+    "loans": None,
+    "support_tickets": "T{:05d}",
+    "credit_cards": None,
+}
+
+
+class SequenceTable:
+
+    def __init__(self, db, seeds=SEEDS):
+        self.db = db
+        self.seeds = seeds
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _ensure_table(self):
+        if self._ready:
+            return
+        with self._ready_lock:
+            if not self._ready:
+                self.db.execute(SEQUENCES_DDL)
+                self._ready = True
+
+    def _seed(self, name):
+        row = self.db.fetch_one(self.seeds[name]) if name in self.seeds else None
+        return int(row[0] or 0) + 1 if row else 1
+
+    def reserve(self, name, count=1):
+        """First number of a block of ``count`` consecutive numbers of ``name``."""
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        self._ensure_table()
+        while True:
+            with self.db.transaction() as cur:
+                cur.execute("SELECT next_value FROM id_sequences WHERE name = %s FOR UPDATE", (name,))
+                row = cur.fetchone()
+                if row is not None:
+                    cur.execute("UPDATE id_sequences SET next_value = next_value + %s WHERE name = %s",
+                                (count, name))
+                    return int(row[0])
+            try:
+                self.db.execute("INSERT INTO id_sequences (name, next_value) VALUES (%s, %s)",
+                                (name, self._seed(name)))
+            except pymysql.err.IntegrityError:
+                pass  # another process seeded it first
+
+    def peek(self, name):
+        self._ensure_table()
+        row = self.db.fetch_one("SELECT next_value FROM id_sequences WHERE name = %s", (name,))
+        return int(row[0]) if row else None
+
+    def resync(self, *names):
+        """Move sequences past IDs written without them (bulk loads, manual inserts)."""
+        self._ensure_table()
+        for name in names:
+            if name in self.seeds:
+                self.db.execute("UPDATE id_sequences SET next_value = GREATEST(next_value, %s) WHERE name = %s",
+                                (self._seed(name), name))
+
+
+class IdAllocator:
+
+    def __init__(self, sequences, block_size=BLOCK_SIZE, formats=ID_FORMATS):
+        self.sequences = sequences
+        self.block_size = block_size
+        self.formats = formats
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def format(self, table, number):
+        fmt = self.formats[table]
+        return number if fmt is None else fmt.format(number)
+
+    def next_id(self, table):
+        """The next key for ``table``, from this process's reserved block."""
+        with self._lock:
+            current, end = self._blocks.get(table, (0, 0))
+            if current >= end:
+                current = self.sequences.reserve(table, self.block_size)
+                end = current + self.block_size
+            self._blocks[table] = (current + 1, end)
+        return self.format(table, current)
+
+    def take(self, table, count):
+        """``count`` consecutive keys reserved directly, for batch inserts."""
+        start = self.sequences.reserve(table, count)
+        return [self.format(table, n) for n in range(start, start + count)]
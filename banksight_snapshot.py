@@ -0,0 +1,369 @@
+"""Parquet snapshots of the BankSight tables, and an offline query layer over them.
+
+``export`` copies every table out of MySQL in keyset-ordered chunks into
+``BANKSIGHT_SNAPSHOT_DIR/<name>/<table>/``, one Parquet file per table
+except ``transactions``, which is partitioned by month of ``txn_time``
+(``transactions/month=2025-03/part-0.parquet``). Chunks are appended as row
+groups, so the export never holds a whole table in memory. The snapshot is
+written to a temporary directory and renamed into place with its
+``manifest.json``, so a snapshot is either complete or absent.
+
+``Snapshot`` answers the dashboard's read-only pages without touching MySQL:
+
+* View Tables and Filter Data compile a ``FilterQuery`` into a pyarrow
+  filter expression and read only the columns they show. Parquet row-group
+  statistics skip row groups that cannot match. Date predicates on
+  ``txn_time`` also become ``month`` predicates that skip whole partitions.
+* The Analytical Insights questions run their live SQL on a
+  ``banksight_columnar`` DuckDB engine whose tables are views over the
+  Parquet files; DuckDB pushes filters and projections down into the scan.
+  The engine compares text case-insensitively like MySQL, so a question
+  gives the same rows as it would live on the same data. DuckDB is optional
+  and only needed for this part.
+
+    python banksight_snapshot.py export
+    python banksight_snapshot.py list
+"""
+
+import argparse
+import datetime
+import functools
+import json
+import logging
+import operator
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from banksight_distinct import MAX_OPTIONS, SEARCH_LIMIT, option_sort_key, plain_value
+from banksight_filters import FilterQuery, quote_identifier
+from banksight_frames import arrow_frame
+from banksight_ingest import TABLES
+from banksight_paging import KeysetPager
+from banksight_pool import ConnectionPool
+from banksight_schema import PRIMARY_KEYS
+
+
+log = logging.getLogger("banksight.snapshot")
+
+SNAPSHOT_DIR = os.environ.get("BANKSIGHT_SNAPSHOT_DIR", "snapshots")
+EXPORT_ROWS = int(os.environ.get("BANKSIGHT_SNAPSHOT_CHUNK", 100000))
+MANIFEST = "manifest.json"
+# table -> timestamp column whose month names the partition.
+PARTITIONS = {"transactions": "txn_time"}
+PARTITION_COLUMN = "month"
+NO_MONTH = "unknown"
+
+
+# ---------------- EXPORT ----------------
+def settle(schema):
+    """The first chunk's schema, with all-NULL columns widened to strings."""
+    return pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+
+
+def _months(values):
+    return pd.to_datetime(values, errors="coerce").dt.strftime("%Y-%m").fillna(NO_MONTH)
+
+
+def read_chunks(db, table, chunk_rows=EXPORT_ROWS):
+    """``table`` as typed DataFrames of up to ``chunk_rows`` rows, in key order."""
+    key = PRIMARY_KEYS[table]
+    after = None
+    while True:
+        sql = f"SELECT * FROM {quote_identifier(table)}"
+        params = []
+        if after is not None:
+            sql += f" WHERE {quote_identifier(key)} > %s"
+            params.append(after)
+        sql += f" ORDER BY {quote_identifier(key)} LIMIT %s"
+        params.append(int(chunk_rows))
+        df = arrow_frame(db.read_sql(sql, params), TABLES.get(table, {}).get("dates", ()))
+        if df.empty:
+            return
+        yield df
+        if len(df) < chunk_rows:
+            return
+        after = df[key].iloc[-1]
+        after = after.item() if hasattr(after, "item") else after
+
+
+def _export_table(db, table, out_dir, chunk_rows):
+    partition_by = PARTITIONS.get(table)
+    writers, schema, rows = {}, None, 0
+    try:
+        for df in read_chunks(db, table, chunk_rows):
+            if schema is None:
+                schema = settle(pa.Schema.from_pandas(df, preserve_index=False))
+            groups = df.groupby(_months(df[partition_by])) if partition_by else [(None, df)]
+            for month, part in groups:
+                writer = writers.get(month)
+                if writer is None:
+                    folder = out_dir if month is None else os.path.join(out_dir, f"{PARTITION_COLUMN}={month}")
+                    os.makedirs(folder, exist_ok=True)
+                    writer = writers[month] = pq.ParquetWriter(os.path.join(folder, "part-0.parquet"), schema)
+                writer.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+            rows += len(df)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {
+        "rows": rows,
+        "columns": list(schema.names) if schema is not None else [],
+        "partitioned_by": partition_by,
+        "files": len(writers),
+    }
+
+
+def export(db, root=SNAPSHOT_DIR, name=None, tables=None, chunk_rows=EXPORT_ROWS):
+    """Write a snapshot of ``tables`` (default: all) and return its manifest."""
+    name = name or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    final = os.path.join(root, name)
+    if os.path.exists(final):
+        raise FileExistsError(f"snapshot {name!r} already exists")
+    staging = os.path.join(root, f".{name}.partial")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    started = time.perf_counter()
+    manifest = {"name": name, "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                "tables": {}}
+    try:
+        for table in tables or PRIMARY_KEYS:
+            table_started = time.perf_counter()
+            info = _export_table(db, table, os.path.join(staging, table), chunk_rows)
+            info["seconds"] = round(time.perf_counter() - table_started, 3)
+            manifest["tables"][table] = info
+            log.info("%s: %d rows in %d file(s), %.2fs", table, info["rows"], info["files"], info["seconds"])
+        manifest["seconds"] = round(time.perf_counter() - started, 3)
+        with open(os.path.join(staging, MANIFEST), "w") as fh:
+            json.dump(manifest, fh, indent=2)
+        os.replace(staging, final)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def list_snapshots(root=SNAPSHOT_DIR):
+    """Names of the complete snapshots under ``root``, newest first."""
+    if not os.path.isdir(root):
+        return []
+    names = [n for n in os.listdir(root)
+             if not n.startswith(".") and os.path.isfile(os.path.join(root, n, MANIFEST))]
+    return sorted(names, reverse=True)
+
+
+def open_snapshot(name, root=SNAPSHOT_DIR):
+    return Snapshot(os.path.join(root, name))
+
+
+# ---------------- READING ----------------
+def _array(values, type_):
+    try:
+        return pa.array(values, type=type_)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        return pa.array(values).cast(type_)
+
+
+def _scalar(value, type_):
+    return _array([value], type_)[0]
+
+
+class Snapshot:
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as fh:
+            self.manifest = json.load(fh)
+        self.name = self.manifest["name"]
+        self.created_at = datetime.datetime.fromisoformat(self.manifest["created_at"])
+        self._datasets = {}
+        self._distinct = {}
+        self._ranges = {}
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def tables(self):
+        return list(self.manifest["tables"])
+
+    def columns(self, table):
+        return self.manifest["tables"][table]["columns"]
+
+    def column(self, table, name):
+        """The stored spelling of ``name`` (MySQL column names are case-insensitive)."""
+        for column in self.columns(table):
+            if column.lower() == name.lower():
+                return column
+        raise KeyError(f"{table} has no column {name!r}")
+
+    def dataset(self, table):
+        with self._lock:
+            dataset = self._datasets.get(table)
+            if dataset is None:
+                partitioning = None
+                if self.manifest["tables"][table]["partitioned_by"]:
+                    partitioning = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive")
+                dataset = self._datasets[table] = ds.dataset(
+                    os.path.join(self.path, table), format="parquet", partitioning=partitioning)
+        return dataset
+
+    # ---------------- FILTERS ----------------
+    def _prune(self, table, column, op, value):
+        """Partition predicates implied by a predicate on the partition column."""
+        if self.manifest["tables"][table]["partitioned_by"] != column or op not in ("eq", "gt", "ge", "le", "lt"):
+            return []
+        month = pd.Timestamp(value).strftime("%Y-%m")
+        field = pc.field(PARTITION_COLUMN)
+        if op == "eq":
+            return [field == month]
+        if op in ("gt", "ge"):
+            return [field >= month]
+        # The bound's own month can still hold earlier rows.
+        return [field <= month]
+
+    def expression(self, fq):
+        """``fq`` as a pyarrow filter expression (None when it has no predicates)."""
+        schema = self.dataset(fq.table).schema
+        parts = []
+        for op, column, args in fq.predicates:
+            name = self.column(fq.table, column)
+            field, type_ = pc.field(name), schema.field(name).type
+            if op == "not_null":
+                parts.append(field.is_valid())
+                continue
+            if op == "in":
+                parts.append(field.isin(_array(list(args), type_)))
+                continue
+            value = _scalar(args[0], type_)
+            parts.append({"eq": operator.eq, "gt": operator.gt, "ge": operator.ge,
+                          "le": operator.le, "lt": operator.lt}[op](field, value))
+            parts.extend(self._prune(fq.table, name, op, args[0]))
+        return functools.reduce(operator.and_, parts) if parts else None
+
+    def count(self, fq):
+        return self.dataset(fq.table).count_rows(filter=self.expression(fq))
+
+    def read(self, fq, columns=None, order_by=None, limit=None, offset=0):
+        """Matching rows as a DataFrame, reading only the columns asked for."""
+        columns = [self.column(fq.table, c) for c in (columns or fq.columns or self.columns(fq.table))]
+        sort = self.column(fq.table, order_by) if order_by else None
+        scan = columns + ([sort] if sort and sort not in columns else [])
+        table = self.dataset(fq.table).to_table(columns=scan, filter=self.expression(fq))
+        if sort and limit is not None:
+            k = min(offset + limit, table.num_rows)
+            table = table.take(pc.select_k_unstable(table, k, [(sort, "ascending")])) if k else table.slice(0, 0)
+            table = table.sort_by(sort)
+        elif sort:
+            table = table.sort_by(sort)
+        if limit is not None:
+            table = table.slice(offset, limit)
+        return table.select(columns).to_pandas()
+
+    def batches(self, fq, columns=None, batch_rows=EXPORT_ROWS):
+        """Matching rows as a stream of DataFrames, in file order (for exports)."""
+        columns = [self.column(fq.table, c) for c in (columns or fq.columns or self.columns(fq.table))]
+        empty = True
+        for batch in self.dataset(fq.table).to_batches(columns=columns, filter=self.expression(fq),
+                                                        batch_size=batch_rows):
+            if batch.num_rows:
+                empty = False
+                yield batch.to_pandas()
+        if empty:
+            yield self.dataset(fq.table).schema.empty_table().select(columns).to_pandas()
+
+    # ---------------- WIDGET OPTIONS ----------------
+    def _values(self, table, column):
+        key = (table, column.lower())
+        with self._lock:
+            values = self._distinct.get(key)
+        if values is None:
+            name = self.column(table, column)
+            unique = pc.unique(self.dataset(table).to_table(columns=[name]).column(name)).drop_null()
+            values = sorted((plain_value(v) for v in unique.to_pylist()), key=option_sort_key)
+            with self._lock:
+                self._distinct[key] = values
+        return values
+
+    def options(self, table, column):
+        """Same contract as ``DistinctIndex.options``: None when there are too many."""
+        values = self._values(table, column)
+        return None if len(values) > MAX_OPTIONS else list(values)
+
+    def search(self, table, column, prefix="", limit=None):
+        return [v for v in self._values(table, column) if str(v).startswith(prefix)][:limit or SEARCH_LIMIT]
+
+    def min_max(self, table, column):
+        key = (table, column.lower())
+        if key not in self._ranges:
+            name = self.column(table, column)
+            result = pc.min_max(self.dataset(table).to_table(columns=[name]).column(name)).as_py()
+            self._ranges[key] = (result["min"], result["max"])
+        return self._ranges[key]
+
+    # ---------------- INSIGHTS ----------------
+    def engine(self):
+        """A DuckDB engine whose tables are views over this snapshot's files."""
+        from banksight_columnar import ColumnarEngine
+
+        with self._lock:
+            if self._engine is None:
+                self._engine = ColumnarEngine(":memory:").attach_snapshot(self)
+        return self._engine
+
+    def run_insight(self, insight, binding=None):
+        return self.engine().run_insight(insight, binding)
+
+
+class SnapshotPager(KeysetPager):
+    """``KeysetPager`` for the View Tables page, served from a snapshot."""
+
+    def __init__(self, snapshot, table, key, page_size=100):
+        super().__init__(table, key, reader=None, page_size=page_size)
+        self.snapshot = snapshot
+
+    def fetch(self, after=None, prefetch=False):
+        fq = FilterQuery(self.table).after(self.key, after)
+        return self.snapshot.read(fq, order_by=self.key, limit=self.page_size)
+
+    def estimate_count(self):
+        # Parquet footers hold exact row counts.
+        return self.snapshot.count(FilterQuery(self.table)), False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parquet snapshots of the BankSight tables.")
+    parser.add_argument("--root", default=SNAPSHOT_DIR, help="directory holding the snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("export", help="snapshot the live database")
+    run.add_argument("--name", help="snapshot name (default: a timestamp)")
+    run.add_argument("--tables", nargs="+", choices=list(PRIMARY_KEYS))
+    run.add_argument("--chunk-rows", type=int, default=EXPORT_ROWS, help="rows per read / row group")
+    sub.add_parser("list", help="list the snapshots")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.command == "list":
+        for name in list_snapshots(args.root):
+            manifest = open_snapshot(name, args.root).manifest
+            rows = sum(t["rows"] for t in manifest["tables"].values())
+            print(f"{name}  {manifest['created_at']}  {rows:,} rows")
+        return
+
+    db = ConnectionPool()
+    try:
+        manifest = export(db, args.root, args.name, args.tables, args.chunk_rows)
+    finally:
+        db.close()
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,472 @@
+import datetime
+import json
+import math
+import time
+
 import streamlit as st
 import pandas as pd
-import pymysql
-
-conn = pymysql.connect(
-    host="localhost",
-    user="root",
-    password="root",
-    database="banksight",
-    port=3306,
-    autocommit=True
-)
 
-cursor = conn.cursor()
+from banksight_advisor import QueryRecorder
+from banksight_batch import BatchPoster
+from banksight_cache import TableCache
+from banksight_columnar import DEFAULT_QUERIES as DUCKDB_QUERIES, ColumnarEngine, available as duckdb_available
+from banksight_delete import CustomerDeleter
+from banksight_distinct import DistinctIndex
+from banksight_export import FORMATS as EXPORT_FORMATS, lazy_download
+from banksight_ingest import SUMMARY_ROW_LIMIT
+from banksight_filters import FilterQuery, quote_identifier
+from banksight_insights import INSIGHTS, INSIGHTS_BY_QUESTION
+from banksight_jobs import CANCELLED, DONE, FAILED, TIMED_OUT, JobExecutor
+from banksight_ledger import CardLedger, new_key as new_ledger_key
+from banksight_paging import KeysetPager
+from banksight_pool import ConnectionPool
+from banksight_profiler import Profiler
+from banksight_report import EXCEL_ENGINE, PARALLELISM as REPORT_PARALLELISM, InsightReport
+from banksight_rollups import GRAINS as ROLLUP_GRAINS, RollupStore, table_name as rollup_table
+from banksight_schema import COLUMN_DTYPES, PRIMARY_KEYS, TABLE_LABELS
+from banksight_sequences import IdAllocator, SequenceTable
+from banksight_snapshot import SnapshotPager, list_snapshots, open_snapshot
+from banksight_summaries import SummaryStore
+from banksight_tables import ENABLED as TABLE_STORE_ENABLED, TableStore
 
 
 st.set_page_config(page_title="BankSight Dashboard", layout="wide")
 
+
+# Distinct SELECTs seen by the pool, for banksight_advisor.
+@st.cache_resource
+def get_query_recorder():
+    return QueryRecorder()
+
+
+# Timings for the Performance page (and /metrics with BANKSIGHT_METRICS_PORT).
+@st.cache_resource
+def get_profiler():
+    return Profiler().serve()
+
+
+# One pool per server process, shared by every session; each query checks a
+# connection out and uses its own cursor.
+@st.cache_resource
+def get_pool():
+    pool = ConnectionPool()
+    # Distinct SELECTs are kept for banksight_advisor (and logged to
+    # BANKSIGHT_QUERY_LOG when set).
+    pool.add_observer(get_query_recorder().record)
+    pool.add_observer(get_profiler().observe)
+    return pool
+
+
+@st.cache_resource
+def get_table_cache():
+    return TableCache()
+
+
+@st.cache_resource
+def get_distinct_index():
+    return DistinctIndex(get_pool().fetch_all)
+
+
+@st.cache_resource
+def get_summary_store():
+    return SummaryStore(get_pool(), INSIGHTS)
+
+
+@st.cache_resource
+def get_rollup_store():
+    return RollupStore(get_pool())
+
+
+@st.cache_resource
+def get_card_ledger():
+    return CardLedger(get_pool())
+
+
+# One allocator per server process: it keeps a reserved block of IDs per
+# table, so adds take the next key from memory.
+@st.cache_resource
+def get_id_allocator():
+    return IdAllocator(SequenceTable(get_pool()))
+
+
+@st.cache_resource
+def get_customer_deleter():
+    return CustomerDeleter(get_pool())
+
+
+# The DuckDB mirror for the Analytical Insights page, or None when duckdb is
+# not installed (or BANKSIGHT_DUCKDB=0). It syncs in the background.
+@st.cache_resource
+def get_columnar_engine():
+    if not duckdb_available():
+        return None
+    return ColumnarEngine().start_sync(get_pool())
+
+
+# Snapshots never change once written, so each is opened once per process
+# and its datasets, option lists and DuckDB views are shared by all sessions.
+@st.cache_resource
+def get_snapshot(name):
+    return open_snapshot(name)
+
+
+# Typed, read-only copies of the tables shared by every session's Filter Data
+# page; refreshed in the background. None when BANKSIGHT_TABLE_STORE=0.
+@st.cache_resource
+def get_table_store():
+    if not TABLE_STORE_ENABLED:
+        return None
+    return TableStore(get_pool()).start()
+
+
+# Runs Analytical Insights queries off the script thread; shared so identical
+# requests from different sessions run once.
+@st.cache_resource
+def get_job_executor():
+    return JobExecutor(get_pool())
+
+
+@st.cache_resource
+def get_batch_poster():
+    return BatchPoster(get_pool(), get_id_allocator())
+
+
+PAGE_SIZES = [50, 100, 500, 1000]
+LIVE_SOURCE = "Live database"
+# Pages that can read from a Parquet snapshot instead of MySQL.
+SNAPSHOT_PAGES = ["📊View Tables", "🔍Filter Data", "📈Analytical Insights"]
+
+db = get_pool()
+profiler = get_profiler()
+table_cache = get_table_cache()
+distinct_index = get_distinct_index()
+summaries = get_summary_store()
+rollups = get_rollup_store()
+ledger = get_card_ledger()
+id_allocator = get_id_allocator()
+batch_poster = get_batch_poster()
+customer_deleter = get_customer_deleter()
+columnar = get_columnar_engine()
+table_store = get_table_store()
+jobs = get_job_executor()
+
+
+def cached_read(tables, query, params=None):
+    return table_cache.get_or_load(
+        tables, query, lambda: db.read_sql(query, params, dtypes=COLUMN_DTYPES), params
+    )
+
+
+def fetch_row(table, key_value):
+    return db.fetch_dict(
+        f"SELECT * FROM {quote_identifier(table)} WHERE {quote_identifier(PRIMARY_KEYS[table])} = %s",
+        (key_value,),
+    )
+
+
+# Called after every committed write so no session sees stale rows.
+# ``old`` / ``new`` describe the single row written, when the caller knows it,
+# so the distinct-value index can be updated in place instead of rebuilt and
+# the insight summaries only recompute the groups the row belongs to
+# (and the transaction rollups only the hours).
+# ``rows`` does the same for a batch of inserted rows, and ``deleted``
+# ({table: rows, or None when there were too many to list}) for a cascade.
+def after_write(*tables, old=None, new=None, rows=None, deleted=None):
+    table_cache.invalidate(*tables)
+    if table_store is not None:
+        table_store.mark_stale(*tables)
+    if columnar is not None:
+        columnar.mark_stale(*tables)
+    if deleted is not None:
+        for table in tables:
+            removed = deleted.get(table)
+            if removed is None:
+                distinct_index.invalidate(table)
+                summaries.record_change(table)
+            elif removed:
+                for row in removed:
+                    distinct_index.apply_write(table, row, None)
+                summaries.record_change(table, removed)
+    elif len(tables) == 1 and rows is not None and len(rows) <= SUMMARY_ROW_LIMIT:
+        for row in rows:
+            distinct_index.apply_write(tables[0], None, row)
+        summaries.record_change(tables[0], rows)
+    elif len(tables) == 1 and (old or new):
+        distinct_index.apply_write(tables[0], old, new)
+        summaries.record_change(tables[0], [old, new])
+    else:
+        distinct_index.invalidate(*tables)
+        for table in tables:
+            summaries.record_change(table)
+    if "transactions" in tables:
+        if deleted is not None:
+            removed = deleted.get("transactions")
+            rollups.record(None if removed is None else [row.get("txn_time") for row in removed])
+        elif rows is not None:
+            rollups.record([row.get("txn_time") for row in rows])
+        elif len(tables) == 1 and (old or new):
+            rollups.record([row.get("txn_time") for row in (old, new) if row])
+        else:
+            # Cascades and other writes without row details rebuild the rollups.
+            rollups.record()
+
+
+# ---------------- FILTER HELPERS ----------------
+def option_index():
+    # A snapshot answers ``options`` / ``search`` the same way the index does.
+    return snapshot or distinct_index
+
+
+def distinct_values(table, column):
+    """Widget options from the distinct-value index (capped for high-cardinality columns)."""
+    options = option_index().options(table, column)
+    if options is None:
+        options = option_index().search(table, column)
+    return options
+
+
+def _search_options(label, table, column, key, keep=()):
+    prefix = st.text_input(f"{label} starts with", key=f"{key}_prefix",
+                           help="Too many values to list; type a prefix to search.")
+    found = option_index().search(table, column, prefix.strip())
+    return list(dict.fromkeys(list(keep) + found))
+
+
+def option_multiselect(label, table, column, key=None):
+    key = key or f"{table}_{column}_filter"
+    options = option_index().options(table, column)
+    if options is None:
+        options = _search_options(label, table, column, key, keep=st.session_state.get(key, []))
+    return st.multiselect(label, options, key=key)
+
+
+def form_options(label, table, column, key):
+    """Options for a selectbox inside an ``st.form``.
+
+    Forms do not rerun while the user types, so for a column too large to
+    list, call this before the form: it draws the prefix search box outside
+    it and returns the matches for the form's selectbox.
+    """
+    options = option_index().options(table, column)
+    if options is None:
+        options = _search_options(label, table, column, key)
+        if not options:
+            st.warning(f"No {label} matches that prefix.")
+    return options
+
+
+def option_select(label, table, column, key=None, placeholder=None):
+    key = key or f"{table}_{column}_{label}"
+    options = option_index().options(table, column)
+    if options is None:
+        options = _search_options(label, table, column, key)
+    if placeholder is not None:
+        options = [placeholder] + options
+    return st.selectbox(label, options, key=key)
+
+
+def stored(table):
+    """The shared in-memory copy of ``table``, when it is loaded and current."""
+    if snapshot or table_store is None:
+        return None
+    return table_store.get(table)
+
+
+def date_range_of(table, column):
+    typed = stored(table)
+    if snapshot:
+        with profiler.block(f"date range {table}.{column}"):
+            low, high = snapshot.min_max(table, column)
+    elif typed is not None:
+        with profiler.block(f"date range {table}.{column}"):
+            low, high = typed.min_max(column)
+    else:
+        col = quote_identifier(column)
+        df = cached_read(
+            table, f"SELECT MIN({col}), MAX({col}) FROM {quote_identifier(table)}"
+        )
+        low, high = df.iloc[0, 0], df.iloc[0, 1]
+    if pd.isna(low) or pd.isna(high):
+        return None, None
+    return pd.Timestamp(low).date(), pd.Timestamp(high).date()
+
+
+def export_button(label, fq, order_by, file_stem, key):
+    """Format picker plus a download that streams the matching rows on click."""
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        fmt = st.selectbox("Format", list(EXPORT_FORMATS), key=f"{key}_export_format")
+    ext, mime = EXPORT_FORMATS[fmt]
+    if snapshot:
+        chunks = lambda: snapshot.batches(fq)
+    else:
+        chunks = lambda: db.stream(*fq.select(order_by=order_by))
+    with col2:
+        st.download_button(label, lazy_download(chunks, fmt, fq.table), f"{file_stem}.{ext}",
+                           mime=mime, key=f"{key}_export")
+
+
+def show_filtered(fq, order_by, key, empty_message=None):
+    """Fetch and display one LIMIT/OFFSET page of the rows matching ``fq``."""
+    typed = stored(fq.table)
+    if snapshot:
+        with profiler.block(f"count {fq.table}"):
+            total = snapshot.count(fq)
+    elif typed is not None:
+        # A mask over the shared frame; only the page below is copied out.
+        with profiler.block(f"mask {fq.table}"):
+            positions = typed.positions(fq, order_by)
+        total = len(positions)
+    else:
+        total = int(cached_read(fq.table, *fq.count()).iloc[0, 0])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    pages = max(1, math.ceil(total / page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=pages, key=f"{key}_page")
+
+    if snapshot:
+        with profiler.block(f"page {fq.table}"):
+            df = snapshot.read(fq, order_by=order_by, limit=page_size, offset=(page - 1) * page_size)
+    elif typed is not None:
+        with profiler.block(f"page {fq.table}"):
+            df = typed.take(positions[(page - 1) * page_size:page * page_size], fq.columns)
+    else:
+        sql, params = fq.select(order_by=order_by, limit=page_size, offset=(page - 1) * page_size)
+        df = cached_read(fq.table, sql, params)
+
+    if df.empty and empty_message:
+        st.warning(empty_message)
+    else:
+        st.dataframe(df, use_container_width=True)
+        st.caption(f"Page {page} of {pages} · {total:,} matching rows")
+    return df, total
+
+# ---------------- INSIGHT JOBS ----------------
+def parameter_inputs(insight):
+    """Widgets for ``insight``'s parameters; the validated binding, or None if a value is invalid."""
+    saved = st.session_state.setdefault("insight_params", {}).get(insight.name) or insight.bind()
+    values = {}
+    for param in insight.params:
+        key, value = f"param_{insight.name}_{param.name}", saved[param.name]
+        if param.kind == "date":
+            values[param.name] = st.date_input(param.label, value=value, help=param.help, key=key)
+        elif param.kind == "bands":
+            values[param.name] = st.text_input(param.label, value=param.format(value), help=param.help, key=key)
+        elif param.kind == "int":
+            values[param.name] = st.number_input(param.label, min_value=param.minimum, max_value=param.maximum,
+                                                 value=value, step=1, help=param.help, key=key)
+        else:
+            bounds = [None if b is None else float(b) for b in (param.minimum, param.maximum)]
+            values[param.name] = st.number_input(param.label, min_value=bounds[0], max_value=bounds[1],
+                                                 value=float(value), step=1000.0, format="%.2f",
+                                                 help=param.help, key=key)
+    try:
+        binding = insight.bind(values)
+    except ValueError as e:
+        st.error(str(e))
+        return None
+    # The full report runs every question with the values last set for it.
+    st.session_state["insight_params"][insight.name] = binding
+    return binding
+
+
+def read_live_cached(insight, binding, job):
+    """Live result for ``binding``; repeat runs are served from the table cache until a write."""
+    sql, params = insight.live_sql(binding)
+    return table_cache.get_or_load(
+        insight.tables, sql, lambda: summaries.read_live(insight.name, binding, on_start=job.attach), params)
+
+
+def insight_runner(insight, result_source, binding=None):
+    """``fn(job)`` for the job executor; returns ``(df, freshness caption)``."""
+    source = snapshot
+
+    def run(job):
+        with profiler.on_page("📈Analytical Insights"):
+            if result_source == "Snapshot":
+                return (source.run_insight(insight, binding),
+                        f"Computed from snapshot {source.name} taken at {source.created_at:%Y-%m-%d %H:%M:%S}.")
+            if result_source == "DuckDB" and columnar.ready(insight.tables):
+                df = columnar.run_insight(insight, binding)
+                synced_at, stale = columnar.freshness(insight.tables)
+                return df, (f"Computed by DuckDB on the mirror synced at {synced_at:%Y-%m-%d %H:%M:%S}"
+                            + (" · recent writes are still syncing." if stale else "."))
+            if result_source in ("Live", "DuckDB"):
+                freshness = "Live result computed from the raw tables."
+                if result_source == "DuckDB":
+                    freshness += " The DuckDB mirror is still loading."
+                return read_live_cached(insight, binding, job), freshness
+            if not insight.materializable(binding):
+                return read_live_cached(insight, binding, job), (
+                    "Live result computed from the raw tables: the stored summary only holds the "
+                    "default " + ", ".join(p.label for p in insight.params if p.name in insight.summary_params)
+                    + ".")
+            df, state = summaries.read(insight.name, binding)
+            return df, (
+                f"Materialized result · current as of {state['checked_at']:%Y-%m-%d %H:%M:%S} · "
+                f"last {state['refresh_mode']} refresh at {state['refreshed_at']:%Y-%m-%d %H:%M:%S} "
+                f"({state['groups_refreshed']} groups, {state['duration_ms']} ms)"
+            )
+
+    return run
+
+
+@st.fragment(run_every=1)
+def poll_insight_job(job_id):
+    """Progress of a running job; re-renders itself every second until it finishes."""
+    job = jobs.get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    st.progress(min(job.elapsed / job.timeout, 1.0),
+                text=f"{job.label} {job.status} · {job.elapsed:.1f}s (limit {job.timeout:.0f}s)")
+    if job.watchers > 1:
+        st.caption(f"Shared with {job.watchers - 1} other session(s) running the same query.")
+    if st.button("✖ Cancel", key=f"cancel_{job_id}"):
+        jobs.cancel(job)
+        st.session_state.pop("insight_job", None)
+        st.rerun()
+
+
+def render_report(report):
+    st.progress(report.finished / len(report.tasks),
+                text=f"{report.finished} of {len(report.tasks)} questions · {report.elapsed:.1f}s elapsed"
+                     + (f" · {report.serial_seconds:.1f}s if run one by one" if report.done else ""))
+    for insight, job in report.results():
+        if job.status == DONE:
+            df, freshness = job.result
+            with st.expander(f"✅ {insight.question} · {len(df):,} rows · {job.elapsed:.2f}s"):
+                st.dataframe(df, use_container_width=True)
+                st.caption(freshness)
+        elif job.done:
+            with st.expander(f"⚠️ {insight.question} · {job.status}"):
+                st.write(str(job.error or job.status))
+        else:
+            st.caption(f"⏳ {insight.question} · {job.status} {job.elapsed:.1f}s")
+
+
+@st.fragment(run_every=1)
+def poll_report(report):
+    """Re-renders every second, so finished questions appear as they complete."""
+    if report.done:
+        st.rerun()
+    render_report(report)
+    if st.button("✖ Cancel report"):
+        report.cancel()
+        st.rerun()
+
+
+def show_report(report):
+    if report.done:
+        render_report(report)
+    else:
+        poll_report(report)
+
+
 # ---------------- SIDEBAR ----------------
 st.sidebar.title("📊 BankSight Navigation")
 
@@ -28,9 +479,24 @@ menu = st.sidebar.radio(
         "✏️ CRUD Operations",
         "💳Credit / Debit Simulation",
         "📈Analytical Insights",
+        "📉Transaction Trends",
+        "⏱️Performance",
         "👩‍💻About Creator",
     ]
 )
+profiler.begin_page(menu)
+
+data_source = st.sidebar.selectbox(
+    "Data source", [LIVE_SOURCE] + list_snapshots(),
+    help="View Tables, Filter Data and Analytical Insights can read a Parquet snapshot "
+         "(python banksight_snapshot.py export) instead of the live database.")
+snapshot = None
+if data_source != LIVE_SOURCE:
+    if menu in SNAPSHOT_PAGES:
+        snapshot = get_snapshot(data_source)
+        st.sidebar.caption(f"📦 Snapshot {snapshot.name} · taken {snapshot.created_at:%Y-%m-%d %H:%M}")
+    else:
+        st.sidebar.caption("This page always uses the live database.")
 
 
 if menu == "🏠Introduction":
@@ -63,22 +529,43 @@ if menu == "🏠Introduction":
 elif menu == "📊View Tables":
     st.header("📊 View Database Tables")
 
-    tables = {
-    "Customers": "customers",
-    "Accounts": "accounts",
-    "Loans": "loans",
-    "Transactions": "transactions",
-    "Branches": "branches",
-    "Support Tickets": "support_tickets",
-    "Credit Cards": "credit_cards"
-}
-
-    selected_table = st.selectbox("Select Table", tables.keys())
+    selected_table = st.selectbox("Select Table", TABLE_LABELS.keys())
+    table = TABLE_LABELS[selected_table]
+    page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key="view_page_size")
+
+    if snapshot:
+        pager = SnapshotPager(snapshot, table, PRIMARY_KEYS[table], page_size=page_size)
+    else:
+        pager = KeysetPager(
+            table,
+            PRIMARY_KEYS[table],
+            lambda sql, params: cached_read(table, sql, params),
+            page_size=page_size,
+        )
 
-    query = f"SELECT * FROM {tables[selected_table]}"
-    df = pd.read_sql(query, conn)
+    # Start keys of the pages already visited, so "Previous" can step back.
+    state_key = f"view_pages_{data_source}_{table}_{page_size}"
+    page_starts = st.session_state.setdefault(state_key, [None])
+
+    df = pager.fetch(after=page_starts[-1])
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("⬅ Previous", disabled=len(page_starts) == 1):
+            page_starts.pop()
+            st.rerun()
+    with col2:
+        if st.button("Next ➡", disabled=len(df) < page_size):
+            page_starts.append(pager.last_key(df))
+            st.rerun()
+
+    total, estimated = pager.estimate_count()
+    with col3:
+        st.caption(
+            f"Page {len(page_starts)} · {'≈' if estimated else ''}{total:,} rows in {table}"
+        )
 
-    st.dataframe(df, use_container_width=True)
+    st.dataframe(df, use_container_width=True, height=600)
 
 #------------------Filter Tbales------------------------
 
@@ -102,88 +589,44 @@ elif menu == "🔍Filter Data":
 
     # ---------- CUSTOMERS TABLE ----------
     if tables == "Customers":
-        df = pd.read_sql("SELECT * FROM customers", conn)
-        filtered_df = df.copy()
+        fq = FilterQuery("customers")
 
         st.subheader("Select columns and values to filter")
 
         # ---------- Customer ID Filter ----------
-        customer_ids = df["customer_id"].astype(str).unique().tolist()
-        selected_ids = st.multiselect(
-            "Customer ID",
-            options=customer_ids,
-            key="customer_id_filter"
-        )
-        if selected_ids:
-            filtered_df = filtered_df[
-                filtered_df["customer_id"].astype(str).isin(selected_ids)
-            ]
+        selected_ids = option_multiselect("Customer ID", "customers", "customer_id", key="customer_id_filter")
+        fq.isin("customer_id", selected_ids)
+
     #--------Name filter --------
-        customer_name = df["name"].astype(str).unique().tolist()
-        selected_ids = st.multiselect(
-            "Name",
-            options=customer_name,
-            key="customer_name_filter"
+        selected_names = option_multiselect("Name", "customers", "name", key="customer_name_filter")
+        fq.isin("name", selected_names)
 
-        )
         # ---------- Gender Filter ----------
-        selected_gender = st.multiselect(
-            "Gender",
-            options=df["gender"].dropna().unique(),
-            key="gender_filter"
-        )
-        if selected_gender:
-            filtered_df = filtered_df[
-                filtered_df["gender"].isin(selected_gender)
-            ]
+        selected_gender = option_multiselect("Gender", "customers", "gender", key="gender_filter")
+        fq.isin("gender", selected_gender)
 
         # ---------- Age Filter ----------
-   
+
         age_input = st.text_input("Enter Age :")
 
-        if age_input:  
+        if age_input:
             try:
-                age_input = int(age_input)
-                filtered_df = filtered_df[filtered_df["age"] == age_input]
+                fq.eq("age", int(age_input))
             except ValueError:
                 st.error("Please enter a valid number for age.")
 
         # ---------- City Filter ----------
-        selected_city = st.multiselect(
-            "City",
-            options=df["city"].dropna().unique(),
-            key="city_filter"
-        )
-        if selected_city:
-            filtered_df = filtered_df[
-                filtered_df["city"].isin(selected_city)
-            ]
+        selected_city = option_multiselect("City", "customers", "city", key="city_filter")
+        fq.isin("city", selected_city)
 
         # ---------- Account Type Filter ----------
-        selected_account_type = st.multiselect(
-            "Account Type",
-            options=df["account_type"].dropna().unique(),
-            key="account_type_filter"
-        )
-        if selected_account_type:
-            filtered_df = filtered_df[
-                filtered_df["account_type"].isin(selected_account_type)
-            ]
+        selected_account_type = option_multiselect("Account Type", "customers", "account_type", key="account_type_filter")
+        fq.isin("account_type", selected_account_type)
 
         # ---------- Date Filter ----------
-    
-
-        filtered_df["join_date"] = pd.to_datetime(
-            filtered_df["join_date"], errors="coerce"
-)
-
-            # Remove NaT before getting min/max
-        valid_dates = filtered_df["join_date"].dropna()
+        min_date, max_date = date_range_of("customers", "join_date")
 
-        if not valid_dates.empty:
-
-            min_date = valid_dates.min().date()
-            max_date = valid_dates.max().date()
+        if min_date is not None:
 
             date_range = st.date_input(
                 "Join Date Range",
@@ -192,39 +635,24 @@ elif menu == "🔍Filter Data":
     )
 
             if isinstance(date_range, tuple) and len(date_range) == 2:
-                filtered_df = filtered_df[
-                    filtered_df["join_date"].dt.date.between(
-                        date_range[0],
-                        date_range[1]
-            )
-        ]
+                fq.date_between("join_date", date_range[0], date_range[1])
 
         # ---------- Display Result ----------
         st.subheader("Filtered Customer Data")
-        st.dataframe(filtered_df, use_container_width=True)
+        filtered_df, total = show_filtered(fq, "customer_id", key="customers")
 
         # ---------- Summary ----------
         st.markdown("### 📊 Summary")
-        st.write(f"**Total Customers:** {len(filtered_df)}")
+        st.write(f"**Total Customers:** {total}")
 
     if tables == "Accounts":
-        df = pd.read_sql("SELECT * FROM accounts", conn)
-        df["last_updated"] = pd.to_datetime(df["last_updated"])
-        filtered_df = df.copy()
+        fq = FilterQuery("accounts")
 
         st.subheader("Filter Options")
 
         # -------- Customer ID --------
-        selected_ids = st.multiselect(
-            "Customer ID",
-            df["customer_id"].astype(str).unique(),
-            key="acc_customer_id"
-        )
-
-        if selected_ids:
-            filtered_df = filtered_df[
-                filtered_df["customer_id"].astype(str).isin(selected_ids)
-            ]
+        selected_ids = option_multiselect("Customer ID", "accounts", "customer_id", key="acc_customer_id")
+        fq.isin("customer_id", selected_ids)
 
         # -------- Account Balance --------
         balance_input = st.text_input(
@@ -232,15 +660,12 @@ elif menu == "🔍Filter Data":
         placeholder="Eg: 1000.50, 50000.75"
 )
 
-        min_balance = float(df["account_balance"].min())
-        max_balance = float(df["account_balance"].max())
-
         if balance_input:
             try:
-       
+
                 clean_input = balance_input.replace(" ", "")
 
-       
+
                 if "," not in clean_input:
                     min_val = max_val = float(clean_input)
                 else:
@@ -250,122 +675,77 @@ elif menu == "🔍Filter Data":
                 if min_val > max_val:
                     st.warning("Min balance cannot be greater than max balance")
                 else:
-                    filtered_df = filtered_df.query(
-                "account_balance >= @min_val and account_balance <= @max_val"
-            )
+                    fq.between("account_balance", min_val, max_val)
 
             except ValueError:
                 st.error("Please enter valid numbers like: 1000.50, 50000.75")
 
 
         # -------- Last Updated --------
-        date_range = st.date_input(
-            "Last Updated Date Range",
-            (df["last_updated"].min(), df["last_updated"].max()),
-            key="acc_date"
-        )
-
-        if len(date_range) == 2:
-            filtered_df = filtered_df.query(
-                "last_updated >= @date_range[0] and last_updated <= @date_range[1]"
+        min_date, max_date = date_range_of("accounts", "last_updated")
+        if min_date is not None:
+            date_range = st.date_input(
+                "Last Updated Date Range",
+                (min_date, max_date),
+                key="acc_date"
             )
 
+            if len(date_range) == 2:
+                fq.date_between("last_updated", date_range[0], date_range[1])
+
         # -------- Display --------
         st.subheader("Filtered Accounts Data")
-        st.dataframe(filtered_df, use_container_width=True)
-
+        filtered_df, total = show_filtered(fq, "customer_id", key="accounts")
+
+        if snapshot:
+            with profiler.block("average balance"):
+                avg_balance = snapshot.read(fq, columns=["account_balance"])["account_balance"].mean()
+        elif stored("accounts") is not None:
+            with profiler.block("average balance"):
+                avg_balance = pd.Series(stored("accounts").values(fq, "account_balance")).mean()
+        else:
+            avg_balance = db.fetch_one(*fq.aggregate(avg_balance="AVG(account_balance)"))[0]
         st.markdown("### 📊 Summary")
-        st.metric("Total Accounts", len(filtered_df))
+        st.metric("Total Accounts", total)
         st.metric(
             "Average Balance",
-            f"₹{filtered_df['account_balance'].mean():,.2f}"
+            f"₹{float(0 if pd.isna(avg_balance) else avg_balance):,.2f}"
         )
 
     if tables == "Loans":
 
-        df = pd.read_sql("SELECT * FROM loans", conn)
+        fq = FilterQuery("loans")
 
     # ---- FIX DATE ISSUE HERE ----
-        df["Start_Date"] = pd.to_datetime(df["Start_Date"], errors="coerce")
-        df["End_Date"] = pd.to_datetime(df["End_Date"], errors="coerce")
-
-        df = df.dropna(subset=["Start_Date", "End_Date"])
-
-        filtered_df = df.copy()
+        fq.not_null("Start_Date", "End_Date")
 
     # --- Customer ID ---
-        cust_ids = st.multiselect(
-            "Customer ID",
-            df["Customer_ID"].astype(str).unique(),
-            key="loan_customer"
-    )
+        cust_ids = option_multiselect("Customer ID", "loans", "Customer_ID", key="loan_customer")
+        fq.isin("Customer_ID", cust_ids)
 
-        if cust_ids:
-            filtered_df = filtered_df[
-                filtered_df["Customer_ID"].astype(str).isin(cust_ids)
-        ]
        #-------Load Id-------
-        loan_ids = st.multiselect(
-           "Loan ID",
-           df["Loan_ID"].astype(str).unique(),
-           key="loan_id"
-       )
-        if loan_ids:
-            filtered_df = filtered_df[
-                filtered_df["Loan_ID"].astype(str).isin(loan_ids)
-            ]
+        loan_ids = option_multiselect("Loan ID", "loans", "Loan_ID", key="loan_id")
+        fq.isin("Loan_ID", loan_ids)
 
       #---------aCCOUNT iD-----
-        account_ids = st.multiselect(
-           "Account ID",
-           df["Account_ID"].astype(str).unique(),
-           key="account_id"
-       )
-        if account_ids:
-            filtered_df = filtered_df[
-                filtered_df["Account_ID"].astype(str).isin(account_ids)
-            ]
+        account_ids = option_multiselect("Account ID", "loans", "Account_ID", key="account_id")
+        fq.isin("Account_ID", account_ids)
 
         #--------Branch------
-        branch = st.multiselect(
-            "Branch",
-            df["Branch"].astype(str).unique(),
-            key="branch"
-        )
-        if branch:
-            filtered_df = filtered_df[
-                filtered_df["Branch"].astype(str).isin(branch)
-            ]
+        branch = option_multiselect("Branch", "loans", "Branch", key="branch")
+        fq.isin("Branch", branch)
 
         #--------Interest Range--
-        interest_rate=st.multiselect(
-            "Interest Rate",
-            df["Interest_Rate"].astype(str).unique(),
-            key="interst rate"
-        )
-        if interest_rate:
-               filtered_df = filtered_df[
-                filtered_df["Interest_Rate"].astype(float).isin(interest_rate)
-            ] 
-    # --- Loan Type ---
-        loan_types = st.multiselect(
-            "Loan Type",
-            df["Loan_Type"].unique(),
-            key="loan_type"
-    )
+        interest_rate=option_multiselect("Interest Rate", "loans", "Interest_Rate", key="interst rate")
+        fq.isin("Interest_Rate", interest_rate)
 
-        if loan_types:
-            filtered_df = filtered_df.query("Loan_Type in @loan_types")
+    # --- Loan Type ---
+        loan_types = option_multiselect("Loan Type", "loans", "Loan_Type", key="loan_type")
+        fq.isin("Loan_Type", loan_types)
 
     # --- Loan Status ---
-        loan_status = st.multiselect(
-            "Loan Status",
-            df["Loan_Status"].unique(),
-            key="loan_status"
-    )
-
-        if loan_status:
-            filtered_df = filtered_df.query("Loan_Status in @loan_status")
+        loan_status = option_multiselect("Loan Status", "loans", "Loan_Status", key="loan_status")
+        fq.isin("Loan_Status", loan_status)
 
     # --- Loan Amount ---
         loan_amt = st.number_input(
@@ -375,151 +755,97 @@ elif menu == "🔍Filter Data":
 )
 
         if loan_amt:
-            filtered_df = filtered_df[filtered_df["Loan_Amount"] == loan_amt]
+            fq.eq("Loan_Amount", loan_amt)
 
     # --- Date Range (NO ERROR NOW) ---
-        date_range = st.date_input(
-            "Loan Period",
-            (df["Start_Date"].min().date(), df["End_Date"].max().date()),
-            key="loan_date"
+        start_min, _ = date_range_of("loans", "Start_Date")
+        _, end_max = date_range_of("loans", "End_Date")
+        if start_min is not None:
+            date_range = st.date_input(
+                "Loan Period",
+                (start_min, end_max),
+                key="loan_date"
 )
 
-        if isinstance(date_range, tuple) and len(date_range) == 2:
-            filtered_df = filtered_df[
-                filtered_df["Start_Date"].dt.date.between(date_range[0], date_range[1])
-    ]
+            if isinstance(date_range, tuple) and len(date_range) == 2:
+                fq.date_between("Start_Date", date_range[0], date_range[1])
+
     # --- Display ---
-        st.dataframe(filtered_df, use_container_width=True)
+        filtered_df, total = show_filtered(fq, "Loan_ID", key="loans")
 
     # --- Download ---
-        st.download_button(
-            "⬇️ Download Filtered Loans",
-            filtered_df.to_csv(index=False),
-            "filtered_loans.csv"
-    )
-
-    
-    if tables == "Transactions":
-        df = pd.read_sql("SELECT * FROM transactions", conn)
+        export_button("⬇️ Download Filtered Loans", fq, "Loan_ID", "filtered_loans", key="loans")
 
-# Clean column names
-        df.columns = df.columns.str.strip().str.lower()
 
-# Convert date column
-        df["txn_time"] = pd.to_datetime(df["txn_time"], errors="coerce")
+    if tables == "Transactions":
+        fq = FilterQuery("transactions")
 
 # ---------------- FILTER WIDGETS ----------------
 
 # Transaction ID
-    
-        txn_id = st.multiselect(
-             "Transaction ID",
-             df["txn_id"].unique()
-    )
+
+        txn_id = option_multiselect("Transaction ID", "transactions", "txn_id")
 
 # Customer ID
-        customer_id = st.multiselect(
-             "Customer ID",
-             df["customer_id"].unique()
-    )
+        customer_id = option_multiselect("Customer ID", "transactions", "customer_id")
 
 # Transaction Type
-        txn_type = st.multiselect(
-        "Transaction Type",
-        df["txn_type"].unique()
-)
+        txn_type = option_multiselect("Transaction Type", "transactions", "txn_type")
 
 # Status
-        status = st.multiselect(
-        "Status",
-        df["status"].unique()
-)
+        status = option_multiselect("Status", "transactions", "status")
 
 # Amount (typed input – no slider)
         min_amount = st.number_input("Min Amount", min_value=0.0, step=100.0)
         max_amount = st.number_input("Max Amount", min_value=0.0, step=100.0)
 
 # Transaction Date
+        first_txn, last_txn = date_range_of("transactions", "txn_time")
         start_date = st.date_input(
         "Transaction Date From",
-        df["txn_time"].min().date()
+        first_txn
 )
 
         end_date = st.date_input(
         "Transaction Date To",
-        df["txn_time"].max().date()
+        last_txn
 )
 
 # ---------------- APPLY FILTERS ----------------
 
-        filtered_df = df.copy()
-
-        if txn_id:
-            filtered_df = filtered_df[
-                filtered_df["txn_id"].astype(str).isin(txn_id)]
-
-        if customer_id:
-            filtered_df = filtered_df[
-                filtered_df["customer_id"].astype(str).isin(customer_id)]
-
-        if txn_type:
-            filtered_df = filtered_df[filtered_df["txn_type"].isin(txn_type)]
-
-        if status:
-            filtered_df = filtered_df[filtered_df["status"].isin(status)]
+        fq.isin("txn_id", txn_id)
+        fq.isin("customer_id", customer_id)
+        fq.isin("txn_type", txn_type)
+        fq.isin("status", status)
 
         if min_amount or max_amount:
-            filtered_df = filtered_df[
-            (filtered_df["amount"] >= min_amount) &
-            (filtered_df["amount"] <= (max_amount if max_amount > 0 else filtered_df["amount"].max()))
-    ]
+            fq.between("amount", min_amount, max_amount if max_amount > 0 else None)
+
+        fq.date_between("txn_time", start_date, end_date)
 
-        filtered_df = filtered_df[
-        (filtered_df["txn_time"].dt.date >= start_date) &
-        (filtered_df["txn_time"].dt.date <= end_date)
-]
-        st.dataframe(filtered_df)
+        filtered_df, total = show_filtered(fq, "txn_id", key="transactions")
 
     # --- Download ---
-        st.download_button(
-            "⬇️ Download Filtered Transactions",
-            filtered_df.to_csv(index=False),
-            "transactions.csv"
-    )
-    
-    if tables == "Branches":
+        export_button("⬇️ Download Filtered Transactions", fq, "txn_id", "transactions", key="transactions")
 
-        df = pd.read_sql("SELECT * FROM branches", conn)
-        df["Opening_Date"] = pd.to_datetime(df["Opening_Date"], errors="coerce")
+    if tables == "Branches":
 
-        filtered_df = df.copy()
+        fq = FilterQuery("branches")
 
     # ---------------- MULTISELECT FILTERS ----------------
 
         branch_id = st.multiselect(
             "Branch ID",
-            sorted(df["Branch_ID"].astype(int).unique())
+            sorted(distinct_values("branches", "Branch_ID"), key=int)
     )
 
-        branch_name = st.multiselect(
-            "Branch Name",
-            sorted(df["Branch_Name"].dropna().unique())
-    )
+        branch_name = option_multiselect("Branch Name", "branches", "Branch_Name")
 
-        city = st.multiselect(
-            "City",
-            sorted(df["City"].dropna().unique())
-    )
+        city = option_multiselect("City", "branches", "City")
 
-        manager_name = st.multiselect(
-            "Manager Name",
-            sorted(df["Manager_Name"].dropna().unique())
-    )
+        manager_name = option_multiselect("Manager Name", "branches", "Manager_Name")
 
-        performance_rating = st.multiselect(
-            "Performance Rating",
-            sorted(df["Performance_Rating"].dropna().unique())
-    )
+        performance_rating = option_multiselect("Performance Rating", "branches", "Performance_Rating")
 
         min_emp = st.number_input("Min Employees", min_value=0, step=1)
         max_emp = st.number_input("Max Employees", min_value=0, step=1)
@@ -527,242 +853,119 @@ elif menu == "🔍Filter Data":
         min_rev = st.number_input("Min Branch Revenue", min_value=0.0, step=10000.0)
         max_rev = st.number_input("Max Branch Revenue", min_value=0.0, step=10000.0)
 
-        start_date = st.date_input("Opening Date From", df["Opening_Date"].min().date())
-        end_date = st.date_input("Opening Date To", df["Opening_Date"].max().date())
+        first_opened, last_opened = date_range_of("branches", "Opening_Date")
+        start_date = st.date_input("Opening Date From", first_opened)
+        end_date = st.date_input("Opening Date To", last_opened)
 
     # ---------------- APPLY FILTERS ----------------
 
-        if branch_id:
-            filtered_df = filtered_df[
-                filtered_df["Branch_ID"].isin(branch_id)
-        ]
-
-        if branch_name:
-            filtered_df = filtered_df[
-                filtered_df["Branch_Name"].isin(branch_name)
-        ]
-
-        if city:
-            filtered_df = filtered_df[
-                filtered_df["City"].isin(city)
-        ]
-
-        if manager_name:
-            filtered_df = filtered_df[
-                filtered_df["Manager_Name"].isin(manager_name)
-        ]
-
-        if performance_rating:
-            filtered_df = filtered_df[
-                filtered_df["Performance_Rating"].isin(performance_rating)
-        ]
+        fq.isin("Branch_ID", branch_id)
+        fq.isin("Branch_Name", branch_name)
+        fq.isin("City", city)
+        fq.isin("Manager_Name", manager_name)
+        fq.isin("Performance_Rating", performance_rating)
 
         if min_emp or max_emp:
-            max_val = max_emp if max_emp > 0 else filtered_df["Total_Employees"].max()
-            filtered_df = filtered_df[
-                (filtered_df["Total_Employees"] >= min_emp) &
-                (filtered_df["Total_Employees"] <= max_val)
-        ]
+            fq.between("Total_Employees", min_emp, max_emp if max_emp > 0 else None)
 
         if min_rev or max_rev:
-            max_val = max_rev if max_rev > 0 else filtered_df["Branch_Revenue"].max()
-            filtered_df = filtered_df[
-                (filtered_df["Branch_Revenue"] >= min_rev) &
-                (filtered_df["Branch_Revenue"] <= max_val)
-        ]
-
-        filtered_df = filtered_df[
-            (filtered_df["Opening_Date"].dt.date >= start_date) &
-            (filtered_df["Opening_Date"].dt.date <= end_date)
-    ]
+            fq.between("Branch_Revenue", min_rev, max_rev if max_rev > 0 else None)
+
+        fq.date_between("Opening_Date", start_date, end_date)
 
     # ---------------- RESULT ----------------
 
-        if filtered_df.empty:
-            st.warning("No data found. Please adjust filters.")
-        else:
-            st.dataframe(filtered_df)
+        filtered_df, total = show_filtered(fq, "Branch_ID", key="branches",
+                                           empty_message="No data found. Please adjust filters.")
 
     if tables =="Support Tickets":
-      
-        # Load your support tickets dataframe
-            df = pd.read_sql("SELECT * FROM support_tickets", conn)
 
-            filtered_df = df.copy()
+            fq = FilterQuery("support_tickets")
 
 # ---------------- ID FILTERS ----------------
-            ticket_id = st.selectbox("Ticket ID",["Choose an option"] + list(df["Ticket_ID"].dropna().unique()),
-            index=0
-)
-            customer_id = st.selectbox("Customer ID",["Choose an option"] + list(df["Customer_ID"].dropna().unique()),
-            index = 0
-    )
-            account_id = st.selectbox("Account ID",["Choose an option"] + list(df["Account_ID"].dropna().unique()),
-            index = 0
-)
-            loan_id  = st.selectbox ("Loan ID", ["Choose an option"] + list(df["Loan_ID"].dropna().unique()),
-            index= 0
-    )
-            branch = st.selectbox("Branch Name",["Choose an option"] + list(filtered_df["Branch_Name"].dropna().unique()),
-            index=0
-            )    
-            issue_category = st.selectbox("Issue Category",["Choose an option"] + list(filtered_df["Issue_Category"].dropna().unique()),
-            index=0
-            )      
-            priority = st.selectbox("Priority",["Choose an option"] + list(filtered_df["Priority"].dropna().unique()),
-            index=0
-)
-            status = st.selectbox("Status",["Choose an option"] + list(filtered_df["Status"].dropna().unique()),
-            index=0
-)
-            channel = st.selectbox("Channel",["Choose an option"] + list(filtered_df["Channel"].dropna().unique()),
-            index=0
-)
-            support_agent = st.selectbox("Support Agent",["Choose an option"] + list(filtered_df["Support_Agent"].dropna().unique()),
-            index=0
-)
-
-            if ticket_id != "Choose an option":
-                filtered_df = filtered_df[
-                    filtered_df["Ticket_ID"] == ticket_id
-    ]
-
-            if customer_id != "Choose an option":
-                filtered_df = filtered_df[
-                filtered_df["Customer_ID"]== customer_id
-    ]
-
-            if account_id != "Choose an option":
-                filtered_df = filtered_df[
-                filtered_df["Account_ID"] == account_id
-    ]
-
-            if loan_id != "Choose an option":
-                filtered_df = filtered_df[
-                filtered_df["Loan_ID"]== loan_id
-    ]
-     
-            if branch != "Choose an option":
-                filtered_df = filtered_df[filtered_df["Branch_Name"] == branch]
-
-            if issue_category != "Choose an option":
-                 filtered_df = filtered_df[filtered_df["Issue_Category"] == issue_category]
-
-            if priority != "Choose an option":
-                filtered_df = filtered_df[filtered_df["Priority"] == priority]
-
-            if status != "Choose an option":
-                filtered_df = filtered_df[filtered_df["Status"] == status]
-
-            if channel != "Choose an option":
-                filtered_df = filtered_df[filtered_df["Channel"] == channel]
-
-            if support_agent != "Choose an option":
-                filtered_df = filtered_df[filtered_df["Support_Agent"] == support_agent]
+            def ticket_option(label, column):
+                return option_select(label, "support_tickets", column, placeholder="Choose an option")
+
+            ticket_id = ticket_option("Ticket ID", "Ticket_ID")
+            customer_id = ticket_option("Customer ID", "Customer_ID")
+            account_id = ticket_option("Account ID", "Account_ID")
+            loan_id = ticket_option("Loan ID", "Loan_ID")
+            branch = ticket_option("Branch Name", "Branch_Name")
+            issue_category = ticket_option("Issue Category", "Issue_Category")
+            priority = ticket_option("Priority", "Priority")
+            status = ticket_option("Status", "Status")
+            channel = ticket_option("Channel", "Channel")
+            support_agent = ticket_option("Support Agent", "Support_Agent")
+
+            for column, value in [
+                ("Ticket_ID", ticket_id),
+                ("Customer_ID", customer_id),
+                ("Account_ID", account_id),
+                ("Loan_ID", loan_id),
+                ("Branch_Name", branch),
+                ("Issue_Category", issue_category),
+                ("Priority", priority),
+                ("Status", status),
+                ("Channel", channel),
+                ("Support_Agent", support_agent),
+            ]:
+                if value != "Choose an option":
+                    fq.eq(column, value)
 
 # ---------------- DATE FILTERS ----------------
-            filtered_df["Date_Opened"] = pd.to_datetime(filtered_df["Date_Opened"], errors="coerce")
-            filtered_df["Date_Closed"] = pd.to_datetime(filtered_df["Date_Closed"], errors="coerce")
+            first_opened, last_opened = date_range_of("support_tickets", "Date_Opened")
 
             col1, col2 = st.columns(2)
             with col1:
-                opened_from = st.date_input("Opened Date From")
+                opened_from = st.date_input("Opened Date From", first_opened)
             with col2:
-                opened_to = st.date_input("Opened Date To")
+                opened_to = st.date_input("Opened Date To", last_opened)
 
             if opened_from and opened_to:
-                filtered_df = filtered_df[
-                (filtered_df["Date_Opened"] >= pd.to_datetime(opened_from)) &
-                (filtered_df["Date_Opened"] <= pd.to_datetime(opened_to))
-    ]
+                fq.date_between("Date_Opened", opened_from, opened_to)
 
 # ---------------- RATING FILTER ----------------
-            rating = st.multiselect(
-            "Customer Rating",
-            sorted(filtered_df["Customer_Rating"].dropna().unique())
-)
-
-            if rating:
-                filtered_df = filtered_df[
-                filtered_df["Customer_Rating"].isin(rating)
-    ]
+            rating = option_multiselect("Customer Rating", "support_tickets", "Customer_Rating")
+            fq.isin("Customer_Rating", rating)
 
 # ---------------- RESULT ----------------
-            if filtered_df.empty:
-                st.warning("No support tickets found. Adjust filters.")
-            else:
-                st.dataframe(filtered_df)
+            filtered_df, total = show_filtered(fq, "Ticket_ID", key="support_tickets",
+                                               empty_message="No support tickets found. Adjust filters.")
 
     if tables == "Credit Cards":
 
-        df = pd.read_sql("SELECT * FROM credit_cards", conn)
-        df["Customer_ID"] = "C" + df["Customer_ID"].astype(str)
-
-        filtered_df = df.copy()
+        fq = FilterQuery("credit_cards")
 
     # Customer ID filter
-        customer_id = st.multiselect("Customer ID",
-        df["Customer_ID"].astype(str).unique()
-    )
-
-        if customer_id:
-            filtered_df = filtered_df[
-                filtered_df["Customer_ID"].astype(str).isin(customer_id)
-        ]
+        customer_id = option_multiselect("Customer ID", "credit_cards", "Customer_ID")
+        fq.isin("Customer_ID", customer_id)
 
     # Account ID
-        account_id = st.multiselect("Account ID",
-        df["Account_ID"].astype(str).unique()
-    )
-
-        if account_id:
-            filtered_df = filtered_df[
-                filtered_df["Account_ID"].astype(str).isin(account_id)
-        ]
+        account_id = option_multiselect("Account ID", "credit_cards", "Account_ID")
+        fq.isin("Account_ID", account_id)
 
     # Card Type
-        card_type = st.multiselect("Card Type",
-        df["Card_Type"].unique()
-    )
-
-        if card_type:
-            filtered_df = filtered_df[
-                filtered_df["Card_Type"].isin(card_type)
-        ]
+        card_type = option_multiselect("Card Type", "credit_cards", "Card_Type")
+        fq.isin("Card_Type", card_type)
 
     # Card Network
-        network = st.multiselect("Card Network",
-        df["Card_Network"].unique()
-    )
-
-        if network:
-            filtered_df = filtered_df[
-                filtered_df["Card_Network"].isin(network)
-        ]
+        network = option_multiselect("Card Network", "credit_cards", "Card_Network")
+        fq.isin("Card_Network", network)
 
     # Credit Limit
         min_limit = st.number_input("Min Credit Limit", min_value=0.0)
         max_limit = st.number_input("Max Credit Limit", min_value=0.0)
 
         if min_limit or max_limit:
-            filtered_df = filtered_df[
-                (filtered_df["Credit_Limit"] >= min_limit) &
-                (filtered_df["Credit_Limit"] <= (max_limit if max_limit > 0 else filtered_df["Credit_Limit"].max()))]
+            fq.between("Credit_Limit", min_limit, max_limit if max_limit > 0 else None)
 
     # Status
-        status = st.multiselect("Status",
-        df["Status"].unique()
-    )
+        status = option_multiselect("Status", "credit_cards", "Status")
+        fq.isin("Status", status)
 
-        if status:
-            filtered_df = filtered_df[
-                filtered_df["Status"].isin(status)
-        ]
+        filtered_df, total = show_filtered(fq, "Card_ID", key="credit_cards")
 
-        st.dataframe(filtered_df)
-         
 
-            
 # ---------------- CRUD ----------------
 elif menu == "✏️ CRUD Operations":
 
@@ -781,7 +984,7 @@ elif menu == "✏️ CRUD Operations":
     # ---------------- VIEW ----------------
     if operation == "View":
         query = f"SELECT * FROM {table}"
-        df = pd.read_sql(query, conn)
+        df = cached_read(table, query)
         st.dataframe(df, use_container_width=True)
 
     # ---------------- ADD ----------------
@@ -790,7 +993,6 @@ elif menu == "✏️ CRUD Operations":
         if table == "customers":
             st.subheader("➕ Add New Customer")
 
-            customer_id = st.text_input("Customer ID")
             name = st.text_input("Name")
             gender = st.selectbox("Gender", ["Male", "Female", "Other"])
             age = st.number_input("Age", min_value=18, max_value=100)
@@ -799,13 +1001,14 @@ elif menu == "✏️ CRUD Operations":
             join_date = st.date_input("Join Date")
 
             if st.button("Add Customer"):
+                    customer_id = id_allocator.next_id("customers")
                     query = """
                     INSERT INTO customers
                     (customer_id, name, gender, age, city, account_type, join_date)
                     VALUES (%s, %s, %s, %s, %s, %s, %s)
                     """
 
-                    cursor.execute(query, (
+                    db.execute(query, (
                         customer_id,
                         name,
                         gender,
@@ -815,8 +1018,10 @@ elif menu == "✏️ CRUD Operations":
                         join_date
                     ))
 
-                    conn.commit()
-                    st.success("✅ Customer added successfully!")
+                    after_write("customers", new={
+                        "customer_id": customer_id, "name": name, "gender": gender, "age": age,
+                        "city": city, "account_type": account_type, "join_date": join_date})
+                    st.success(f"✅ Customer {customer_id} added successfully!")
 
 
                 # accounts table (Add)
@@ -834,13 +1039,15 @@ elif menu == "✏️ CRUD Operations":
                     VALUES (%s, %s, %s)
                     """
 
-                    cursor.execute(query, (
+                    db.execute(query, (
                         customer_id,
                         account_balance,
                         last_updated
             ))
 
-                    conn.commit()
+                    after_write("accounts", new={
+                        "customer_id": customer_id, "account_balance": account_balance,
+                        "last_updated": last_updated})
                     st.success("✅ Account added successfully!")
 
                 # Loans (Add)
@@ -848,18 +1055,16 @@ elif menu == "✏️ CRUD Operations":
         elif table == "loans":
             st.subheader("➕ Add New Loan")
 
+            customer_ids = form_options("Customer ID", "loans", "Customer_ID", key="loan_customer")
             with st.form("loan_form"):
 
                 loan_id = st.text_input("Loan ID")
 
-                cursor.execute("SELECT customer_id FROM loans")
-                customer_ids = [row[0] for row in cursor.fetchall()]
                 customer_id = st.selectbox("Select Customer ID", customer_ids)
 
                 account_id=st.text_input("Account ID")
 
-                cursor.execute("SELECT DISTINCT Branch FROM loans")
-                branches = [row[0] for row in cursor.fetchall()]
+                branches = distinct_values("loans", "Branch")
                 branch = st.selectbox("Branch", branches)
 
                 loan_type = st.selectbox("Loan Type", ["Home", "Personal", "Auto", "Education", "Business"])
@@ -871,15 +1076,11 @@ elif menu == "✏️ CRUD Operations":
                 loan_status = st.selectbox("Loan Status", ["Active", "Closed", "Defaulted"])
                 submit_btn = st.form_submit_button("Add Loan")
 
-            if submit_btn:
-                cursor.execute("SELECT loan_id FROM loans ORDER BY loan_id DESC LIMIT 1")
-                last = cursor.fetchone()
-
-                if last:
-                    loan_id = last[0] + 1
-                else:
-                    loan_id = 1
-                cursor.execute("""INSERT INTO loans
+            if submit_btn and customer_id is None:
+                st.error("Select a customer ID.")
+            elif submit_btn:
+                loan_id = id_allocator.next_id("loans")
+                db.execute("""INSERT INTO loans
                     (Loan_ID, Customer_ID, Account_ID, Branch, Loan_Type,
                     Loan_Amount, Interest_Rate, Loan_Term_Months,
                     Start_Date, End_Date, Loan_Status)
@@ -887,17 +1088,20 @@ elif menu == "✏️ CRUD Operations":
                     (loan_id, customer_id, account_id, branch, loan_type,loan_amount, interest_rate, loan_term,
                     start_date, end_date, loan_status))
 
-                conn.commit()
+                after_write("loans", new={
+                    "Loan_ID": loan_id, "Customer_ID": customer_id, "Account_ID": account_id,
+                    "Branch": branch, "Loan_Type": loan_type, "Loan_Amount": loan_amount,
+                    "Interest_Rate": interest_rate, "Loan_Term_Months": loan_term,
+                    "Start_Date": start_date, "End_Date": end_date, "Loan_Status": loan_status})
                 st.success("✅ Loan added successfully!")
 
                 #transactions (add)
         elif table == "transactions":
             st.subheader("➕ Add Transaction")
 
+            customer_ids = form_options("Customer ID", "customers", "customer_id", key="txn_customer")
             with st.form("add_transaction"):
 
-                cursor.execute("SELECT customer_id FROM customers")
-                customer_ids = [row[0] for row in cursor.fetchall()]
                 customer_id = st.selectbox("Select Customer ID", customer_ids)
 
                 txn_type = st.selectbox("Transaction Type", ["deposit", "withdrawal", "transfer"])
@@ -907,29 +1111,51 @@ elif menu == "✏️ CRUD Operations":
 
                 submit_btn = st.form_submit_button("Add Transaction")
 
-                if submit_btn:
+                if submit_btn and customer_id is None:
+                    st.error("Select a customer ID.")
+                elif submit_btn:
         #  AUTO GENERATE TRANSACTION ID
-                    cursor.execute("SELECT txn_id FROM transactions ORDER BY CAST(SUBSTRING(txn_id,2) AS UNSIGNED) DESC LIMIT 1")
-                    last_txn = cursor.fetchone()
-
-                    if last_txn:
-                        last_number = int(last_txn[0][1:])   # Remove 'T' and get number
-                        new_number = last_number + 1
-                        txn_id = f"T{new_number:05d}"       # Format like T00001
-                    else:
-                        txn_id = "T00001"   # First transaction
+                    txn_id = id_allocator.next_id("transactions")
 
         # Insert into database
-                    cursor.execute( """
+                    db.execute( """
                         INSERT INTO transactions 
                         (txn_id, customer_id, txn_type, amount, txn_time, status)
                         VALUES (%s, %s, %s, %s, %s, %s)""",
                         (txn_id, customer_id, txn_type, amount, txn_time, status)
         )
 
-                    conn.commit()
+                    after_write("transactions", new={
+                        "txn_id": txn_id, "customer_id": customer_id, "txn_type": txn_type,
+                        "amount": amount, "txn_time": txn_time, "status": status})
                     st.success(f"✅ Transaction Added Successfully with ID: {txn_id}")
 
+            st.subheader("📤 Bulk upload")
+            upload = st.file_uploader(
+                "CSV with customer_id, txn_type, amount and optional txn_time, status",
+                type=["csv"], key="txn_upload")
+            if upload is not None:
+                uploaded = pd.read_csv(upload, dtype=str)
+                st.caption(f"{len(uploaded):,} rows in {upload.name}")
+                if st.button(f"Post {len(uploaded):,} transactions"):
+                    try:
+                        result = batch_poster.post(uploaded)
+                    except ValueError as e:
+                        st.error(str(e))
+                    else:
+                        posted = result["posted"]
+                        if len(posted):
+                            after_write("transactions", rows=posted.to_dict("records"))
+                            st.success(f"✅ Posted {len(posted):,} transactions "
+                                       f"({result['first_txn_id']} – {result['last_txn_id']}) "
+                                       f"in {result['seconds']:.2f}s")
+                        rejected = result["rejected"]
+                        if len(rejected):
+                            st.warning(f"{len(rejected):,} rows rejected")
+                            st.dataframe(rejected, use_container_width=True)
+                            st.download_button("⬇️ Download rejected rows",
+                                               rejected.to_csv(index=False), "rejected_transactions.csv")
+
         elif table == "branches":
 
             st.subheader("➕ Add Branch")
@@ -948,25 +1174,10 @@ elif menu == "✏️ CRUD Operations":
 
             if submit_btn:
             # Generate New Branch ID
-                cursor.execute("""SELECT MAX(CAST(Branch_ID AS UNSIGNED))FROM branches""")
-                result = cursor.fetchone()
-
-                if result[0] is not None:
-                    new_id = result[0] + 1
-                else:
-                    new_id = 1
-                while True:
-                    cursor.execute("SELECT 1 FROM branches WHERE Branch_ID = %s", (new_id,))
-                    exists = cursor.fetchone()
-
-                    if exists:
-                        new_id += 1
-                    else:
-                        break
-                new_branch_id = new_id
+                new_branch_id = id_allocator.next_id("branches")
 
         # 🔹 Insert into Database
-                cursor.execute("""
+                db.execute("""
                     INSERT INTO branches
                     (Branch_ID, Branch_Name, City, Manager_Name,
                     Total_Employees, Branch_Revenue,
@@ -978,19 +1189,21 @@ elif menu == "✏️ CRUD Operations":
             )
         )
 
-                conn.commit()
+                after_write("branches", new={
+                    "Branch_ID": str(new_branch_id), "Branch_Name": Branch_Name, "City": City,
+                    "Manager_Name": Manager_Name, "Total_Employees": Total_Employees,
+                    "Branch_Revenue": Branch_Revenue, "Opening_Date": Opening_Date,
+                    "Performance_Rating": Performance_Rating})
                 st.success(f"✅ Branch Added Successfully with ID: {new_branch_id}")
 
         elif table == "support_tickets":
             st.subheader("➕ Add Support Ticket")
+            customer_ids = form_options("Customer ID", "customers", "customer_id", key="ticket_customer")
             with st.form("add_support_ticket"):
-                    cursor.execute("SELECT customer_id FROM customers")
-                    customer_ids = [row[0] for row in cursor.fetchall()]
                     customer_id = st.selectbox("Select Customer ID", customer_ids)
 
                     def get_values(col):
-                        cursor.execute(f"SELECT DISTINCT {col} FROM support_tickets")
-                        data = [row[0] for row in cursor.fetchall()]
+                        data = distinct_values("support_tickets", col)
                         return data if data else ["General"]
                     account_id = st.text_input("Account_id")
                     loan_ID = st.text_input("Loan_ID")
@@ -1008,19 +1221,14 @@ elif menu == "✏️ CRUD Operations":
 
                     submit_btn = st.form_submit_button("Add Support Ticket")
 
-            if submit_btn:
-                    cursor.execute("SELECT Ticket_ID FROM support_tickets ORDER BY Ticket_ID DESC LIMIT 1")
-                    last = cursor.fetchone()
-                    if last:
-                        new_number = int(last[0][1:]) + 1
-                    else:
-                        new_number = 1
-
-                    ticket_id = f"T{new_number:05d}"
+            if submit_btn and customer_id is None:
+                    st.error("Select a customer ID.")
+            elif submit_btn:
+                    ticket_id = id_allocator.next_id("support_tickets")
                     st.write(f"Ticket ID: {ticket_id}")
                 
 
-                    cursor.execute("""
+                    db.execute("""
                         INSERT INTO support_tickets(Ticket_ID, Customer_ID, Account_id, Loan_ID, Branch_Name,
                         Issue_Category, Description, Priority, Status,Resolution_Remarks, Support_Agent, Channel,
                         Date_Opened, Date_Closed, Customer_Rating)
@@ -1028,19 +1236,23 @@ elif menu == "✏️ CRUD Operations":
                         (ticket_id,customer_id,account_id,loan_ID,branch_name,issue_category,description,priority,status,
                         resolution_remarks,support_agent,channel,date_opened,date_closed,customer_rating))
 
-                    conn.commit()
+                    after_write("support_tickets", new={
+                        "Ticket_ID": ticket_id, "Customer_ID": customer_id, "Account_ID": account_id,
+                        "Loan_ID": loan_ID, "Branch_Name": branch_name, "Issue_Category": issue_category,
+                        "Description": description, "Priority": priority, "Status": status,
+                        "Resolution_Remarks": resolution_remarks, "Support_Agent": support_agent,
+                        "Channel": channel, "Date_Opened": date_opened, "Date_Closed": date_closed,
+                        "Customer_Rating": customer_rating})
                     st.success(f"✅ Ticket Added Successfully: {ticket_id}")
 
         elif table == "credit_cards":
             st.subheader("➕ Add Credit Card")
 
+            customer_ids = form_options("Customer ID", "credit_cards", "Customer_ID", key="card_customer")
             with st.form("add_card"):
-                cursor.execute("SELECT DISTINCT Customer_ID FROM credit_cards")
-                customer_ids = [row[0] for row in cursor.fetchall()]
                 customer_id = st.selectbox("Customer ID", customer_ids)
 
-                cursor.execute("SELECT DISTINCT Branch FROM credit_cards")
-                branches = [row[0] for row in cursor.fetchall()]
+                branches = distinct_values("credit_cards", "Branch")
                 branch = st.selectbox("Branch", branches)
 
                 account_id = st.text_input("Account Id")
@@ -1055,12 +1267,12 @@ elif menu == "✏️ CRUD Operations":
 
                 submit = st.form_submit_button("Add Card")
 
-                if submit:
-                    cursor.execute("SELECT MAX(Card_ID) FROM credit_cards")
-                    last = cursor.fetchone()
-                    card_id = last[0] + 1 if last[0] else 1
+                if submit and customer_id is None:
+                    st.error("Select a customer ID.")
+                elif submit:
+                    card_id = id_allocator.next_id("credit_cards")
 
-                    cursor.execute("""INSERT INTO credit_cards
+                    db.execute("""INSERT INTO credit_cards
                         (Card_ID, Account_ID,Customer_ID, Branch, Card_Number,
                         Card_Type, Card_Network, Credit_Limit, Current_Balance,
                         Issued_Date, Expiry_Date, Status)
@@ -1069,7 +1281,12 @@ elif menu == "✏️ CRUD Operations":
                         card_type, card_network, credit_limit, current_balance,
                         issued_date, expiry_date, status))
 
-                    conn.commit()
+                    after_write("credit_cards", new={
+                        "Card_ID": card_id, "Customer_ID": customer_id, "Account_ID": account_id,
+                        "Branch": branch, "Card_Number": card_number, "Card_Type": card_type,
+                        "Card_Network": card_network, "Credit_Limit": credit_limit,
+                        "Current_Balance": current_balance, "Issued_Date": issued_date,
+                        "Expiry_Date": expiry_date, "Status": status})
                     st.success("✅ Credit Card Added Successfully!")
 
 
@@ -1078,11 +1295,8 @@ elif menu == "✏️ CRUD Operations":
         
         if table == "customers":
             st.subheader("✏️ Update Customer Details")
-            cursor.execute("SELECT customer_id FROM customers")
-            ids = [row[0] for row in cursor.fetchall()]
-            cid = st.selectbox("Select Customer ID", ids)
-            cursor.execute("SELECT name, gender, age, city, account_type, join_date FROM customers WHERE customer_id = %s", (cid,))
-            data = cursor.fetchone()
+            cid = option_select("Select Customer ID", "customers", "customer_id")
+            data = db.fetch_one("SELECT name, gender, age, city, account_type, join_date FROM customers WHERE customer_id = %s", (cid,))
 
             if data:
                 name, gender, age, city, account_type, join_date = data
@@ -1090,8 +1304,9 @@ elif menu == "✏️ CRUD Operations":
                 new_gender = st.selectbox("Gender", ["M", "F"], index=0 if gender == "M" else 1)
                 new_age = st.number_input("Age", min_value=1, max_value=120, value=int(age))
                 
-                cursor.execute("SELECT DISTINCT city FROM customers")
-                city_list = [row[0] for row in cursor.fetchall()]
+                city_list = distinct_values("customers", "city")
+                if city not in city_list:
+                    city_list = [city] + city_list
                 new_city = st.selectbox("City", options=city_list, index=city_list.index(city))
                 
                 new_account_type = st.selectbox("Account Type", ["Savings", "Current"], index=0 if account_type == "Savings" else 1)
@@ -1103,49 +1318,46 @@ elif menu == "✏️ CRUD Operations":
                     SET name = %s,gender = %s,age = %s,city = %s,account_type = %s,join_date = %s
                     WHERE customer_id = %s  """
 
-                    cursor.execute(query, (new_name,new_gender,new_age,new_city,new_account_type,new_join_date,
+                    db.execute(query, (new_name,new_gender,new_age,new_city,new_account_type,new_join_date,
                     cid))
 
-                    conn.commit()
+                    after_write("customers",
+                        old={"customer_id": cid, "name": name, "gender": gender, "age": age, "city": city,
+                             "account_type": account_type, "join_date": join_date},
+                        new={"customer_id": cid, "name": new_name, "gender": new_gender, "age": new_age, "city": new_city,
+                             "account_type": new_account_type, "join_date": new_join_date})
                     st.success("✅ Customer updated successfully!")
         elif table == "accounts":
             st.subheader("Update Account Balance")
 
-            cursor.execute("SELECT customer_id FROM accounts")
-            ids = [i[0] for i in cursor.fetchall()]
-
-            cid = st.selectbox("Customer ID", ids)
+            cid = option_select("Customer ID", "accounts", "customer_id")
 
-            cursor.execute("SELECT account_balance FROM accounts WHERE customer_id=%s", (cid,))
-            balance = cursor.fetchone()[0]
+            balance = db.fetch_one("SELECT account_balance FROM accounts WHERE customer_id=%s", (cid,))[0]
 
             new_balance = st.number_input("New Balance", value=float(balance), step=100.0)
 
             if st.button("Update"):
-                cursor.execute(
+                db.execute(
                 "UPDATE accounts SET account_balance=%s, last_updated=NOW() WHERE customer_id=%s",
                 (new_balance, cid))
-                conn.commit()
+                after_write("accounts",
+                    old={"customer_id": cid, "account_balance": balance},
+                    new={"customer_id": cid, "account_balance": new_balance})
                 st.success("✅ Balance Updated")
 
         elif table == "loans":
             st.subheader("Update Loan info")
-            cursor.execute("SELECT Customer_ID FROM loans")
-            cids = [i[0] for i in cursor.fetchall()]
-            cid = st.selectbox("Customer ID", cids)
+            cid = option_select("Customer ID", "loans", "Customer_ID")
 
-            cursor.execute("SELECT Loan_ID FROM loans WHERE Customer_ID=%s", (cid,))
-            loan_ids = [i[0] for i in cursor.fetchall()]
+            loan_ids = db.fetch_column("SELECT Loan_ID FROM loans WHERE Customer_ID=%s", (cid,))
             lid = st.selectbox("Loan ID", loan_ids)
             
-            cursor.execute("SELECT Account_ID, Branch, Loan_Type, Loan_Amount, Interest_Rate, Loan_Term_Months,Start_Date, End_Date, Loan_Status FROM loans WHERE customer_id = %s", (cid,))
-            data = cursor.fetchone()
+            data = db.fetch_one("SELECT Account_ID, Branch, Loan_Type, Loan_Amount, Interest_Rate, Loan_Term_Months,Start_Date, End_Date, Loan_Status FROM loans WHERE Loan_ID = %s", (lid,))
             if data:
                 account_id, branch, loan_type, loan_amount, interest_rate, loan_term, start_date, end_date, loan_status = data
                 new_account = st.text_input("Account ID", value=account_id)
 
-                cursor.execute("SELECT DISTINCT Branch FROM loans")
-                branches = [row[0] for row in cursor.fetchall()]
+                branches = distinct_values("loans", "Branch")
                 new_branch = st.selectbox("Branch", branches)
 
                 new_loan_type = st.selectbox(
@@ -1161,24 +1373,30 @@ elif menu == "✏️ CRUD Operations":
                         ["Active", "Closed", "Defaulted"],
                         index=["Active","Closed","Defaulted"].index(loan_status))
                 if st.button("Update Loan"):
-                    cursor.execute("""UPDATE loans SET Account_ID=%s,Branch=%s,Loan_Type=%s,Loan_Amount=%s,Interest_Rate=%s,
+                    db.execute("""UPDATE loans SET Account_ID=%s,Branch=%s,Loan_Type=%s,Loan_Amount=%s,Interest_Rate=%s,
                                     Loan_Term_Months=%s,Start_Date=%s,End_Date=%s,Loan_Status=%s WHERE Loan_ID=%s """,
                                     (new_account,new_branch,new_loan_type,new_amount,new_interest,
                                      new_term,new_start_date,new_end_date,new_status,lid))   
-                    conn.commit()
+                    after_write("loans",
+                        old={"Loan_ID": lid, "Customer_ID": cid,
+                             "Account_ID": account_id, "Branch": branch, "Loan_Type": loan_type,
+                             "Loan_Amount": loan_amount, "Interest_Rate": interest_rate,
+                             "Loan_Term_Months": loan_term, "Start_Date": start_date,
+                             "End_Date": end_date, "Loan_Status": loan_status},
+                        new={"Loan_ID": lid, "Customer_ID": cid,
+                             "Account_ID": new_account, "Branch": new_branch, "Loan_Type": new_loan_type,
+                             "Loan_Amount": new_amount, "Interest_Rate": new_interest,
+                             "Loan_Term_Months": new_term, "Start_Date": new_start_date,
+                             "End_Date": new_end_date, "Loan_Status": new_status})
                     st.success("✅ Loan updated successfully!")
         elif table == "transactions":
             st.subheader("✏️ Update Transaction")
-            cursor.execute("SELECT customer_id FROM customers")
-            cids = [i[0] for i in cursor.fetchall()]
-            cid = st.selectbox("Customer ID", cids)
-            cursor.execute("SELECT txn_id FROM transactions WHERE customer_id=%s", (cid,))
-            txn_ids = [i[0] for i in cursor.fetchall()]
+            cid = option_select("Customer ID", "customers", "customer_id")
+            txn_ids = db.fetch_column("SELECT txn_id FROM transactions WHERE customer_id=%s", (cid,))
             tid = st.selectbox("Transaction ID", txn_ids)
 
-            cursor.execute("""SELECT txn_type, amount, txn_time, status FROM transactions 
+            data = db.fetch_one("""SELECT txn_type, amount, txn_time, status FROM transactions 
                         WHERE txn_id=%s""", (tid,))
-            data = cursor.fetchone()
 
             if data:
                 txn_type, amount, txn_time, status = data
@@ -1192,22 +1410,23 @@ elif menu == "✏️ CRUD Operations":
                 index=status_list.index(status) if status in status_list else 0)
 
                 if st.button("Update Transaction"):
-                    cursor.execute("""UPDATE transactions 
+                    db.execute("""UPDATE transactions 
                                 SET txn_type=%s, amount=%s, txn_time=%s, status=%s
                                 WHERE txn_id=%s""", (new_type, new_amount, new_date, new_status, tid))
 
-                    conn.commit()
+                    after_write("transactions",
+                        old={"txn_id": tid, "customer_id": cid, "txn_type": txn_type, "amount": amount,
+                             "txn_time": txn_time, "status": status},
+                        new={"txn_id": tid, "customer_id": cid, "txn_type": new_type, "amount": new_amount,
+                             "txn_time": new_date, "status": new_status})
                     st.success("✅ Transaction updated successfully!")
         
         elif table == "branches":
             st.subheader("✏️ Update branch details")
-            cursor.execute("SELECT Branch_ID FROM branches")
-            branch_ids = [i[0] for i in cursor.fetchall()]
-            bid = st.selectbox("Select Branch ID", branch_ids)
-            cursor.execute("""
+            bid = option_select("Select Branch ID", "branches", "Branch_ID")
+            data = db.fetch_one("""
                 SELECT Branch_Name, City, Manager_Name, Total_Employees,
                 Branch_Revenue, Opening_Date, Performance_Rating FROM branches WHERE Branch_ID=%s""", (bid,))
-            data = cursor.fetchone()
             if data:
                 name, city, manager, employees, revenue, opening_date, rating = data
                 new_name = st.text_input("Branch Name", value=name)
@@ -1219,30 +1438,30 @@ elif menu == "✏️ CRUD Operations":
                 new_rating = st.selectbox("Performance Rating",[1,2,3,4,5] )
                 
                 if st.button("Update Branch"):
-                    cursor.execute("""UPDATE branches SET Branch_Name=%s,City=%s,Manager_Name=%s,Total_Employees=%s,
+                    db.execute("""UPDATE branches SET Branch_Name=%s,City=%s,Manager_Name=%s,Total_Employees=%s,
                     Branch_Revenue=%s,Opening_Date=%s,Performance_Rating=%s WHERE Branch_ID=%s """, 
                     (new_name, new_city, new_manager,new_employees, new_revenue,new_opening, new_rating, bid))
                     
-                    conn.commit()
+                    after_write("branches",
+                        old={"Branch_Name": name, "City": city, "Manager_Name": manager,
+                             "Total_Employees": employees, "Branch_Revenue": revenue,
+                             "Opening_Date": opening_date, "Performance_Rating": rating},
+                        new={"Branch_Name": new_name, "City": new_city, "Manager_Name": new_manager,
+                             "Total_Employees": new_employees, "Branch_Revenue": new_revenue,
+                             "Opening_Date": new_opening, "Performance_Rating": new_rating})
                     st.success("✅ Branch details updated successfully!")
 
         elif table == "support_tickets":
             st.subheader("✏️ Update Support Ticket")
-            cursor.execute("SELECT DISTINCT Customer_ID FROM support_tickets")
-            customer_ids = [i[0] for i in cursor.fetchall()]
-            cid = st.selectbox("Select Customer ID", customer_ids)
-            cursor.execute("SELECT Ticket_ID FROM support_tickets WHERE Customer_ID=%s",(cid,))
-            ticket_ids = [i[0] for i in cursor.fetchall()]
+            cid = option_select("Select Customer ID", "support_tickets", "Customer_ID")
+            ticket_ids = db.fetch_column("SELECT Ticket_ID FROM support_tickets WHERE Customer_ID=%s",(cid,))
             tid = st.selectbox("Select Ticket ID", ticket_ids)
-            cursor.execute("""SELECT Account_ID, Loan_ID, Branch_Name, Issue_Category, Description,
+            data = db.fetch_one("""SELECT Account_ID, Loan_ID, Branch_Name, Issue_Category, Description,
                     Date_Opened, Date_Closed, Priority, Status, Resolution_Remarks,
                     Support_Agent, Channel, Customer_Rating FROM support_tickets WHERE Ticket_ID=%s """,(tid,))
             def get_values(col):
-                    cursor.execute(f"SELECT DISTINCT {col} FROM support_tickets")
-                    data = [row[0] for row in cursor.fetchall()]
+                    data = distinct_values("support_tickets", col)
                     return data if data else ["General"]
-            
-            data = cursor.fetchone()
 
             if data:
                 acc_id, loan_id, branch, issue, desc, open_date, close_date, priority, status, remarks, agent, channel, rating = data
@@ -1261,25 +1480,32 @@ elif menu == "✏️ CRUD Operations":
                 new_rating = st.selectbox("Customer Rating", [1,2,3,4,5])
 
                 if st.button("Update Ticket"):
-                    cursor.execute("""UPDATE support_tickets SET Account_ID=%s,Loan_ID=%s,Branch_Name=%s,Issue_Category=%s,
+                    db.execute("""UPDATE support_tickets SET Account_ID=%s,Loan_ID=%s,Branch_Name=%s,Issue_Category=%s,
                             Description=%s,Date_Opened=%s,Date_Closed=%s,Priority=%s,Status=%s,Resolution_Remarks=%s,
                             Support_Agent=%s,Channel=%s,Customer_Rating=%s WHERE Ticket_ID=%s """,
                             (new_acc,new_loan,new_branch,new_issue,new_desc,new_open,new_close,new_priority,new_status,new_remarks,new_agent,new_channel,new_rating,tid))
 
-                    conn.commit()
+                    after_write("support_tickets",
+                        old={"Account_ID": acc_id, "Loan_ID": loan_id, "Branch_Name": branch,
+                             "Issue_Category": issue, "Description": desc, "Date_Opened": open_date,
+                             "Date_Closed": close_date, "Priority": priority, "Status": status,
+                             "Resolution_Remarks": remarks, "Support_Agent": agent,
+                             "Channel": channel, "Customer_Rating": rating},
+                        new={"Account_ID": new_acc, "Loan_ID": new_loan, "Branch_Name": new_branch,
+                             "Issue_Category": new_issue, "Description": new_desc, "Date_Opened": new_open,
+                             "Date_Closed": new_close, "Priority": new_priority, "Status": new_status,
+                             "Resolution_Remarks": new_remarks, "Support_Agent": new_agent,
+                             "Channel": new_channel, "Customer_Rating": new_rating})
                     st.success("✅ Support ticket updated successfully!")
         
         elif table == "credit_cards":
             st.subheader("✏️ Update Credit Card Details")
 
-            cursor.execute("SELECT Card_ID FROM credit_cards")
-            card_ids = [row[0] for row in cursor.fetchall()]
-            card_id = st.selectbox("Select Credit Card ID", card_ids)
+            card_id = option_select("Select Credit Card ID", "credit_cards", "Card_ID")
 
-            cursor.execute("""SELECT Account_ID, Customer_ID, Branch, Card_Number, Card_Type, 
+            data = db.fetch_one("""SELECT Account_ID, Customer_ID, Branch, Card_Number, Card_Type, 
                       Card_Network, Credit_Limit, Current_Balance, Issued_Date, Expiry_Date, Status
                       FROM credit_cards WHERE Card_ID=%s""", (card_id,))
-            data = cursor.fetchone()
 
             if data:
                 account_id, customer_id, branch, card_number, card_type, card_network, credit_limit, current_balance, issued_date, expiry_date, status = data
@@ -1300,7 +1526,7 @@ elif menu == "✏️ CRUD Operations":
                                   index=["Active","Blocked","Expired"].index(status))
 
                 if st.button("Update Credit Card"):
-                    cursor.execute("""UPDATE credit_cards SET 
+                    db.execute("""UPDATE credit_cards SET 
                               Account_ID=%s, Customer_ID=%s, Branch=%s, Card_Number=%s, 
                               Card_Type=%s, Card_Network=%s, Credit_Limit=%s, Current_Balance=%s,
                               Issued_Date=%s, Expiry_Date=%s, Status=%s
@@ -1308,88 +1534,93 @@ elif menu == "✏️ CRUD Operations":
                            (new_account_id, new_customer_id, new_branch, new_card_number,
                             new_card_type, new_card_network, new_credit_limit, new_current_balance,
                             new_issued_date, new_expiry_date, new_status, card_id))
-                    conn.commit()
+                    after_write("credit_cards",
+                        old={"Account_ID": account_id, "Customer_ID": customer_id, "Branch": branch,
+                             "Card_Number": card_number, "Card_Type": card_type,
+                             "Card_Network": card_network, "Credit_Limit": credit_limit,
+                             "Current_Balance": current_balance, "Issued_Date": issued_date,
+                             "Expiry_Date": expiry_date, "Status": status},
+                        new={"Account_ID": new_account_id, "Customer_ID": new_customer_id,
+                             "Branch": new_branch, "Card_Number": new_card_number,
+                             "Card_Type": new_card_type, "Card_Network": new_card_network,
+                             "Credit_Limit": new_credit_limit, "Current_Balance": new_current_balance,
+                             "Issued_Date": new_issued_date, "Expiry_Date": new_expiry_date,
+                             "Status": new_status})
                     st.success("✅ Credit Card updated successfully!")
              
 
     # ---------------- DELETE ----------------
     elif operation == "Delete":
         if table == "customers":
-            st.subheader("🗑️ Delete Customer")
-            cursor.execute("SELECT customer_id FROM customers")
-            customer_ids = [i[0] for i in cursor.fetchall()]
-            cid = st.selectbox("Select Customer ID to Delete", customer_ids)
-            
-            if st.button("Delete Customer"):
-                cursor.execute("DELETE FROM transactions WHERE customer_id=%s", (cid,))
-                cursor.execute("DELETE FROM accounts WHERE customer_id=%s", (cid,))
-                cursor.execute("DELETE FROM loans WHERE customer_id=%s", (cid,))
-                cursor.execute("DELETE FROM support_tickets WHERE Customer_ID=%s", (cid,))
-
-        # Now delete the customer
-                cursor.execute("DELETE FROM customers WHERE customer_id=%s", (cid,))
-
-                conn.commit()
-                st.success(f"✅ Customer {cid} deleted successfully!")
+            st.subheader("🗑️ Delete Customers")
+            cids = option_multiselect("Select Customer IDs to Delete", "customers", "customer_id",
+                                      key="delete_customer_ids")
+
+            if cids:
+                st.caption("Rows that will be deleted, in one transaction:")
+                st.dataframe(pd.DataFrame([customer_deleter.preview(cids)]), hide_index=True)
+
+            if st.button("Delete Customer", disabled=not cids):
+                report = customer_deleter.delete(cids, capture=SUMMARY_ROW_LIMIT)
+                after_write("transactions", "credit_cards", "support_tickets", "loans", "accounts", "customers",
+                            deleted=report["rows"])
+                st.success(f"✅ Deleted {len(report['customers'])} customer(s) in {report['seconds']:.2f}s")
+                st.dataframe(pd.DataFrame.from_dict(report["tables"], orient="index"))
+                if report["missing"]:
+                    st.warning(f"Not found: {', '.join(report['missing'])}")
 
         if table == "accounts":
             st.subheader("🗑️Delete Account details")
-            cursor.execute("SELECT customer_id FROM accounts")
-            customer_ids = [i[0] for i in cursor.fetchall()]
-            cid = st.selectbox("Select Customer ID to Delete", customer_ids)
+            cid = option_select("Select Customer ID to Delete", "accounts", "customer_id")
             if st.button("Delete Account details"):
-                cursor.execute("DELETE FROM accounts WHERE customer_id=%s", (cid,))
-                conn.commit()
+                old_row = fetch_row("accounts", cid)
+                db.execute("DELETE FROM accounts WHERE customer_id=%s", (cid,))
+                after_write("accounts", old=old_row)
                 st.success(f"✅ Customer {cid} deleted successfully!")
 
         if table=="loans":
              st.subheader("🗑️ Delete Loan details")
-             cursor.execute("SELECT Loan_ID FROM Loans")
-             loan_ids = [i[0] for i in cursor.fetchall()]
-             lid = st.selectbox("Select Loan ID to Delete", loan_ids)
+             lid = option_select("Select Loan ID to Delete", "loans", "Loan_ID")
              if st.button("Delete Loan details"):
-                cursor.execute("DELETE FROM loans WHERE Loan_ID=%s", (lid,))
-                conn.commit()
+                old_row = fetch_row("loans", lid)
+                db.execute("DELETE FROM loans WHERE Loan_ID=%s", (lid,))
+                after_write("loans", old=old_row)
                 st.success(f"✅ Loan ID {lid} deleted successfully!")
 
         if table == "transactions":
              st.subheader("🗑️ Delete transaction details")
-             cursor.execute("SELECT txn_id FROM transactions")
-             txn_ids = [i[0] for i in cursor.fetchall()]
-             tid = st.selectbox("Select transaction id to Delete",txn_ids)
+             tid = option_select("Select transaction id to Delete", "transactions", "txn_id")
              if st.button("Delete transaction details"):
-                cursor.execute("DELETE FROM transactions WHERE txn_id =%s", (tid,))
-                conn.commit()
+                old_row = fetch_row("transactions", tid)
+                db.execute("DELETE FROM transactions WHERE txn_id =%s", (tid,))
+                after_write("transactions", old=old_row)
                 st.success(f"✅ Transaction id {tid} deleted successfully!")
 
         if table == "branches":
              st.subheader("🗑️ Delete Branch details")
-             cursor.execute("SELECT Branch_ID FROM branches")
-             branch_ids = [i[0] for i in cursor.fetchall()]
-             bid = st.selectbox("Select Branch Id to Delete",branch_ids)
+             bid = option_select("Select Branch Id to Delete", "branches", "Branch_ID")
              if st.button("Delete Branch details"):
-                cursor.execute("DELETE FROM branches WHERE Branch_ID =%s", (bid))
-                conn.commit()
+                old_row = fetch_row("branches", bid)
+                db.execute("DELETE FROM branches WHERE Branch_ID =%s", (bid))
+                after_write("branches", old=old_row)
                 st.success(f"✅ Branch details deleted successfully from branch id {bid}")
 
         if table == "support_tickets":
              st.subheader("🗑️ Delete Ticket details")
-             cursor.execute("SELECT Ticket_ID FROM support_tickets")
-             ticket_ids = [i[0] for i in cursor.fetchall()]
-             tid = st.selectbox("Select Ticket Id to Delete",ticket_ids)
+             tid = option_select("Select Ticket Id to Delete", "support_tickets", "Ticket_ID")
              if st.button("Delete Ticket details"):
-                cursor.execute("DELETE FROM support_tickets WHERE Ticket_ID =%s", (tid))
-                conn.commit()
+                old_row = fetch_row("support_tickets", tid)
+                db.execute("DELETE FROM support_tickets WHERE Ticket_ID =%s", (tid))
+                after_write("support_tickets", old=old_row)
                 st.success(f"✅ Ticket details deleted successfully from ticket id {tid}")
         
         if table == "credit_cards":
              st.subheader("🗑️ Delete Credit Card details")
-             cursor.execute("SELECT Card_ID FROM credit_cards")
-             card_ids = [i[0] for i in cursor.fetchall()]
-             cid = st.selectbox("Select Card ID to Delete",card_ids)
+             cid = option_select("Select Card ID to Delete", "credit_cards", "Card_ID")
              if st.button("Delete Card details"):
-                cursor.execute("DELETE FROM credit_cards WHERE Card_ID =%s", (cid))
-                conn.commit()
+                old_row = fetch_row("credit_cards", cid)
+                db.execute("DELETE FROM credit_cards WHERE Card_ID =%s", (cid))
+                after_write("credit_cards", old=old_row)
                 st.success(f"✅ Credit Card details deleted successfully!")
 
 
@@ -1398,56 +1629,51 @@ elif "Credit / Debit" in menu:
 
     st.header("💳 Credit / Debit Simulation")
 
-    cursor.execute("SELECT DISTINCT Customer_ID FROM credit_cards")
-    customer_list = [row[0] for row in cursor.fetchall()]
+    cust_id = option_select("Enter Customer ID", "credit_cards", "Customer_ID")
 
-    cust_id = st.selectbox("Enter Customer ID", customer_list)
+    cards = ledger.cards(cust_id)
+    if cards.empty:
+        st.error("Customer not found in DB")
+        st.stop()
+    card_labels = {
+        row.Card_ID: f"Card {row.Card_ID} · {row.Card_Type} {row.Card_Network} · "
+                     f"•••• {str(row.Card_Number)[-4:]} · {row.Status}"
+        for row in cards.itertuples()
+    }
+    card_id = st.selectbox("Card", list(card_labels), format_func=card_labels.get)
 
     amt = st.number_input("Enter Amount (₹)", min_value=0.0)
     action = st.radio("Action", ["Check Balance", "Deposit", "Withdraw"])
 
+    # One key per intended posting: a retry after an error replays it
+    # instead of posting twice; it is replaced once the posting succeeds.
+    posting_key = st.session_state.setdefault("ledger_key", new_ledger_key())
+
     if st.button("Submit"):
 
-        cursor.execute("""
-            SELECT Current_Balance 
-            FROM credit_cards 
-            WHERE Customer_ID=%s
-        """, (cust_id,))
+        if action == "Check Balance":
+            st.info(f"💰 Current Balance: ₹{float(ledger.balance(card_id)):.2f}")
 
-        result = cursor.fetchone()
+        elif amt <= 0:
+            st.error("Enter an amount above zero")
 
-        if not result:
-            st.error("Customer not found in DB")
         else:
-            bal = float(result[0])
-
-            if action == "Check Balance":
-                st.info(f"💰 Current Balance: ₹{bal:.2f}")
-
-            elif action == "Deposit":
-                new_balance = bal + amt
-                cursor.execute("""
-                    UPDATE credit_cards 
-                    SET Current_Balance=%s 
-                    WHERE Customer_ID=%s
-                """, (new_balance, cust_id))
-                conn.commit()
-
-                st.success(f"Deposited ₹{amt:.2f}. New Balance ₹{new_balance:.2f}")
+            entry = ledger.post(card_id, action, amt, posting_key)
+            st.session_state["ledger_key"] = new_ledger_key()
+            balance = float(entry["balance_after"])
 
-            elif action == "Withdraw":
-                if amt > bal:
-                    st.error("❌ Insufficient Balance")
-                else:
-                    new_balance = bal - amt
-                    cursor.execute("""
-                        UPDATE credit_cards 
-                        SET Current_Balance=%s 
-                        WHERE Customer_ID=%s
-                    """, (new_balance, cust_id))
-                    conn.commit()
+            if entry["status"] == "rejected":
+                st.error(f"❌ Insufficient Balance (₹{float(entry['balance_before']):.2f})")
+            else:
+                if not entry["replayed"]:
+                    after_write("credit_cards",
+                                old={"Card_ID": card_id, "Current_Balance": entry["balance_before"]},
+                                new={"Card_ID": card_id, "Current_Balance": entry["balance_after"]})
+                verb = "Deposited" if action == "Deposit" else "Withdrawn"
+                st.success(f"{verb} ₹{float(entry['amount']):.2f}. New Balance ₹{balance:.2f}")
 
-                    st.success(f"Withdrawn ₹{amt:.2f}. New Balance ₹{new_balance:.2f}")
+    st.subheader("Recent ledger entries")
+    st.dataframe(ledger.history(card_id), use_container_width=True)
 
 
 # ---------------- ANALYTICS ----------------
@@ -1456,211 +1682,200 @@ elif menu == "📈Analytical Insights":
     st.header("📈Analytical Insights")
     questions = st.selectbox(
         "Select an Analytical Questions",
-        [
-            "Q1:How many customers exist per city, and what is their average account balance?",
-            "Q2:Which account type (Savings, Current, Loan, etc.) holds the highest total balance?",
-            "Q3:Who are the top 10 customers by total account balance across all account types?",
-            "Q4:Which customers opened accounts in 2023 with a balance above ₹1,00,000?",
-            "Q5:What is the total transaction volume (sum of amounts) by transaction type?",
-            "Q6:How many failed transactions occurred for each transaction type?",
-            "Q7:What is the total number of transactions per transaction type?",
-            "Q8:Which accounts have 5 or more high-value transactions above ₹20,000?",
-            "Q9:What is the average loan amount and interest rate by loan type (Personal, Auto, Home, etc.)?",
-            "Q10:Which customers currently hold more than one active or approved loan?",
-            "Q11:Who are the top 5 customers with the highest outstanding (non-closed) loan amounts?",
-            "Q12:What is the average loan amount per branch?",
-            "Q13:How many customers exist in each age group (e.g., 18–25, 26–35, etc.)?",
-            "Q14:Which issue categories have the longest average resolution time?",
-            "Q15:Which support agents have resolved the most critical tickets with high customer ratings (≥4)?"
-        ]
+        [insight.question for insight in INSIGHTS]
 )
-   
-    if questions =="Q1:How many customers exist per city, and what is their average account balance?":
-             
-            query= """
-            SELECT 
-                c.city,
-                COUNT(DISTINCT c.customer_id) AS total_customers,
-                AVG(a.account_balance) AS average_balance
-            FROM customers c
-            LEFT JOIN accounts a
-                ON c.customer_id = a.customer_id
-            GROUP BY c.city;
-        """
-
-
-    elif questions == "Q2:Which account type (Savings, Current, Loan, etc.) holds the highest total balance?":
-            query = """
-           SELECT 
-                c.account_type,
-                SUM(a.account_balance) AS total_balance
-            FROM customers c
-            JOIN accounts a ON c.customer_id = a.customer_id
-            GROUP BY c.account_type
-            ORDER BY total_balance DESC
-            LIMIT 5;
-
-        """
-    elif questions == "Q3:Who are the top 10 customers by total account balance across all account types?":
-            query = """
-            SELECT 
-                c.customer_id,
-                c.name,
-                SUM(a.account_balance) AS total_balance
-            FROM customers c
-            JOIN accounts a
-                ON c.customer_id = a.customer_id
-            GROUP BY c.customer_id, c.name
-            ORDER BY total_balance DESC
-            LIMIT 10;
-            """
-    elif questions == "Q4:Which customers opened accounts in 2023 with a balance above ₹1,00,000?":
-        
-            query = """
-            SELECT 
-                c.customer_id,
-                c.name,
-                c.join_date,
-                a.account_balance
-            FROM accounts a
-            JOIN customers c
-                ON a.customer_id = c.customer_id
-            WHERE YEAR(c.join_date) = 2023
-                AND a.account_balance > 100000;
-        """
-    elif questions == "Q5:What is the total transaction volume (sum of amounts) by transaction type?":
-            query = """
-            SELECT 
-                txn_type,
-                SUM(amount) AS total_volume
-            FROM transactions
-            GROUP BY txn_type;
-        """
-    elif questions == "Q6:How many failed transactions occurred for each transaction type?":
-            query = """ 
-            SELECT 
-                txn_type,
-                COUNT(*) AS failed_count
-            FROM transactions
-            WHERE status = 'Failed'
-            GROUP BY txn_type;
-        """
-    elif questions == "Q7:What is the total number of transactions per transaction type?":
-            query="""
-            SELECT 
-                txn_type,
-                COUNT(*) AS total_transactions
-            FROM transactions
-            GROUP BY txn_type;
-
-        """
-    elif questions == "Q8:Which accounts have 5 or more high-value transactions above ₹20,000?":
-            query = """  
-            SELECT 
-                customer_id,
-                COUNT(*) AS high_value_txn
-            FROM transactions
-            WHERE amount > 20000
-            GROUP BY customer_id
-            HAVING COUNT(*) >= 5;
-            """
-    elif questions == "Q9:What is the average loan amount and interest rate by loan type (Personal, Auto, Home, etc.)?":
-            query="""
-            SELECT 
-                Loan_Type,
-                AVG(Loan_Amount) AS avg_Loan_Amount,
-                AVG(Interest_Rate) AS avg_Interest_Rate
-            FROM loans
-            GROUP BY Loan_Type;
-            """
-    elif questions == "Q10:Which customers currently hold more than one active or approved loan?":
-            query="""
-            SELECT 
-                Customer_ID,
-                COUNT(*) AS total_loans
-            FROM loans
-            WHERE Loan_Status IN ('Active', 'Approved')
-            GROUP BY Customer_ID
-            HAVING COUNT(*) > 1;
-        """
-    elif questions == "Q11:Who are the top 5 customers with the highest outstanding (non-closed) loan amounts?":
-            query = """
-            SELECT 
-                l.customer_id,
-                c.name,
-                SUM(l.Loan_Amount) AS total_outstanding_loan
-            FROM loans l
-            JOIN customers c
-                ON c.customer_id = l.Customer_ID
-            WHERE l.Loan_Status <> 'Closed'
-            GROUP BY l.Customer_ID, c.name
-            ORDER BY total_outstanding_loan DESC
-            LIMIT 5;
-        """
-    elif questions =="Q12:What is the average loan amount per branch?":
-            query = """
-            SELECT
-                branch,
-                AVG(loan_amount) AS avg_loan_amount
-            FROM loans
-            GROUP BY branch
-            ORDER BY avg_loan_amount DESC;
-        
-        """
-    elif questions == "Q13:How many customers exist in each age group (e.g., 18–25, 26–35, etc.)?":
-            query = """
-            SELECT
-                CASE
-                    WHEN age BETWEEN 18 AND 25 THEN '18–25'
-                    WHEN age BETWEEN 26 AND 35 THEN '26–35'
-                    WHEN age BETWEEN 36 AND 45 THEN '36–45'
-                    WHEN age BETWEEN 46 AND 55 THEN '46–55'
-                    WHEN age >= 56 THEN '56+'
-                    ELSE 'Unknown'
-                END AS age_group,
-                COUNT(*) AS total_customers
-            FROM customers
-            GROUP BY age_group
-            ORDER BY age_group;
-        """
-    elif questions == "Q14:Which issue categories have the longest average resolution time?":
-            query="""
-            SELECT
-                issue_category,
-                AVG(DATEDIFF(date_closed, date_opened)) AS avg_resolution_days
-            FROM support_tickets
-            WHERE date_closed IS NOT NULL
-                AND date_opened IS NOT NULL
-            GROUP BY issue_category
-            ORDER BY avg_resolution_days DESC;
-         """
-    elif questions == "Q15:Which support agents have resolved the most critical tickets with high customer ratings (≥4)?":
-            query = """
-            SELECT
-                support_agent,
-                COUNT(*) AS resolved_critical_tickets
-            FROM support_tickets
-            WHERE priority = 'Critical'
-                AND customer_rating >= 4
-                AND status IN ('Resolved', 'Closed')
-            GROUP BY support_agent
-            ORDER BY resolved_critical_tickets DESC;
-        """
-  
-    
-    if st.button("▶ Run"):
-        try:
-
-            df = pd.read_sql(query, conn)
+    insight = INSIGHTS_BY_QUESTION[questions]
+
+    binding = {}
+    if insight.params:
+        with st.expander("⚙️ Parameters", expanded=True):
+            binding = parameter_inputs(insight)
+
+    if snapshot:
+        result_source = "Snapshot"
+        run = st.button("▶ Run")
+    else:
+        sources = ["Materialized", "Live"] + (["DuckDB"] if columnar is not None else [])
+        # Keyed per question, so each question keeps its own engine choice.
+        result_source = st.radio(
+            "Result source", sources, horizontal=True, key=f"insight_source_{insight.name}",
+            index=sources.index("DuckDB") if "DuckDB" in sources and insight.name in DUCKDB_QUERIES else 0,
+            help="Materialized reads the stored summary (refreshed from logged changes first); "
+                 "Live recomputes the query from the raw tables in MySQL; "
+                 "DuckDB runs it on the in-process columnar mirror.")
+
+        run_col, rebuild_col = st.columns([1, 5])
+        run = run_col.button("▶ Run")
+        if rebuild_col.button("⟳ Rebuild summary",
+                              help="Recompute the stored summary from scratch, e.g. after writes made outside the dashboard."):
+            with st.spinner("Rebuilding summary..."):
+                summaries.refresh(insight.name, full=True)
+            run = True
+
+    if run and binding is None:
+        st.error("Fix the parameters above to run this question.")
+    elif run:
+        previous = st.session_state.get("insight_job")
+        if previous and jobs.get(previous["id"]) is not None:
+            jobs.cancel(jobs.get(previous["id"]))
+        changed = insight.describe(binding)
+        job = jobs.submit((result_source, snapshot.name if snapshot else None, insight.name, insight.key(binding)),
+                          insight_runner(insight, result_source, binding),
+                          label=f"{insight.name.upper()} ({result_source})" + (f" · {changed}" if changed else ""))
+        st.session_state["insight_job"] = {"id": job.id, "insight": insight.name}
+
+    current = st.session_state.get("insight_job")
+    job = jobs.get(current["id"]) if current and current["insight"] == insight.name else None
+    if job is not None and not job.done:
+        poll_insight_job(job.id)
+    elif job is not None and job.status == DONE:
+        df, freshness = job.result
+        if df.empty:
+            st.warning("No data returned for this query.")
+        else:
+            st.success(f"Query executed successfully ✅ ({job.elapsed:.2f}s)")
+            st.dataframe(df, use_container_width=True)
+        st.caption(freshness)
+    elif job is not None and job.status == FAILED:
+        st.error("Error executing query")
+        st.exception(job.error)
+    elif job is not None and job.status == TIMED_OUT:
+        st.error(f"Stopped after {job.timeout:.0f}s; the time limit is BANKSIGHT_JOB_TIMEOUT.")
+    elif job is not None and job.status == CANCELLED:
+        st.warning("Query cancelled.")
+
+    # ---------------- FULL REPORT ----------------
+    st.divider()
+    st.subheader("📑 Full report")
+    st.caption("Each question runs with the parameters last set for it above.")
+    report_cols = st.columns([2, 2, 1])
+    if snapshot:
+        report_source = "Snapshot"
+        report_cols[0].caption(f"Questions run on snapshot {snapshot.name}.")
+    else:
+        report_source = report_cols[0].selectbox("Report source", sources, key="report_source")
+    parallelism = report_cols[1].slider("Queries at a time", 1, jobs.workers,
+                                        min(REPORT_PARALLELISM, jobs.workers), key="report_parallelism")
+    if report_cols[2].button("▶ Run all"):
+        previous = st.session_state.get("insight_report")
+        if previous is not None and not previous.done:
+            previous.cancel()
+        bindings = st.session_state.get("insight_params", {})
+        st.session_state["insight_report"] = InsightReport(jobs, [
+            (q, (report_source, snapshot.name if snapshot else None, q.name, q.key(bindings.get(q.name))),
+             insight_runner(q, report_source, bindings.get(q.name)), f"{q.name.upper()} ({report_source})",
+             bindings.get(q.name))
+            for q in INSIGHTS
+        ], parallelism).start()
+
+    report = st.session_state.get("insight_report")
+    if report is not None:
+        show_report(report)
+        if report.done:
+            download_cols = st.columns(2)
+            download_cols[0].download_button(
+                "⬇️ Parquet bundle (.zip)", report.to_parquet_bundle, "banksight_report.zip",
+                mime="application/zip")
+            if EXCEL_ENGINE:
+                download_cols[1].download_button(
+                    "⬇️ Excel workbook", report.to_excel, "banksight_report.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            else:
+                download_cols[1].caption("Install openpyxl or xlsxwriter for an Excel export.")
+
+# ---------------- TRENDS ----------------
+elif menu == "📉Transaction Trends":
+    st.header("📉Transaction Trends")
+    st.caption("Answered from the hourly / daily / monthly transaction rollups, kept current from "
+               "the writes made here, bulk uploads and the loaders.")
+    first, last = rollups.bounds()
+    if first is None:
+        st.info("No transactions with a txn_time yet.")
+    else:
+        cols = st.columns(3)
+        period = cols[0].date_input("Period", value=(max(first, last - datetime.timedelta(days=30)), last),
+                                    min_value=first, max_value=last)
+        grain = cols[1].selectbox("Granularity", ["Auto", *ROLLUP_GRAINS],
+                                  help="Auto: hourly up to 3 days, daily up to 6 months, monthly beyond.")
+        breakdown = cols[2].selectbox("Break down by", ["txn_type", "status", "none"])
+        cols = st.columns(3)
+        measure = cols[0].radio("Measure", ["Transactions", "Amount (₹)"], horizontal=True)
+        customer_id = cols[1].text_input("Customer ID", help="Leave empty for all customers.").strip()
+        statuses = cols[2].multiselect("Status", distinct_values("transactions", "status"))
+
+        if len(period) == 2:
+            start, end = period
+            started = time.perf_counter()
+            df, grain, state = rollups.trend(
+                start, end + datetime.timedelta(days=1), grain=None if grain == "Auto" else grain,
+                by=None if breakdown == "none" else breakdown, customer_id=customer_id or None,
+                statuses=statuses)
+            elapsed_ms = (time.perf_counter() - started) * 1000
             if df.empty:
-                st.warning("No data returned for this query.")
+                st.warning("No transactions in this period.")
             else:
-                st.success("Query executed successfully ✅")
-                st.dataframe(df, use_container_width=True)
+                value = "txn_count" if measure == "Transactions" else "total_amount"
+                if breakdown == "none":
+                    chart = df.set_index("bucket_start")[[value]]
+                else:
+                    chart = df.pivot_table(index="bucket_start", columns=breakdown, values=value,
+                                           aggfunc="sum", observed=True)
+                st.line_chart(chart)
+                st.caption(f"{len(chart):,} {grain} buckets from {rollup_table(grain)} in {elapsed_ms:.0f} ms · "
+                           f"rollups current as of {state['checked_at']:%Y-%m-%d %H:%M:%S} "
+                           f"(last {state['refresh_mode']} refresh: {state['groups_refreshed']}, "
+                           f"{state['duration_ms']} ms)")
+                with st.expander("Data"):
+                    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    if st.button("⟳ Rebuild rollups",
+                 help="Recompute every bucket from transactions, e.g. after writes made outside the dashboard."):
+        with st.spinner("Rebuilding rollups..."):
+            rollups.refresh(full=True)
+        st.rerun()
+
+# ---------------- PERFORMANCE ----------------
+elif menu == "⏱️Performance":
+    st.header("⏱️ Performance")
+    st.caption(f"The last {len(profiler.events()):,} timings (up to {profiler.capacity:,} are kept). "
+               "Query times are database + DataFrame build; render times cover one full script run.")
+
+    def show_latency(df, empty_message):
+        if df.empty:
+            st.info(empty_message)
+        else:
+            # rows / bytes only apply to queries
+            st.dataframe(df.dropna(axis=1, how="all").round(2), use_container_width=True, hide_index=True)
+
+    st.subheader("Pages")
+    show_latency(profiler.latency("render", ["page"]), "No page runs recorded yet.")
+
+    st.subheader("Database calls by page")
+    show_latency(profiler.latency("query", ["page"]), "No queries recorded yet.")
+
+    st.subheader("Queries")
+    show_latency(profiler.latency("query", ["query"]), "No queries recorded yet.")
+
+    st.subheader("In-memory filtering")
+    show_latency(profiler.latency("pandas", ["page", "name"]), "No filtering blocks recorded yet.")
+
+    st.subheader("Slowest queries")
+    slowest = profiler.slowest(20)
+    if slowest.empty:
+        st.info("No queries recorded yet.")
+    else:
+        slowest["at"] = pd.to_datetime(slowest["at"], unit="s")
+        st.dataframe(slowest[["at", "page", "total_ms", "db_ms", "build_ms", "rows", "bytes", "query"]],
+                     use_container_width=True, hide_index=True)
+
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("⬇️ JSON", lambda: json.dumps(profiler.json_report(), default=str, indent=2),
+                         "banksight_metrics.json", mime="application/json")
+    col2.download_button("⬇️ Prometheus", profiler.prometheus, "banksight_metrics.prom", mime="text/plain")
+    if col3.button("Clear timings"):
+        profiler.clear()
+        st.rerun()
 
-        except Exception as e:
-            st.error("Error executing query")
-            st.exception(e)
 # ---------------- ABOUT ----------------
 elif menu == "👩‍💻About Creator":
     st.header("👩‍💻About the Creator")
@@ -1669,3 +1884,5 @@ elif menu == "👩‍💻About Creator":
     st.write("**Email: shariffrihan@gmail.com**")
     st.write("**Project: 🏦 BankSight: Transaction Intelligence Dashboard**")
     st.success("Thank you for exploring the BankSight Dashboard 🚀")
+
+profiler.end_page()
@@ -0,0 +1,274 @@
+"""Materialized summary tables for the Analytical Insights page.
+
+Each insight's summary lives in an ``insight_<name>`` table so the page reads
+a few hundred pre-aggregated rows instead of scanning ``transactions`` and
+friends. Writers append what they touched to ``insight_changes``; a
+refresh reads the changes past the insight's high-water mark, works out which
+groups they affect and recomputes only those groups (delete + insert in one
+transaction). Changes without row details (cascades, bulk loads) and large
+change sets fall back to a full rebuild into a side table that is swapped in
+with ``RENAME TABLE``. Recomputing a group is idempotent, so a change that
+lands while a refresh runs is simply applied again next time.
+
+``change_id`` values are handed out when an insert starts, not when it
+commits, so a change can become visible after a higher id was already
+read. The high-water mark therefore only advances over changes older than
+``BANKSIGHT_CHANGE_SETTLE`` seconds, by which time an insert still running
+has committed. Newer changes are applied as well, and applied again on the
+next refresh.
+
+Every refresh prunes the changes all summaries have read. Writes also
+prune, at most every ``BANKSIGHT_CHANGE_PRUNE_INTERVAL`` seconds, so the
+log stays bounded when nobody refreshes. Changes older than
+``BANKSIGHT_CHANGE_RETENTION`` seconds are dropped even if some summary
+has not read them yet. That summary's refresh state goes with them, so its
+next refresh is a full rebuild.
+
+Writes made outside the dashboard and its loaders are not logged; use
+``refresh(name, full=True)`` after those.
+"""
+
+import json
+import os
+import threading
+import time
+
+from banksight_filters import quote_identifier
+from banksight_insights import in_clause
+from banksight_schema import COLUMN_DTYPES
+
+
+# Above this many affected groups a full rebuild is cheaper than a partial one.
+MAX_REFRESH_GROUPS = int(os.environ.get("BANKSIGHT_SUMMARY_MAX_GROUPS", 500))
+CHANGE_RETENTION = float(os.environ.get("BANKSIGHT_CHANGE_RETENTION", 86400))
+PRUNE_INTERVAL = float(os.environ.get("BANKSIGHT_CHANGE_PRUNE_INTERVAL", 60))
+# A change-log insert is assumed committed this long after it started.
+CHANGE_SETTLE = float(os.environ.get("BANKSIGHT_CHANGE_SETTLE", 10))
+
+CHANGES_DDL = """
+CREATE TABLE IF NOT EXISTS insight_changes (
+    change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    row_values MEDIUMTEXT,
+    changed_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+)
+"""
+
+STATE_DDL = """
+CREATE TABLE IF NOT EXISTS insight_refresh (
+    insight VARCHAR(16) PRIMARY KEY,
+    last_change_id BIGINT NOT NULL,
+    refreshed_at DATETIME(6) NOT NULL,
+    checked_at DATETIME(6) NOT NULL,
+    refresh_mode VARCHAR(16) NOT NULL,
+    groups_refreshed INT,
+    duration_ms INT
+)
+"""
+
+
+class SummaryStore:
+
+    def __init__(self, db, insights, max_groups=MAX_REFRESH_GROUPS, retention=CHANGE_RETENTION,
+                 prune_interval=PRUNE_INTERVAL, settle=CHANGE_SETTLE):
+        self.db = db
+        self.insights = {insight.name: insight for insight in insights}
+        self.max_groups = max_groups
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self.settle = settle
+        self._pruned_at = time.monotonic()
+        self.tables = {t for insight in insights for t in insight.tables}
+        self._locks = {name: threading.Lock() for name in self.insights}
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _ensure_tables(self):
+        if self._ready:
+            return
+        with self._ready_lock:
+            if not self._ready:
+                self.db.execute(CHANGES_DDL)
+                self.db.execute(STATE_DDL)
+                self._ready = True
+
+    @staticmethod
+    def table_name(name):
+        return f"insight_{name}"
+
+    # ---------------- CHANGE LOG ----------------
+    def record_change(self, table, rows=None):
+        """Log a write to ``table``; ``rows`` are the old/new row dicts, None if unknown."""
+        if table not in self.tables:
+            return
+        self._ensure_tables()
+        payload = None
+        if rows is not None:
+            payload = json.dumps([r for r in rows if r], default=str)
+        self.log_change(table, payload)
+
+    def log_change(self, table, payload):
+        """Append one entry to the change log, pruning it every ``prune_interval`` seconds."""
+        self._ensure_tables()
+        self.db.execute(
+            "INSERT INTO insight_changes (table_name, row_values) VALUES (%s, %s)",
+            (table, payload),
+        )
+        now = time.monotonic()
+        if now - self._pruned_at >= self.prune_interval:
+            self._pruned_at = now
+            self._prune()
+
+    def pending(self, name, tables):
+        """``(state, latest, [(table_name, row_values)])`` for the changes ``name`` has not read.
+
+        ``latest`` is the new high-water mark: the newest change older than
+        ``settle`` seconds, so no insert still in flight sits below it. The
+        changes are everything past the old mark, including the unsettled
+        ones, so appliers must be idempotent. Read in one transaction, so a
+        concurrent ``_prune`` cannot remove changes between the state and the
+        changes being read.
+        """
+        self._ensure_tables()
+        with self.db.transaction() as cur:
+            cur.execute("SELECT * FROM insight_refresh WHERE insight = %s", (name,))
+            row = cur.fetchone()
+            state = dict(zip([d[0] for d in cur.description], row)) if row else None
+            cur.execute(
+                "SELECT change_id FROM insight_changes WHERE changed_at < NOW(6) - INTERVAL %s SECOND "
+                "ORDER BY change_id DESC LIMIT 1",
+                (int(self.settle),),
+            )
+            row = cur.fetchone()
+            latest = row[0] if row else 0
+            changes = []
+            if state is not None:
+                # Pruning can leave no settled change behind; never move the mark back.
+                latest = max(latest, state["last_change_id"])
+                cur.execute(
+                    f"SELECT table_name, row_values FROM insight_changes "
+                    f"WHERE change_id > %s "
+                    f"AND table_name IN ({', '.join(['%s'] * len(tables))}) ORDER BY change_id",
+                    [state["last_change_id"], *tables],
+                )
+                changes = cur.fetchall()
+        return state, latest, changes
+
+    # ---------------- REFRESH ----------------
+    def state(self, name):
+        self._ensure_tables()
+        return self.db.fetch_dict("SELECT * FROM insight_refresh WHERE insight = %s", (name,))
+
+    def _save_state(self, name, last_change_id, mode=None, groups=None, duration_ms=None):
+        if mode is None:
+            self.db.execute(
+                "UPDATE insight_refresh SET last_change_id = %s, checked_at = NOW(6) WHERE insight = %s",
+                (last_change_id, name),
+            )
+            return
+        self.db.execute("""
+            INSERT INTO insight_refresh
+                (insight, last_change_id, refreshed_at, checked_at, refresh_mode, groups_refreshed, duration_ms)
+            VALUES (%s, %s, NOW(6), NOW(6), %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                last_change_id = VALUES(last_change_id), refreshed_at = VALUES(refreshed_at),
+                checked_at = VALUES(checked_at), refresh_mode = VALUES(refresh_mode),
+                groups_refreshed = VALUES(groups_refreshed), duration_ms = VALUES(duration_ms)
+        """, (name, last_change_id, mode, groups, duration_ms))
+
+    def _affected_groups(self, insight, changes):
+        """Summary keys touched by ``changes``, or None when only a rebuild will do."""
+        groups, lookups = set(), {}
+        for table, payload in changes:
+            link = insight.links.get(table)
+            if payload is None or link is None:
+                return None
+            column, expr = link
+            for row in json.loads(payload):
+                value = {k.lower(): v for k, v in row.items()}.get(column.lower())
+                if expr == insight.refresh_expr:
+                    groups.add(value)
+                else:
+                    lookups.setdefault(expr, set()).add(value)
+        for expr, values in lookups.items():
+            groups.update(row[0] for row in self.db.fetch_all(*insight.key_lookup_sql(expr, values)))
+        return groups
+
+    def _rebuild(self, insight):
+        table = self.table_name(insight.name)
+        live, fresh, stale = (quote_identifier(t) for t in (table, table + "__new", table + "__old"))
+        sql, params = insight.summary_sql()
+        self.db.execute(f"DROP TABLE IF EXISTS {fresh}")
+        rows = self.db.execute(f"CREATE TABLE {fresh} AS {sql}", params or None)
+        self.db.execute(f"ALTER TABLE {fresh} ADD INDEX ({quote_identifier(insight.refresh_column)})")
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS {live} LIKE {fresh}")
+        self.db.execute(f"RENAME TABLE {live} TO {stale}, {fresh} TO {live}")
+        self.db.execute(f"DROP TABLE {stale}")
+        return rows
+
+    def _apply(self, insight, groups):
+        table = quote_identifier(self.table_name(insight.name))
+        clause, params = in_clause(quote_identifier(insight.refresh_column), groups)
+        sql, select_params = insight.summary_sql(groups)
+        with self.db.transaction() as cur:
+            cur.execute(f"DELETE FROM {table} WHERE {clause}", params)
+            cur.execute(f"INSERT INTO {table} {sql}", select_params)
+
+    def refresh(self, name, full=False):
+        """Bring one summary up to date and return its refresh state."""
+        insight = self.insights[name]
+        self._ensure_tables()
+        with self._locks[name]:
+            state, latest, changes = self.pending(name, insight.tables)
+            started = time.perf_counter()
+            groups = None
+            if state is not None and not full:
+                if not changes:
+                    self._save_state(name, latest)
+                    return self.state(name)
+                groups = self._affected_groups(insight, changes)
+            if groups is not None and len(groups) <= self.max_groups:
+                if groups:
+                    self._apply(insight, groups)
+                mode, count = "incremental", len(groups)
+            else:
+                mode, count = "full", self._rebuild(insight)
+            self._save_state(name, latest, mode, count, int((time.perf_counter() - started) * 1000))
+            self._prune()
+            return self.state(name)
+
+    def refresh_all(self, full=False):
+        return {name: self.refresh(name, full=full) for name in self.insights}
+
+    def _prune(self):
+        # Changes every built summary has consumed are no longer needed; an
+        # insight without state starts with a full rebuild anyway.
+        self.db.execute(
+            "DELETE FROM insight_changes WHERE change_id <= "
+            "(SELECT low FROM (SELECT MIN(last_change_id) AS low FROM insight_refresh) AS r)"
+        )
+        # Changes past the retention go whether read or not; a summary that
+        # had not read them loses its state and rebuilds on its next refresh.
+        cutoff = self.db.fetch_one(
+            "SELECT MAX(change_id) FROM insight_changes WHERE changed_at < NOW(6) - INTERVAL %s SECOND",
+            (int(self.retention),))[0]
+        if cutoff is not None:
+            with self.db.transaction() as cur:
+                cur.execute("DELETE FROM insight_refresh WHERE last_change_id < %s", (cutoff,))
+                cur.execute("DELETE FROM insight_changes WHERE change_id <= %s", (cutoff,))
+
+    # ---------------- READS ----------------
+    def read(self, name, binding=None):
+        """``(df, state)`` for the materialized result, refreshing pending changes first."""
+        insight = self.insights[name]
+        if not insight.materializable(binding):
+            raise ValueError(f"the {name} summary is built with the default "
+                             f"{', '.join(sorted(insight.summary_params))}; use read_live")
+        state = self.refresh(name)
+        sql, params = insight.result_sql(quote_identifier(self.table_name(name)), binding)
+        return self.db.read_sql(sql, params or None, dtypes=COLUMN_DTYPES), state
+
+    def read_live(self, name, binding=None, on_start=None):
+        """Recompute ``name`` from the raw tables; ``on_start`` as in ``ConnectionPool.stream``."""
+        sql, params = self.insights[name].live_sql(binding)
+        return self.db.read_sql(sql, params or None, dtypes=COLUMN_DTYPES, on_start=on_start)
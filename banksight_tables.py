@@ -0,0 +1,382 @@
+"""Typed in-memory copies of the dashboard tables.
+
+``TypedTable`` holds one table converted once, at load time, to a compact
+form:
+
+* ID columns stored as text (``customer_id``, ``txn_id``, ``Account_ID``, ...)
+  become integer codes into a sorted lookup of the distinct IDs, so a
+  customer that appears in 10,000 transactions is stored once;
+* low-cardinality labels (``category`` in ``COLUMN_DTYPES``) become
+  categoricals, which are codes plus a lookup as well;
+* DATE / DATETIME columns are datetime64 and numbers stay numeric.
+
+``mask(fq)`` evaluates a ``FilterQuery`` against that representation and
+returns a boolean array. IN / = predicates on coded columns look the
+requested values up once in the lookup and compare integer codes; ranges
+compare codes against ``searchsorted`` positions (the lookups are sorted) or
+compare the numeric / datetime64 arrays directly. No numeric, date or coded
+column is copied or cast to ``str`` on the way. Text compares
+case-insensitively, as under MySQL's default collation: lookups are sorted
+and matched case-folded, and plain text columns are folded per predicate.
+``rows`` then builds only the requested page.
+
+``TableStore`` keeps one ``TypedTable`` per table for the whole process, so
+every Streamlit session filters the same frames instead of reading its own
+copy. The frames are read-only: a refresh builds a new ``TypedTable`` and
+swaps the reference, so a session keeps whatever version it started with. A
+background thread loads tables on first use, reloads them every
+``BANKSIGHT_STORE_REFRESH`` seconds and, after ``mark_stale`` (the dashboard
+calls it after every write), within ``BANKSIGHT_STORE_STALE_DELAY``
+seconds. Until a stale table is reloaded ``get`` returns None and the page
+reads MySQL, so no session sees rows older than its own write. The first
+load of each table also runs ``TypedTable.check`` on its float and text
+columns; a table whose masks count different rows than SQL (a collation
+that folds more than case, say) is not served from memory at all and its
+pages keep reading MySQL.
+``BANKSIGHT_STORE_TABLES`` limits which tables are kept and
+``BANKSIGHT_TABLE_STORE=0`` turns the store off.
+
+    python banksight_tables.py transactions loans --check
+"""
+
+import argparse
+import datetime
+import logging
+import operator
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from banksight_frames import STREAM_ROWS, assemble
+from banksight_filters import FilterQuery, quote_identifier
+from banksight_schema import COLUMN_DTYPES, ID_COLUMNS, NUMERIC_COLUMNS, PRIMARY_KEYS
+
+
+log = logging.getLogger("banksight.tables")
+
+ENABLED = os.environ.get("BANKSIGHT_TABLE_STORE", "1") != "0"
+STORE_TABLES = [t for t in os.environ.get("BANKSIGHT_STORE_TABLES", ",".join(PRIMARY_KEYS)).split(",") if t]
+REFRESH_INTERVAL = float(os.environ.get("BANKSIGHT_STORE_REFRESH", 300))
+STALE_DELAY = float(os.environ.get("BANKSIGHT_STORE_STALE_DELAY", 2))
+
+_COMPARE = {"gt": operator.gt, "ge": operator.ge, "le": operator.le, "lt": operator.lt}
+
+
+def table_dtypes(table):
+    """``COLUMN_DTYPES`` plus integer coding for the table's text ID columns."""
+    dtypes = dict(COLUMN_DTYPES)
+    dtypes.update((c, "category") for c in ID_COLUMNS if c not in NUMERIC_COLUMNS.get(table, ()))
+    return dtypes
+
+
+def _fold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+def _folded(index):
+    """Case-folded copy of a text lookup; other lookups are returned as they are."""
+    return index.str.casefold() if index.inferred_type == "string" else index
+
+
+def _is_text(series):
+    return pd.api.types.is_string_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def _bound(categories, op, value):
+    """Code range satisfying ``column <op> value`` over sorted ``categories``."""
+    if op in ("gt", "le"):
+        return categories.searchsorted(value, side="right")
+    return categories.searchsorted(value, side="left")
+
+
+class TypedTable:
+
+    def __init__(self, table, frame, seconds=0.0):
+        self.table = table
+        self.frame = frame
+        self.loaded_at = datetime.datetime.now()
+        self.seconds = seconds
+        self._names = {c.lower(): c for c in frame.columns}
+        self._keys = {}
+        # Sorted lookups make code order equal value order, which the range
+        # predicates and ``rows(order_by=...)`` rely on. Text sorts case-folded,
+        # the way MySQL orders it.
+        for column in frame.columns:
+            if isinstance(frame[column].dtype, pd.CategoricalDtype):
+                categories = frame[column].cat.categories
+                if not _folded(categories).is_monotonic_increasing:
+                    categories = categories.sort_values(key=_folded)
+                    frame[column] = frame[column].cat.reorder_categories(categories)
+                self._keys[column] = _folded(categories)
+
+    @classmethod
+    def load(cls, db, table, chunk_rows=STREAM_ROWS):
+        started = time.perf_counter()
+        frame = assemble(db.stream(f"SELECT * FROM {quote_identifier(table)}", chunk_rows=chunk_rows),
+                         table_dtypes(table))
+        return cls(table, frame, round(time.perf_counter() - started, 3))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def column(self, name):
+        """Actual column name (MySQL matches column names case-insensitively)."""
+        try:
+            return self._names[name.lower()]
+        except KeyError:
+            raise KeyError(f"{self.table} has no column {name!r}") from None
+
+    def memory(self):
+        return int(self.frame.memory_usage(index=True, deep=True).sum())
+
+    # ---------------- FILTERING ----------------
+    def _predicate(self, op, name, args):
+        column = self.column(name)
+        series = self.frame[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            keys = self._keys[column]
+            if op == "not_null":
+                return codes >= 0
+            if op in ("in", "eq"):
+                # Case-insensitive, so 'Failed' also picks up 'failed'.
+                return np.isin(codes, np.flatnonzero(keys.isin([_fold(v) for v in args])))
+            bound = _bound(keys, op, _fold(args[0]))
+            if op in ("gt", "ge"):
+                return codes >= bound
+            return (codes >= 0) & (codes < bound)
+        if op != "not_null" and _is_text(series):
+            folded = series.str.casefold()
+            if op in ("in", "eq"):
+                matched = folded.isin([_fold(v) for v in args])
+            else:
+                matched = _COMPARE[op](folded, _fold(args[0]))
+            return matched.to_numpy(dtype=bool, na_value=False)
+        values = series.to_numpy()
+        if op == "not_null":
+            return ~pd.isna(values)
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            args = [pd.Timestamp(v).to_datetime64() for v in args]
+        elif values.dtype.kind == "f":
+            # Compare in the stored width: a float64 12.43 never equals a
+            # float32 12.43. Integer columns keep their arguments, since
+            # casting 2.5 to an integer would move a range bound.
+            args = np.asarray(args, dtype=values.dtype)
+        if op in ("in", "eq"):
+            return np.isin(values, args)
+        return _COMPARE[op](values, args[0])
+
+    def mask(self, fq):
+        """Boolean array of the rows matching ``fq``'s predicates."""
+        result = np.ones(len(self.frame), dtype=bool)
+        for op, column, args in fq.predicates:
+            np.logical_and(result, self._predicate(op, column, args), out=result)
+        return result
+
+    def count(self, fq):
+        return int(np.count_nonzero(self.mask(fq)))
+
+    def positions(self, fq, order_by=None):
+        """Row positions matching ``fq``, in ``order_by`` order (NULLs first, as in MySQL)."""
+        positions = np.flatnonzero(self.mask(fq))
+        if order_by:
+            series = self.frame[self.column(order_by)]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                keys = series.cat.codes.to_numpy()[positions]
+            else:
+                keys = series.to_numpy()[positions]
+            order = np.argsort(keys, kind="stable")
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                # argsort puts NaN / NaT last; MySQL sorts NULLs first.
+                nulls = pd.isna(keys[order])
+                order = np.concatenate([order[nulls], order[~nulls]])
+            positions = positions[order]
+        return positions
+
+    def take(self, positions, columns=None):
+        """The rows at ``positions`` as a new DataFrame (only those rows are copied)."""
+        columns = [self.column(c) for c in columns] if columns else list(self.frame.columns)
+        return self.frame.iloc[positions][columns].reset_index(drop=True)
+
+    def rows(self, fq, order_by=None, limit=None, offset=0):
+        """The matching rows (one page of them with ``limit``) as a new DataFrame."""
+        positions = self.positions(fq, order_by)
+        if limit is not None:
+            positions = positions[offset:offset + limit]
+        return self.take(positions, fq.columns)
+
+    def values(self, fq, column):
+        """The matching values of one column, as an array."""
+        return self.frame[self.column(column)].to_numpy()[self.mask(fq)]
+
+    def min_max(self, column):
+        series = self.frame[self.column(column)]
+        return series.min(), series.max()
+
+    def check(self, db, columns=None, samples=3):
+        """Compare ``count`` with SQL ``COUNT(*)`` for = and >= on sample values.
+
+        Returns ``(column, op, value, mask_count, sql_count)`` for each
+        disagreement; an empty list means the masks answer like MySQL.
+        """
+        mismatches = []
+        for name in columns or self.frame.columns:
+            column = quote_identifier(self.column(name))
+            values = db.fetch_column(f"SELECT DISTINCT {column} FROM {quote_identifier(self.table)} "
+                                     f"WHERE {column} IS NOT NULL LIMIT %s", (samples,))
+            for value in values:
+                for op, fq in (("eq", FilterQuery(self.table).eq(name, value)),
+                               ("ge", FilterQuery(self.table).between(name, low=value))):
+                    expected = db.fetch_one(*fq.count())[0]
+                    got = self.count(fq)
+                    if got != expected:
+                        mismatches.append((name, op, value, got, expected))
+        return mismatches
+
+
+class TableStore:
+
+    def __init__(self, db, tables=None, interval=REFRESH_INTERVAL, stale_delay=STALE_DELAY):
+        self.db = db
+        self.tables = set(STORE_TABLES if tables is None else tables)
+        self.interval = interval
+        self.stale_delay = stale_delay
+        self._tables = {}
+        self._wanted = set()
+        # table -> TypedTable.check mismatches; these tables are never served
+        self._disabled = {}
+        self._checked = set()
+        # table -> writes seen since its last load started
+        self._stale = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, table):
+        """The current ``TypedTable``, or None while it is loading or stale."""
+        if table not in self.tables:
+            return None
+        with self._lock:
+            if table in self._disabled:
+                return None
+            if table in self._tables and table not in self._stale:
+                return self._tables[table]
+            self._wanted.add(table)
+        self._wake.set()
+        return None
+
+    def mark_stale(self, *tables):
+        with self._lock:
+            for table in tables:
+                if table in self._tables:
+                    self._stale[table] = self._stale.get(table, 0) + 1
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return {table: {"rows": len(typed), "bytes": typed.memory(), "seconds": typed.seconds,
+                            "loaded_at": typed.loaded_at, "stale": table in self._stale}
+                    for table, typed in self._tables.items()}
+
+    def load(self, table):
+        with self._lock:
+            writes = self._stale.get(table)
+        typed = TypedTable.load(self.db, table)
+        if table not in self._checked:
+            self._verify(typed)
+        with self._lock:
+            self._wanted.discard(table)
+            if table in self._disabled:
+                return typed
+            self._tables[table] = typed
+            # A write that landed while we were reading keeps the table stale.
+            if self._stale.get(table) == writes:
+                self._stale.pop(table, None)
+        log.info("loaded %s: %d rows, %.1f MiB in %.2fs", table, len(typed), typed.memory() / 2**20,
+                 typed.seconds)
+        return typed
+
+    def _verify(self, typed):
+        """Check the float and text columns' masks against SQL once per process."""
+        columns = [c for c in typed.frame.columns
+                   if typed.frame[c].dtype.kind == "f" or pd.api.types.is_string_dtype(typed.frame[c].dtype)
+                   or isinstance(typed.frame[c].dtype, pd.CategoricalDtype)]
+        mismatches = typed.check(self.db, columns, samples=2) if columns else []
+        with self._lock:
+            self._checked.add(typed.table)
+            if mismatches:
+                self._disabled[typed.table] = mismatches
+        if mismatches:
+            log.error("%s: in-memory filters disagree with SQL (%s); serving it from MySQL",
+                      typed.table, "; ".join(f"{c} {op} {v!r}: {got} vs {want}"
+                                             for c, op, v, got, want in mismatches))
+
+    # ---------------- BACKGROUND REFRESH ----------------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="banksight-table-store", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        last_full = time.monotonic()
+        while not self._stop.is_set():
+            woken = self._wake.wait(timeout=max(0.0, self.interval - (time.monotonic() - last_full)))
+            if self._stop.is_set():
+                return
+            if woken and self._stale:
+                # Let a burst of writes settle into one reload.
+                self._stop.wait(self.stale_delay)
+            self._wake.clear()
+            full = time.monotonic() - last_full >= self.interval
+            if full:
+                last_full = time.monotonic()
+            with self._lock:
+                due = self._wanted | set(self._stale) | (set(self._tables) if full else set())
+            for table in sorted(due):
+                try:
+                    self.load(table)
+                except Exception:
+                    log.exception("loading %s into the table store failed; retrying", table)
+                    self._stop.wait(self.stale_delay)
+                    self._wake.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare object-dtype and typed memory per table.")
+    parser.add_argument("tables", nargs="*", help="tables to load (default: all)")
+    parser.add_argument("--check", action="store_true",
+                        help="also check that the in-memory filters count the same rows as SQL")
+    args = parser.parse_args(argv)
+
+    from banksight_pool import ConnectionPool
+
+    db = ConnectionPool()
+    failed = False
+    try:
+        for table in args.tables or PRIMARY_KEYS:
+            raw = db.read_sql(f"SELECT * FROM {quote_identifier(table)}").astype(object)
+            typed = TypedTable.load(db, table)
+            raw_bytes = int(raw.memory_usage(index=True, deep=True).sum())
+            print(f"{table:>16}  {len(typed):9d} rows  {raw_bytes / 2**20:9.1f} MiB object  "
+                  f"{typed.memory() / 2**20:8.1f} MiB typed  ({raw_bytes / max(typed.memory(), 1):.1f}x)")
+            if args.check:
+                for column, op, value, got, expected in typed.check(db):
+                    failed = True
+                    print(f"{'':>16}  {column} {op} {value!r}: {got} rows in memory, {expected} in SQL")
+    finally:
+        db.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())